@@ -0,0 +1,414 @@
+import asyncio
+import bisect
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+from b_tree_exp import BTree, SimpleSQLDatabase
+from disk_btree import DiskBTree
+
+# asyncio front end for SimpleSQLDatabase, for serving many concurrent
+# requests from one thread.
+#
+# - Point lookups that arrive in the same event-loop turn are grouped per
+#   table and answered by one batched descent (BTree.search_many, or a
+#   level-by-level walk of a DiskBTree). Requests for the same key share one
+#   result.
+# - Disk tables read their pages through an AsyncPageStore: the blocking
+#   reads run in a thread pool, so the page reads of a whole tree level (and
+#   of every batch in flight) wait on the disk at the same time.
+# - A semaphore caps the operations in flight; callers beyond the cap wait
+#   for a slot instead of piling up work.
+# - Each table has an AsyncRWLatch: writes wait for in-flight descents and
+#   range scans of that table, and block new ones while they run.
+#
+# Writes still go through SimpleSQLDatabase, so the write-ahead log, indexes
+# and Bloom filters behave exactly as in the synchronous API.
+
+
+class AsyncPageStore:
+    """Reads pages of a blocking store (Pager, Hdd) in worker threads
+
+    Concurrent reads of the same page share one fetch. The store's
+    read_page must be safe to call from several threads at once, which
+    rules out a BufferPool.
+    """
+
+    def __init__(self, store, executor):
+        self.store = store
+        self.executor = executor
+        self.in_flight = {}  # page_no -> future of the read in progress
+        self.reads = 0
+        self.shared_reads = 0
+
+    async def read_page(self, page_no):
+        future = self.in_flight.get(page_no)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, self.store.read_page, page_no)
+            self.in_flight[page_no] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(page_no, None))
+            self.reads += 1
+        else:
+            self.shared_reads += 1
+        # Shielded, so one cancelled reader does not cancel the read for the others
+        return await asyncio.shield(future)
+
+
+class AsyncRWLatch:
+    """asyncio counterpart of concurrent_btree.RWLatch: waiting writers go before new readers"""
+
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    async def acquire_read(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._writer and not self._writers_waiting)
+            self._readers += 1
+
+    async def release_read(self):
+        async with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    async def acquire_write(self):
+        async with self._cond:
+            self._writers_waiting += 1
+            try:
+                await self._cond.wait_for(lambda: not self._writer and not self._readers)
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+
+    async def release_write(self):
+        async with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @asynccontextmanager
+    async def reading(self):
+        await self.acquire_read()
+        try:
+            yield
+        finally:
+            await self.release_read()
+
+    @asynccontextmanager
+    async def writing(self):
+        await self.acquire_write()
+        try:
+            yield
+        finally:
+            await self.release_write()
+
+
+class AsyncSQLDatabase:
+    """async insert_record/delete_record/select_record/select_range over a SimpleSQLDatabase
+
+    All methods must be awaited from one event loop. max_in_flight bounds
+    the operations admitted at once, max_batch the keys in one batched
+    descent, and io_threads the page reads running at the same time.
+    """
+
+    def __init__(self, db=None, max_in_flight=1024, max_batch=256, io_threads=16, scan_chunk=512):
+        if max_in_flight < 1 or max_batch < 1:
+            raise ValueError("max_in_flight and max_batch must be at least 1")
+        self.db = db if db is not None else SimpleSQLDatabase()
+        self.max_in_flight = max_in_flight
+        self.max_batch = max_batch
+        self.scan_chunk = scan_chunk  # Rows between yields to the loop in in-memory scans
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.io_executor = ThreadPoolExecutor(io_threads, thread_name_prefix="page-io")
+        # One thread, so blocking writes (page writes, WAL fsyncs) stay in submission order
+        self.write_executor = ThreadPoolExecutor(1, thread_name_prefix="db-write")
+
+        self.latches = {}  # table -> AsyncRWLatch
+        self.page_stores = {}  # table -> AsyncPageStore of its pager
+        self.pending = {}  # table -> {key: future} of lookups waiting for the next batch
+        self.tasks = set()  # Running batches, referenced so they are not collected
+
+        self.in_flight = 0
+        self.max_seen_in_flight = 0
+        self.lookups = 0
+        self.coalesced = 0  # Lookups answered by another request's result for the same key
+        self.batches = 0
+        self.batched_keys = 0
+        self.largest_batch = 0
+
+    def create_table(self, *args, **kwargs):
+        """Same arguments as SimpleSQLDatabase.create_table (runs synchronously)"""
+        self.db.create_table(*args, **kwargs)
+
+    def _latch(self, table_name):
+        latch = self.latches.get(table_name)
+        if latch is None:
+            latch = self.latches[table_name] = AsyncRWLatch()
+        return latch
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Admit one operation, waiting while max_in_flight are already running"""
+        async with self.slots:
+            self.in_flight += 1
+            self.max_seen_in_flight = max(self.max_seen_in_flight, self.in_flight)
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+
+    async def insert_record(self, table_name, key, value):
+        """INSERT INTO equivalent"""
+        await self._write(table_name, self.db.insert_record, key, value)
+
+    async def delete_record(self, table_name, key):
+        """DELETE FROM table WHERE id = key"""
+        return await self._write(table_name, self.db.delete_record, key)
+
+    async def _write(self, table_name, method, *args):
+        if table_name not in self.db.tables:
+            return method(table_name, *args)  # Reports the missing table
+
+        async with self._slot(), self._latch(table_name).writing():
+            wal = self.db.wal
+            if isinstance(self.db.tables[table_name], DiskBTree) or (wal is not None and wal.sync == "always"):
+                # Page writes and fsyncs block, so keep them off the loop
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.write_executor, partial(method, table_name, *args))
+            return method(table_name, *args)
+
+    async def select_record(self, table_name, key):
+        """SELECT * FROM table WHERE key = value; concurrent calls share batched descents"""
+        db = self.db
+        if table_name not in db.tables:
+            print(f"Table {table_name} does not exist!")
+            return
+
+        async with self._slot():
+            db.tracer.on_statement(db, f"SELECT * FROM {table_name} WHERE id = {key}")
+            self.lookups += 1
+            bloom = db.filters[table_name]
+            if bloom is not None and key not in bloom:
+                db.tracer.on_filter_reject(db, table_name, key)
+                return None
+
+            batch = self.pending.get(table_name)
+            if batch is None:
+                # Collect every lookup made during this loop turn, then run them together
+                batch = self.pending[table_name] = {}
+                asyncio.get_running_loop().call_soon(self._dispatch, table_name)
+
+            future = batch.get(key)
+            if future is None:
+                future = batch[key] = asyncio.get_running_loop().create_future()
+                if len(batch) >= self.max_batch:
+                    self._dispatch(table_name)
+            else:
+                self.coalesced += 1
+            return await asyncio.shield(future)
+
+    def _dispatch(self, table_name):
+        batch = self.pending.pop(table_name, None)
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run_batch(table_name, batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run_batch(self, table_name, batch):
+        keys = sorted(batch)
+        self.batches += 1
+        self.batched_keys += len(keys)
+        self.largest_batch = max(self.largest_batch, len(keys))
+        try:
+            async with self._latch(table_name).reading():
+                results = await self._search_many(table_name, keys)
+        except Exception as error:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(results.get(key))
+
+    async def _search_many(self, table_name, keys):
+        """Look up sorted distinct keys; returns key -> (key, value) for the ones found"""
+        table = self.db.tables[table_name]
+        if isinstance(table, BTree):
+            return {key: result for key, result in zip(keys, table.search_many(keys)) if result is not None}
+        if isinstance(table, DiskBTree):
+            return await self._disk_search_many(table_name, table, keys)
+        results = {}
+        for key in keys:
+            result = table.search(key)
+            if result is not None:
+                results[key] = result
+        return results
+
+    async def _disk_search_many(self, table_name, table, keys):
+        """Descend a DiskBTree one level at a time, reading each level's pages concurrently"""
+        read_page = self._page_reader(table_name, table)
+        results = {}
+        level = [(table.pager.root_page, keys)]
+
+        while level:
+            pages = await asyncio.gather(*(read_page(page_no) for page_no, _ in level))
+            next_level = []
+            for (page_no, group), page in zip(level, pages):
+                node = table._decode_node(page_no, page)
+                groups = {}
+                for key in group:
+                    pos = bisect.bisect_left(node.keys, key)
+                    if pos < len(node.keys) and node.keys[pos] == key:
+                        results[key] = (key, table._decode_value(node.values[pos]))
+                    elif not node.leaf:
+                        groups.setdefault(pos, []).append(key)
+                next_level.extend((node.children[pos], group) for pos, group in groups.items())
+            level = next_level
+
+        if table.tracing:
+            for key in keys:
+                table.tracer.on_search(table, key, results.get(key))
+        return results
+
+    def _page_reader(self, table_name, table):
+        """Async read_page for a disk table"""
+        if table.pages is not table.pager:
+            # A BufferPool is not thread-safe: read through it on the loop
+            async def read_pooled(page_no):
+                return table.pages.read_page(page_no)
+            return read_pooled
+
+        store = self.page_stores.get(table_name)
+        if store is None or store.store is not table.pager:
+            store = self.page_stores[table_name] = AsyncPageStore(table.pager, self.io_executor)
+        return store.read_page
+
+    async def select_range(self, table_name, start_key, end_key):
+        """SELECT * FROM table WHERE key BETWEEN start AND end; returns the rows as a list"""
+        db = self.db
+        if table_name not in db.tables:
+            print(f"Table {table_name} does not exist!")
+            return
+
+        async with self._slot():
+            table = db.tables[table_name]
+            if isinstance(table, DiskBTree):
+                db.tracer.on_statement(db, f"SELECT * FROM {table_name} WHERE id BETWEEN {start_key} AND {end_key}")
+                async with self._latch(table_name).reading():
+                    read_page = self._page_reader(table_name, table)
+                    return await self._disk_scan(table, read_page, table.pager.root_page, start_key, end_key)
+
+            # Snapshots and LSM scans stay consistent without the latch once started
+            async with self._latch(table_name).reading():
+                rows_iter = db.select_range(table_name, start_key, end_key)
+            rows = []
+            for row in rows_iter:
+                rows.append(row)
+                if len(rows) % self.scan_chunk == 0:
+                    await asyncio.sleep(0)  # Let other requests run during long scans
+            return rows
+
+    async def _disk_scan(self, table, read_page, page_no, start, end):
+        """Rows of one subtree in key order; the children in range are read concurrently"""
+        node = table._decode_node(page_no, await read_page(page_no))
+        low = 0 if start is None else bisect.bisect_left(node.keys, start)
+        high = len(node.keys) if end is None else bisect.bisect_right(node.keys, end)
+        rows = [(key, table._decode_value(value)) for key, value in zip(node.keys[low:high], node.values[low:high])]
+        if node.leaf:
+            return rows
+
+        below = await asyncio.gather(*(self._disk_scan(table, read_page, child, start, end)
+                                       for child in node.children[low:high + 1]))
+        merged = []
+        for i, child_rows in enumerate(below):
+            merged.extend(child_rows)
+            if i < len(rows):
+                merged.append(rows[i])
+        return merged
+
+    async def close(self):
+        """Finish pending batches, then close the database"""
+        for table_name in list(self.pending):
+            self._dispatch(table_name)
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.write_executor, self.db.close)
+        self.write_executor.shutdown()
+        self.io_executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def stats(self):
+        return {
+            'lookups': self.lookups,
+            'coalesced_lookups': self.coalesced,
+            'batches': self.batches,
+            'avg_batch': self.batched_keys / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'max_in_flight': self.max_in_flight,
+            'max_seen_in_flight': self.max_seen_in_flight,
+            'page_reads': sum(store.reads for store in self.page_stores.values()),
+            'shared_page_reads': sum(store.shared_reads for store in self.page_stores.values()),
+        }
+
+
+def run_async_experiment(num_records=20_000, num_lookups=2_000, latency=0.0005):
+    """Concurrent point lookups on a disk table with simulated page latency: sync loop vs. AsyncSQLDatabase"""
+    rng = random.Random(42)
+    lookup_keys = [rng.randrange(num_records * 2) for _ in range(num_lookups)]
+
+    print("=" * 80)
+    print(f"ASYNC FRONT END: {num_lookups:,} LOOKUPS, {num_records:,} ROWS, "
+          f"{latency * 1000:.1f} ms PER PAGE READ")
+    print("=" * 80)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "table.db")
+        db = SimpleSQLDatabase()
+        db.create_table("employees", path=path)
+        for key in range(0, num_records * 2, 2):
+            db.insert_record("employees", key, f"Employee_{key}")
+        table = db.tables["employees"]
+        table.pager.latency = latency
+        table.pager.reads = 0  # Count the lookups' reads, not the build's
+
+        start_time = time.perf_counter()
+        expected = [db.select_record("employees", key) for key in lookup_keys]
+        sync_time = time.perf_counter() - start_time
+        sync_reads = table.pager.reads
+        print(f"  sync, one lookup at a time   {sync_time:8.3f} s  "
+              f"{sync_reads:6,} page reads  {num_lookups / sync_time:10,.0f} lookups/s")
+
+        async def serve():
+            async with AsyncSQLDatabase(db) as adb:
+                start = time.perf_counter()
+                results = await asyncio.gather(*(adb.select_record("employees", key) for key in lookup_keys))
+                elapsed = time.perf_counter() - start
+                assert results == expected
+                return elapsed, adb.stats()
+
+        table.pager.reads = 0
+        async_time, stats = asyncio.run(serve())
+        print(f"  async, all lookups at once   {async_time:8.3f} s  "
+              f"{stats['page_reads']:6,} page reads  {num_lookups / async_time:10,.0f} lookups/s")
+        print(f"  {stats['batches']} batches, {stats['avg_batch']:.1f} keys each, "
+              f"{stats['coalesced_lookups']} duplicate lookups coalesced, "
+              f"{stats['shared_page_reads']} page reads shared")
+
+
+if __name__ == "__main__":
+    run_async_experiment()
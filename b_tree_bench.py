@@ -0,0 +1,401 @@
+import argparse
+import bisect
+import gc
+import json
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from b_tree_exp import BTree
+from b_tree_time import BTreeCorrected, binary_search_list
+from betree import BEpsilonTree
+from buffer_pool import zipf_keys
+from lsm import LSMTree
+
+# Reproducible benchmark suite for the tree implementations.
+#
+# Every run is driven by one seed: the dataset order and each workload's
+# operation stream are derived from it, so two runs with the same arguments
+# do exactly the same work. Results can be saved as JSON and a later run
+# compared against them to flag regressions:
+#
+#   python b_tree_bench.py --output baseline.json
+#   python b_tree_bench.py --compare baseline.json
+#
+# Timings are the median over --repeat fresh builds, which keeps a noisy
+# machine from flagging regressions on its own.
+#
+# Dataset keys are the even numbers 0, 2, ..., 2n - 2; inserts during a
+# workload use odd keys, so they are always new (BTree keeps duplicates).
+
+# Workload mixes, after the YCSB core workloads
+WORKLOADS = {
+    # name: (read, insert, scan) fractions, key distribution
+    "read_heavy": ((0.95, 0.05, 0.0), "uniform"),    # YCSB B
+    "write_heavy": ((0.5, 0.5, 0.0), "uniform"),     # YCSB A, with inserts for updates
+    "scan_heavy": ((0.0, 0.05, 0.95), "uniform"),    # YCSB E
+    "zipfian": ((0.95, 0.05, 0.0), "zipfian"),       # Read-heavy with skewed popularity
+}
+
+# Metric name -> True if higher is better
+METRICS = {
+    "build_s": False,
+    "peak_memory_bytes": False,
+    "ops_per_s": True,
+    "lookup_p50_us": False,
+    "lookup_p99_us": False,
+    "scan_rows_per_s": True,
+    "cache_hit_rate": True,
+}
+
+
+class BTreeCorrectedEngine:
+    name = "btree_corrected"
+
+    def __init__(self, degree):
+        self.tree = BTreeCorrected(degree)
+
+    def put(self, key, value):
+        self.tree.insert(key, value)
+
+    def get(self, key):
+        return self.tree.get(key)
+
+    def scan(self, start, end):
+        return sum(1 for _ in self.tree.items(start, end))
+
+
+class CachedBTreeCorrectedEngine(BTreeCorrectedEngine):
+    """BTreeCorrected with a LookupCache in front of get(); pays off on skewed reads"""
+    name = "btree_corrected_cached"
+    cache_size = 4096  # Set from --cache-size
+    
+    def __init__(self, degree):
+        super().__init__(degree)
+        self.cache = self.tree.enable_cache(self.cache_size)
+
+
+class BTreeEngine:
+    """The teaching BTree with its default silent tracer"""
+    name = "btree"
+
+    def __init__(self, degree):
+        self.tree = BTree(degree)
+
+    def put(self, key, value):
+        self.tree.insert(key, value)
+
+    def get(self, key):
+        return self.tree.search(key)
+
+    def scan(self, start, end):
+        return sum(1 for _ in self.tree.scan(start, end))
+
+
+class BEpsilonTreeEngine:
+    """Write-optimised B^ε-tree: inserts are buffered and flushed down in batches"""
+    name = "betree"
+
+    def __init__(self, degree):
+        self.tree = BEpsilonTree(degree)
+
+    def put(self, key, value):
+        self.tree.insert(key, value)
+
+    def get(self, key):
+        return self.tree.get(key)
+
+    def scan(self, start, end):
+        return sum(1 for _ in self.tree.items(start, end))
+
+
+class LSMEngine:
+    """LSMTree in a temporary directory, compacting in the background"""
+    name = "lsm"
+
+    def __init__(self, degree=None):
+        self.directory = tempfile.mkdtemp(prefix="lsm_bench_")
+        self.tree = LSMTree(self.directory)
+
+    def put(self, key, value):
+        self.tree.insert(key, value)
+
+    def get(self, key):
+        return self.tree.get(key)
+
+    def scan(self, start, end):
+        return sum(1 for _ in self.tree.scan(start, end))
+
+    def close(self):
+        self.tree.close()
+        shutil.rmtree(self.directory)
+
+
+class SortedListEngine:
+    """Sorted list of (key, value) pairs searched with binary_search_list"""
+    name = "sorted_list"
+
+    def __init__(self, degree=None):
+        self.data = []
+
+    def put(self, key, value):
+        bisect.insort(self.data, (key, value))
+
+    def get(self, key):
+        return binary_search_list(self.data, key)[0]
+
+    def scan(self, start, end):
+        low = bisect.bisect_left(self.data, (start,))
+        high = bisect.bisect_left(self.data, (end + 1,))
+        return sum(1 for _ in self.data[low:high])
+
+
+ENGINES = {engine.name: engine for engine in (BTreeCorrectedEngine, CachedBTreeCorrectedEngine,
+                                              BTreeEngine, BEpsilonTreeEngine, LSMEngine, SortedListEngine)}
+# Engines without a degree run once per size
+DEGREE_FREE = (LSMEngine, SortedListEngine)
+
+
+def make_dataset(num_records, seed):
+    """Shuffled (key, value) pairs with even keys, in a seed-determined order"""
+    pairs = [(key, f"Employee_{key}") for key in range(0, 2 * num_records, 2)]
+    random.Random(seed).shuffle(pairs)
+    return pairs
+
+
+def make_operations(workload, num_records, num_ops, seed, scan_length=100):
+    """The (op, key) stream for one workload; the same for every engine"""
+    (read, insert, _), distribution = WORKLOADS[workload]
+    rng = random.Random(f"{seed}-{workload}")
+
+    if distribution == "zipfian":
+        keys = zipf_keys(range(0, 2 * num_records, 2), num_ops, seed=rng.randrange(2**32))
+    else:
+        keys = [2 * rng.randrange(num_records) for _ in range(num_ops)]
+
+    operations = []
+    for key in keys:
+        draw = rng.random()
+        if draw < read:
+            operations.append(("read", key))
+        elif draw < read + insert:
+            operations.append(("insert", 2 * rng.randrange(num_records) + 1))
+        else:
+            operations.append(("scan", key, key + 2 * rng.randint(1, scan_length)))
+    return operations
+
+
+def close(engine):
+    """Release files or threads an engine holds"""
+    if hasattr(engine, "close"):
+        engine.close()
+
+
+def build(engine_class, degree, dataset):
+    engine = engine_class(degree)
+    for key, value in dataset:
+        engine.put(key, value)
+    return engine
+
+
+def measure_peak_memory(engine_class, degree, dataset):
+    """Peak bytes allocated while building, in its own run so timings are unaffected"""
+    tracemalloc.start()
+    try:
+        engine = build(engine_class, degree, dataset)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    close(engine)
+    return peak
+
+
+def run_workload(engine, operations):
+    """Run an operation stream, returning lookup latencies (ns), scanned rows, scan time and total time"""
+    clock = time.perf_counter_ns
+    lookup_ns = []
+    scanned_rows = 0
+    scan_ns = 0
+
+    start_time = clock()
+    for operation in operations:
+        kind = operation[0]
+        if kind == "read":
+            op_start = clock()
+            engine.get(operation[1])
+            lookup_ns.append(clock() - op_start)
+        elif kind == "insert":
+            engine.put(operation[1], "new")
+        else:
+            op_start = clock()
+            scanned_rows += engine.scan(operation[1], operation[2])
+            scan_ns += clock() - op_start
+    total_ns = clock() - start_time
+    return lookup_ns, scanned_rows, scan_ns, total_ns
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_once(engine_class, degree, dataset, operations):
+    """Build a fresh engine and run one workload on it, returning the timing metrics"""
+    gc.collect()
+    start_time = time.perf_counter()
+    engine = build(engine_class, degree, dataset)
+    build_s = time.perf_counter() - start_time
+
+    gc.collect()
+    lookup_ns, scanned_rows, scan_ns, total_ns = run_workload(engine, operations)
+    p50 = percentile(lookup_ns, 0.50)
+    p99 = percentile(lookup_ns, 0.99)
+    cache = getattr(engine, "cache", None)
+    cache_hit_rate = cache.stats()["hit_rate"] if cache is not None else None
+    close(engine)
+    return {
+        "build_s": build_s,
+        "ops_per_s": len(operations) * 1e9 / total_ns,
+        "lookup_p50_us": p50 / 1000 if p50 is not None else None,
+        "lookup_p99_us": p99 / 1000 if p99 is not None else None,
+        "scan_rows_per_s": scanned_rows * 1e9 / scan_ns if scan_ns else None,
+        "cache_hit_rate": cache_hit_rate,
+    }
+
+
+def run_suite(engines, workloads, sizes, degrees, num_ops, seed, repeat=3, memory=True, log=print):
+    results = []
+    for num_records in sizes:
+        dataset = make_dataset(num_records, seed)
+        for workload in workloads:
+            operations = make_operations(workload, num_records, num_ops, seed)
+            for engine_name in engines:
+                engine_class = ENGINES[engine_name]
+                for degree in (degrees if engine_class not in DEGREE_FREE else [None]):
+                    runs = [run_once(engine_class, degree, dataset, operations) for _ in range(repeat)]
+
+                    result = {
+                        "engine": engine_name,
+                        "workload": workload,
+                        "records": num_records,
+                        "degree": degree,
+                        "peak_memory_bytes": measure_peak_memory(engine_class, degree, dataset) if memory else None,
+                    }
+                    for metric in runs[0]:
+                        values = [run[metric] for run in runs if run[metric] is not None]
+                        result[metric] = statistics.median(values) if values else None
+                    results.append(result)
+                    log(format_result(result))
+    return results
+
+
+def _format_metric(value, spec):
+    return format(value, spec) if value is not None else "-".rjust(len(format(0, spec)))
+
+
+def format_result(result):
+    degree = "-" if result["degree"] is None else result["degree"]
+    memory = result["peak_memory_bytes"]
+    hit_rate = result.get("cache_hit_rate")
+    return (f"  {result['engine']:<22} {result['workload']:<12} n={result['records']:<9,} d={degree:<5} "
+            f"build {result['build_s']:7.3f}s  "
+            f"{_format_metric(result['ops_per_s'], '10,.0f')} ops/s  "
+            f"p50 {_format_metric(result['lookup_p50_us'], '7.2f')} μs  "
+            f"p99 {_format_metric(result['lookup_p99_us'], '7.2f')} μs  "
+            f"scan {_format_metric(result['scan_rows_per_s'], '12,.0f')} rows/s  "
+            f"mem {_format_metric(memory / 2**20 if memory is not None else None, '7.1f')} MiB"
+            + (f"  cache hits {hit_rate:.1%}" if hit_rate is not None else ""))
+
+
+def result_key(result):
+    return (result["engine"], result["workload"], result["records"], result["degree"])
+
+
+def compare(baseline, current, threshold=0.10):
+    """Return a line for every metric that got worse than the baseline by more than threshold"""
+    baseline_results = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = baseline_results.get(result_key(result))
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            before, after = old.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (-change if higher_is_better else change) > threshold:
+                engine, workload, records, degree = result_key(result)
+                regressions.append(f"{engine} {workload} n={records} d={degree}: "
+                                   f"{metric} {before:.4g} -> {after:.4g} ({change:+.1%})")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Reproducible B-tree benchmark suite")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--workloads", nargs="+", default=list(WORKLOADS), choices=list(WORKLOADS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100_000], help="Dataset sizes (records)")
+    parser.add_argument("--degrees", nargs="+", type=int, default=[10, 50, 200], help="Minimum degrees to test")
+    parser.add_argument("--ops", type=int, default=20_000, help="Operations per workload")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache-size", type=int, default=CachedBTreeCorrectedEngine.cache_size,
+                        help="Entries in the lookup cache of the cached engine")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the median is reported")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc build pass")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="Flag regressions against a saved JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative change counted as a regression (default 0.10 = 10%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    CachedBTreeCorrectedEngine.cache_size = args.cache_size
+
+    print("=" * 80)
+    print(f"B-TREE BENCHMARK SUITE (seed {args.seed}, {args.ops:,} ops per workload)")
+    print("=" * 80)
+    results = run_suite(args.engines, args.workloads, args.sizes, args.degrees, args.ops,
+                        args.seed, args.repeat, memory=not args.no_memory)
+
+    report = {
+        "meta": {
+            "seed": args.seed,
+            "ops": args.ops,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["meta"].get("seed") != args.seed or baseline["meta"].get("ops") != args.ops:
+            print("\n⚠️  Baseline was recorded with a different seed or operation count")
+        regressions = compare(baseline, report, args.threshold)
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%} against {args.compare}")
+        for line in regressions:
+            print(f"  ✘ {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,39 +1,141 @@
+import bisect
+import random
+import weakref
+from array import array
+from collections import Counter
+
+from bloom import BloomFilter
+from disk_btree import DiskBTree
+from lookup_cache import LookupCache, MISS
+from lsm import LSMTree
+from tracing import Tracer, ConsoleTracer, NULL_TRACER
+from wal import WriteAheadLog
+
 class BTreeNode:
-    def __init__(self, leaf=False):
+    __slots__ = ('keys', 'values', 'children', 'leaf', 'next', 'prev', 'version')
+    
+    def __init__(self, leaf=False, version=0):
         self.keys = []  # List of keys (primary keys or indexed values)
-        self.values = []  # List of associated data records
+        self.values = []  # List of associated data records (leaves only in B+ mode)
         self.children = []  # List of child nodes
         self.leaf = leaf  # True if leaf node, False if internal node
+        self.next = None  # Right sibling leaf (B+ mode only)
+        self.prev = None  # Left sibling leaf (B+ mode only)
+        self.version = version  # Tree version that created it; older nodes may be shared with snapshots
     
     def __str__(self):
         return f"Keys: {self.keys}"
 
+STORAGE_MODES = ("btree", "bplus")
+TABLE_ENGINES = ("btree", "lsm")
+
 class BTree:
-    def __init__(self, degree=3):
+    def __init__(self, degree=3, storage="btree", tracer=None):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode {storage!r}, expected one of {STORAGE_MODES}")
         self.root = BTreeNode(leaf=True)
         self.degree = degree  # Minimum degree (t), max keys = 2t-1, min keys = t-1
+        # "bplus" keeps values only in leaves and chains the leaves together
+        self.bplus = storage == "bplus"
+        self.tracer = tracer if tracer is not None else NULL_TRACER
+        # Skip the hook calls entirely for the silent default tracer
+        self.tracing = type(self.tracer) is not Tracer
+        
+        # Copy-on-write state: nodes older than self.version are shared with
+        # a snapshot and are copied before they are changed, but only while
+        # some snapshot is still alive
+        self.version = 0
+        self.snapshots = weakref.WeakSet()
+        
+        # Structure counters kept up to date by every change, read by stats()
+        self.height = 1
+        self.node_count = 1
+        self.key_count = 0
+        self.splits = 0
+        self.leaf_fill = [0] * (2 * degree)  # Number of leaves holding i keys
+        self.leaf_fill[0] = 1
+        
+        self.cache = None  # Optional LookupCache in front of search(), see enable_cache()
+    
+    def enable_cache(self, capacity=4096, max_bytes=None):
+        """Put an LRU cache of search results in front of search(); every write invalidates its key"""
+        self.cache = LookupCache(capacity, max_bytes)
+        return self.cache
+    
+    def disable_cache(self):
+        self.cache = None
+    
+    def snapshot(self):
+        """Return a read-only view of the tree as it is now
+
+        Taking one is O(1). Later writes copy each node on their path before
+        changing it (path copying), so the snapshot keeps seeing the old nodes
+        and is never blocked or disturbed by writers. Nodes only a snapshot
+        still refers to are freed together with it.
+        """
+        snapshot = BTreeSnapshot(self)
+        self.snapshots.add(snapshot)
+        self.version += 1
+        return snapshot
+    
+    def _copy_node(self, node):
+        """Private copy of a shared node for the live tree"""
+        copy = BTreeNode(leaf=node.leaf, version=self.version)
+        copy.keys = list(node.keys)
+        copy.values = list(node.values)
+        copy.children = list(node.children)
+        if self.bplus and node.leaf:
+            # Relink the live leaf chain; snapshots never follow these links
+            copy.next = node.next
+            copy.prev = node.prev
+            if node.next is not None:
+                node.next.prev = copy
+            if node.prev is not None:
+                node.prev.next = copy
+        return copy
+    
+    def _writable_root(self):
+        if self.snapshots and self.root.version != self.version:
+            self.root = self._copy_node(self.root)
+        return self.root
+    
+    def _writable_child(self, node, index):
+        """Child index of a writable node, copied first if a snapshot may share it"""
+        child = node.children[index]
+        if self.snapshots and child.version != self.version:
+            child = self._copy_node(child)
+            node.children[index] = child
+        return child
     
     def insert(self, key, value):
         """Insert a key-value pair into the B-tree"""
-        print(f"\n=== INSERTING ({key}, {value}) ===")
+        if self.tracing:
+            self.tracer.on_insert(self, key, value)
+        if self.cache is not None:
+            self.cache.invalidate(key)
         
         root = self.root
         
         # If root is full, create new root
         if len(root.keys) == (2 * self.degree) - 1:
-            new_root = BTreeNode()
+            new_root = BTreeNode(version=self.version)
             self.root = new_root
+            self.height += 1
+            self.node_count += 1
             new_root.children.append(root)
             self._split_child(new_root, 0)
             self._insert_non_full(new_root, key, value)
         else:
-            self._insert_non_full(root, key, value)
+            self._insert_non_full(self._writable_root(), key, value)
         
-        print(f"After inserting ({key}, {value}):")
-        self.display()
+        if self.tracing:
+            self.tracer.on_insert_done(self, key, value)
     
     def _insert_non_full(self, node, key, value):
         """Insert into a node that is not full"""
+        if self.tracing:
+            self.tracer.on_visit(self, node)
+        
         i = len(node.keys) - 1
         
         if node.leaf:
@@ -49,10 +151,12 @@ class BTree:
             
             node.keys[i + 1] = key
             node.values[i + 1] = value
+            self.key_count += 1
+            self.leaf_fill[len(node.keys) - 1] -= 1
+            self.leaf_fill[len(node.keys)] += 1
             
-            # Check if this insertion will cause a split on next insertion
-            if len(node.keys) == (2 * self.degree) - 1:
-                print(f"⚠️  Node is now full with {len(node.keys)} keys (max capacity reached)")
+            if self.tracing and len(node.keys) == (2 * self.degree) - 1:
+                self.tracer.on_node_full(self, node)
         else:
             # Find child to insert into
             while i >= 0 and key < node.keys[i]:
@@ -61,29 +165,48 @@ class BTree:
             
             # If child is full, split it
             if len(node.children[i].keys) == (2 * self.degree) - 1:
-                print(f"Child node is full, splitting required...")
                 self._split_child(node, i)
-                if key > node.keys[i]:
+                # In B+ mode the separator is a copy of the right node's first key
+                if key > node.keys[i] or (self.bplus and key == node.keys[i]):
                     i += 1
             
-            self._insert_non_full(node.children[i], key, value)
+            self._insert_non_full(self._writable_child(node, i), key, value)
     
     def _split_child(self, parent, index):
         """Split a full child node"""
         degree = self.degree
-        full_child = parent.children[index]
-        new_child = BTreeNode(leaf=full_child.leaf)
+        full_child = self._writable_child(parent, index)
+        new_child = BTreeNode(leaf=full_child.leaf, version=self.version)
         
         # Calculate the middle index
         mid_index = degree - 1
         
+        if self.tracing:
+            self.tracer.on_split(self, full_child, mid_index)
+        
+        if self.bplus:
+            self._split_child_bplus(parent, index, full_child, new_child, mid_index)
+        else:
+            self._split_child_btree(parent, index, full_child, new_child, mid_index)
+        
+        self.splits += 1
+        self.node_count += 1
+        if full_child.leaf:
+            self.leaf_fill[(2 * degree) - 1] -= 1
+            self.leaf_fill[len(full_child.keys)] += 1
+            self.leaf_fill[len(new_child.keys)] += 1
+        
+        if self.tracing:
+            self.tracer.on_split_done(self, parent, index)
+    
+    def _split_child_btree(self, parent, index, full_child, new_child, mid_index):
+        """Split a full child in classic mode: the middle element moves up"""
+        degree = self.degree
+        
         # Store the middle key and value before modifying the arrays
         mid_key = full_child.keys[mid_index]
         mid_value = full_child.values[mid_index]
         
-        # Show the node before splitting with highlighted middle element
-        print(f"Before splitting: {self._format_node_for_split(full_child, mid_index)}")
-        
         # Move the right half of keys/values to new child
         new_child.keys = full_child.keys[degree:]
         new_child.values = full_child.values[degree:]
@@ -101,36 +224,96 @@ class BTree:
         parent.children.insert(index + 1, new_child)
         parent.keys.insert(index, mid_key)
         parent.values.insert(index, mid_value)
-        
-        print(f"Middle element promoted: \033[91m({mid_key}, '{mid_value}')\033[0m")
     
-    def _format_node_for_split(self, node, mid_index):
-        """Format a node for display before splitting, highlighting the middle element"""
-        node_type = "LEAF" if node.leaf else "NODE"
-        formatted_pairs = []
+    def _split_child_bplus(self, parent, index, full_child, new_child, mid_index):
+        """Split a full child in B+ mode: leaves copy their separator up, internal nodes move it"""
+        mid_key = full_child.keys[mid_index]
         
-        for i, (key, value) in enumerate(zip(node.keys, node.values)):
-            if i == mid_index:
-                # Highlight the middle element in red
-                formatted_pairs.append(f"\033[91m({key}, '{value}')\033[0m")
-            else:
-                formatted_pairs.append(f"({key}, '{value}')")
+        if full_child.leaf:
+            # The right leaf keeps the middle key, the parent only gets a copy
+            new_child.keys = full_child.keys[mid_index:]
+            new_child.values = full_child.values[mid_index:]
+            full_child.keys = full_child.keys[:mid_index]
+            full_child.values = full_child.values[:mid_index]
+            
+            # Link the new leaf into the sibling chain
+            new_child.next = full_child.next
+            new_child.prev = full_child
+            if full_child.next is not None:
+                full_child.next.prev = new_child
+            full_child.next = new_child
+        else:
+            new_child.keys = full_child.keys[mid_index + 1:]
+            full_child.keys = full_child.keys[:mid_index]
+            new_child.children = full_child.children[mid_index + 1:]
+            full_child.children = full_child.children[:mid_index + 1]
         
-        return f"{node_type}: [{', '.join(formatted_pairs)}]"
+        parent.children.insert(index + 1, new_child)
+        parent.keys.insert(index, mid_key)
     
     def search(self, key):
         """Search for a key in the B-tree (SQL SELECT operation)"""
-        print(f"\n=== SEARCHING for key {key} ===")
-        result = self._search_node(self.root, key)
-        if result:
-            print(f"Found: Key={result[0]}, Value={result[1]}")
-            return result
-        else:
-            print(f"Key {key} not found")
-            return None
+        cache = self.cache
+        result = MISS if cache is None else cache.get(key)
+        if result is MISS:
+            if self.bplus:
+                result = next(self.scan(key, key), None)
+            else:
+                result = self._search_node(self.root, key)
+            if cache is not None:
+                cache.put(key, result)
+        
+        if self.tracing:
+            self.tracer.on_search(self, key, result)
+        return result
+    
+    def search_many(self, keys):
+        """Look up several keys with one shared descent; returns what search() would for each, in order
+
+        The distinct keys are sorted once and split between the children at
+        every node, so a node on the path of many keys is visited once per
+        batch instead of once per key.
+        """
+        batch = sorted(set(keys))
+        results = {}
+        stack = [(self.root, batch)] if batch else []
+        
+        while stack:
+            node, group = stack.pop()
+            if self.tracing:
+                self.tracer.on_visit(self, node)
+            node_keys = node.keys
+            groups = {}
+            
+            for key in group:
+                i = bisect.bisect_left(node_keys, key)
+                if node.leaf:
+                    leaf = node
+                    # B+ search continues along the chain like scan(key, key) does
+                    while self.bplus and i == len(leaf.keys) and leaf.next is not None:
+                        leaf = leaf.next
+                        i = 0
+                    if i < len(leaf.keys) and leaf.keys[i] == key:
+                        results[key] = (key, leaf.values[i])
+                elif not self.bplus and i < len(node_keys) and node_keys[i] == key:
+                    results[key] = (key, node.values[i])
+                else:
+                    groups.setdefault(i, []).append(key)
+            
+            for i, child_group in groups.items():
+                stack.append((node.children[i], child_group))
+        
+        found = [results.get(key) for key in keys]
+        if self.tracing:
+            for key, result in zip(keys, found):
+                self.tracer.on_search(self, key, result)
+        return found
     
     def _search_node(self, node, key):
         """Recursively search for key in node"""
+        if self.tracing:
+            self.tracer.on_visit(self, node)
+        
         i = 0
         
         # Find the first key greater than or equal to search key
@@ -150,42 +333,349 @@ class BTree:
     
     def range_search(self, start_key, end_key):
         """Search for all keys in a range (SQL SELECT with WHERE clause)"""
-        print(f"\n=== RANGE SEARCH: {start_key} to {end_key} ===")
-        results = []
-        self._range_search_node(self.root, start_key, end_key, results)
-        
-        if results:
-            print("Found records:")
-            for key, value in results:
-                print(f"  Key={key}, Value={value}")
-        else:
-            print("No records found in range")
+        results = list(self.scan(start_key, end_key))
         
+        if self.tracing:
+            self.tracer.on_range_search(self, start_key, end_key, results)
         return results
     
-    def _range_search_node(self, node, start_key, end_key, results):
-        """Recursively search for keys in range"""
-        i = 0
+    def scan(self, start=None, end=None, reverse=False):
+        """Lazily yield (key, value) pairs with start <= key <= end (None means unbounded)"""
+        if self.bplus:
+            if reverse:
+                return self._scan_leaves_reverse(start, end)
+            return self._scan_leaves(start, end)
+        if reverse:
+            return self._scan_node_reverse(self.root, start, end)
+        return self._scan_node(self.root, start, end)
+    
+    def _scan_node(self, node, start, end):
+        """In-order scan of a subtree, skipping children that lie below start"""
+        i = 0 if start is None else bisect.bisect_left(node.keys, start)
         
-        # Process each key in current node
         while i < len(node.keys):
-            # If not leaf, search left child first
+            # The left child of the first key >= start may still hold keys in range
             if not node.leaf:
-                self._range_search_node(node.children[i], start_key, end_key, results)
-            
-            # Check if current key is in range
-            if start_key <= node.keys[i] <= end_key:
-                results.append((node.keys[i], node.values[i]))
+                yield from self._scan_node(node.children[i], start, end)
             
-            # If current key exceeds end_key, no need to continue
-            if node.keys[i] > end_key:
+            key = node.keys[i]
+            if end is not None and key > end:
                 return
-            
+            yield (key, node.values[i])
             i += 1
         
-        # Search rightmost child if not leaf
         if not node.leaf:
-            self._range_search_node(node.children[i], start_key, end_key, results)
+            yield from self._scan_node(node.children[i], start, end)
+    
+    def _scan_node_reverse(self, node, start, end):
+        """Reverse in-order scan of a subtree, skipping children that lie above end"""
+        i = len(node.keys) if end is None else bisect.bisect_right(node.keys, end)
+        
+        while i > 0:
+            if not node.leaf:
+                yield from self._scan_node_reverse(node.children[i], start, end)
+            
+            key = node.keys[i - 1]
+            if start is not None and key < start:
+                return
+            yield (key, node.values[i - 1])
+            i -= 1
+        
+        if not node.leaf:
+            yield from self._scan_node_reverse(node.children[0], start, end)
+    
+    def _find_leaf(self, key, right=False):
+        """Descend to the leaf where key belongs (B+ mode); None picks the outermost leaf"""
+        node = self.root
+        while not node.leaf:
+            if self.tracing:
+                self.tracer.on_visit(self, node)
+            if key is None:
+                i = len(node.keys) if right else 0
+            elif right:
+                i = bisect.bisect_right(node.keys, key)
+            else:
+                i = bisect.bisect_left(node.keys, key)
+            node = node.children[i]
+        return node
+    
+    def _scan_leaves(self, start, end):
+        """Walk the leaf chain forwards from start (B+ mode)"""
+        leaf = self._find_leaf(start)
+        i = 0 if start is None else bisect.bisect_left(leaf.keys, start)
+        
+        while leaf is not None:
+            keys = leaf.keys
+            while i < len(keys):
+                if end is not None and keys[i] > end:
+                    return
+                yield (keys[i], leaf.values[i])
+                i += 1
+            leaf = leaf.next
+            i = 0
+    
+    def _scan_leaves_reverse(self, start, end):
+        """Walk the leaf chain backwards from end (B+ mode)"""
+        leaf = self._find_leaf(end, right=True)
+        i = len(leaf.keys) if end is None else bisect.bisect_right(leaf.keys, end)
+        
+        while leaf is not None:
+            while i > 0:
+                i -= 1
+                if start is not None and leaf.keys[i] < start:
+                    return
+                yield (leaf.keys[i], leaf.values[i])
+            leaf = leaf.prev
+            if leaf is not None:
+                i = len(leaf.keys)
+    
+    def delete(self, key):
+        """Delete one occurrence of key (SQL DELETE), returning True if it was found
+
+        Every node on the way down is topped up to at least t keys first (by
+        borrowing from a sibling or merging with it), so the removal itself
+        never leaves a node underfull.
+        """
+        if self.cache is not None:
+            self.cache.invalidate(key)
+        removed = self._delete(key)
+        
+        # A root emptied by a merge hands over to its only child
+        if not self.root.keys and not self.root.leaf:
+            self.root = self.root.children[0]
+            self.height -= 1
+            self.node_count -= 1
+        
+        if self.tracing:
+            self.tracer.on_delete(self, key, removed)
+        return removed
+    
+    def _delete(self, key):
+        min_keys = self.degree - 1
+        node = self._writable_root()
+        
+        while True:
+            if self.tracing:
+                self.tracer.on_visit(self, node)
+            
+            if node.leaf:
+                pos = bisect.bisect_left(node.keys, key)
+                if pos < len(node.keys) and node.keys[pos] == key:
+                    del node.keys[pos]
+                    del node.values[pos]
+                    self.key_count -= 1
+                    self.leaf_fill[len(node.keys) + 1] -= 1
+                    self.leaf_fill[len(node.keys)] += 1
+                    return True
+                return False
+            
+            if self.bplus:
+                # Separators are copies, the key itself always lives in a leaf;
+                # duplicates equal to a separator may sit on either side of it
+                pos = self._child_holding(node, key)
+            else:
+                pos = bisect.bisect_left(node.keys, key)
+                if pos < len(node.keys) and node.keys[pos] == key:
+                    node = self._delete_internal(node, pos)
+                    if node is None:
+                        return True
+                    continue
+            
+            if len(node.children[pos].keys) == min_keys:
+                pos = self._fill_child(node, pos)
+            node = self._writable_child(node, pos)
+    
+    def _child_holding(self, node, key):
+        """Index of the first child of a B+ node whose subtree holds key (or where it belongs)"""
+        low = bisect.bisect_left(node.keys, key)
+        high = bisect.bisect_right(node.keys, key)
+        for i in range(low, high):
+            if self._subtree_holds(node.children[i], key):
+                return i
+        return high
+    
+    def _subtree_holds(self, node, key):
+        while not node.leaf:
+            low = bisect.bisect_left(node.keys, key)
+            high = bisect.bisect_right(node.keys, key)
+            if any(self._subtree_holds(node.children[i], key) for i in range(low, high)):
+                return True
+            node = node.children[high]
+        pos = bisect.bisect_left(node.keys, key)
+        return pos < len(node.keys) and node.keys[pos] == key
+    
+    def _delete_internal(self, node, pos):
+        """Take the key at pos out of an internal node
+
+        The key is replaced by its predecessor or successor, and that exact
+        entry is then removed from the end of its subtree (searching for it
+        by key could hit a duplicate), or both children are merged around it.
+        Returns the merged subtree to continue in, or None once the key is gone.
+        """
+        left = node.children[pos]
+        right = node.children[pos + 1]
+        
+        if len(left.keys) > self.degree - 1:
+            pred = left
+            while not pred.leaf:
+                pred = pred.children[-1]
+            node.keys[pos], node.values[pos] = pred.keys[-1], pred.values[-1]
+            self._delete_outermost(self._writable_child(node, pos), last=True)
+            return None
+        
+        if len(right.keys) > self.degree - 1:
+            succ = right
+            while not succ.leaf:
+                succ = succ.children[0]
+            node.keys[pos], node.values[pos] = succ.keys[0], succ.values[0]
+            self._delete_outermost(self._writable_child(node, pos + 1), last=False)
+            return None
+        
+        self._merge_children(node, pos)
+        return node.children[pos]
+    
+    def _delete_outermost(self, node, last):
+        """Remove the last (or first) entry of a subtree, topping up nodes on the way down"""
+        while not node.leaf:
+            if self.tracing:
+                self.tracer.on_visit(self, node)
+            pos = len(node.keys) if last else 0
+            if len(node.children[pos].keys) == self.degree - 1:
+                pos = self._fill_child(node, pos)
+            node = self._writable_child(node, pos)
+        
+        if self.tracing:
+            self.tracer.on_visit(self, node)
+        del node.keys[-1 if last else 0]
+        del node.values[-1 if last else 0]
+        self.key_count -= 1
+        self.leaf_fill[len(node.keys) + 1] -= 1
+        self.leaf_fill[len(node.keys)] += 1
+    
+    def _fill_child(self, node, pos):
+        """Give a minimal child an extra key; returns the index of the child to descend into"""
+        min_keys = self.degree - 1
+        
+        if pos > 0 and len(node.children[pos - 1].keys) > min_keys:
+            # Borrow from the left sibling
+            child = self._writable_child(node, pos)
+            left = self._writable_child(node, pos - 1)
+            if self.bplus and child.leaf:
+                child.keys.insert(0, left.keys.pop())
+                child.values.insert(0, left.values.pop())
+                node.keys[pos - 1] = child.keys[0]
+            else:
+                child.keys.insert(0, node.keys[pos - 1])
+                node.keys[pos - 1] = left.keys.pop()
+                if not self.bplus:
+                    child.values.insert(0, node.values[pos - 1])
+                    node.values[pos - 1] = left.values.pop()
+                if not child.leaf:
+                    child.children.insert(0, left.children.pop())
+            if child.leaf:
+                self._leaf_moved(left, child)
+            return pos
+        
+        if pos < len(node.keys) and len(node.children[pos + 1].keys) > min_keys:
+            # Borrow from the right sibling
+            child = self._writable_child(node, pos)
+            right = self._writable_child(node, pos + 1)
+            if self.bplus and child.leaf:
+                child.keys.append(right.keys.pop(0))
+                child.values.append(right.values.pop(0))
+                node.keys[pos] = right.keys[0]
+            else:
+                child.keys.append(node.keys[pos])
+                node.keys[pos] = right.keys.pop(0)
+                if not self.bplus:
+                    child.values.append(node.values[pos])
+                    node.values[pos] = right.values.pop(0)
+                if not child.leaf:
+                    child.children.append(right.children.pop(0))
+            if child.leaf:
+                self._leaf_moved(right, child)
+            return pos
+        
+        # No sibling can spare a key: merge with one
+        if pos < len(node.keys):
+            self._merge_children(node, pos)
+            return pos
+        self._merge_children(node, pos - 1)
+        return pos - 1
+    
+    def _leaf_moved(self, donor, receiver):
+        """Update the fill histogram after one key went from donor to receiver (both leaves)"""
+        fill = self.leaf_fill
+        fill[len(donor.keys) + 1] -= 1
+        fill[len(donor.keys)] += 1
+        fill[len(receiver.keys) - 1] -= 1
+        fill[len(receiver.keys)] += 1
+    
+    def _merge_children(self, node, index):
+        """Merge children index and index + 1 of node"""
+        left = self._writable_child(node, index)
+        right = node.children[index + 1]
+        
+        self.node_count -= 1
+        if left.leaf:
+            # B+ leaves merge without the separator, classic ones take it along
+            merged = len(left.keys) + len(right.keys) + (0 if self.bplus else 1)
+            self.leaf_fill[len(left.keys)] -= 1
+            self.leaf_fill[len(right.keys)] -= 1
+            self.leaf_fill[merged] += 1
+        
+        if self.bplus and left.leaf:
+            # Leaves hold every key already, the separator just disappears
+            left.keys.extend(right.keys)
+            left.values.extend(right.values)
+            left.next = right.next
+            if right.next is not None:
+                right.next.prev = left
+        else:
+            left.keys.append(node.keys[index])
+            left.keys.extend(right.keys)
+            if not self.bplus:
+                left.values.append(node.values[index])
+                left.values.extend(right.values)
+            left.children.extend(right.children)
+        
+        del node.keys[index]
+        if not self.bplus:
+            del node.values[index]
+        del node.children[index + 1]
+    
+    def delete_range(self, start_key, end_key):
+        """Delete every key with start_key <= key <= end_key, returning how many were removed"""
+        keys = [key for key, _ in self.scan(start_key, end_key)]
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+    
+    def stats(self):
+        """Structure statistics from counters kept up to date by every change (no traversal)"""
+        max_keys = (2 * self.degree) - 1
+        leaves = sum(self.leaf_fill)
+        
+        # Leaves bucketed by how full they are, in steps of 10%
+        fill_deciles = [0] * 10
+        leaf_keys = 0
+        for count, leaf_count in enumerate(self.leaf_fill):
+            if leaf_count:
+                fill_deciles[min(9, count * 10 // max_keys)] += leaf_count
+                leaf_keys += count * leaf_count
+        
+        return {
+            'height': self.height,
+            'nodes': self.node_count,
+            'leaves': leaves,
+            'keys': self.key_count,
+            'splits': self.splits,
+            'degree': self.degree,
+            'storage': "bplus" if self.bplus else "btree",
+            'avg_leaf_fill': leaf_keys / (leaves * max_keys),
+            'leaf_fill': {f"{10 * i}-{10 * i + 10}%": n for i, n in enumerate(fill_deciles)},
+            'cache': self.cache.stats() if self.cache is not None else None,
+        }
     
     def display(self):
         """Display the B-tree structure"""
@@ -200,10 +690,13 @@ class BTree:
         
         if node.leaf:
             print(f"{indent}LEAF: {list(zip(node.keys, node.values))}")
+            return
+        if self.bplus:
+            print(f"{indent}NODE: {node.keys}")
         else:
             print(f"{indent}NODE: {list(zip(node.keys, node.values))}")
-            for child in node.children:
-                self._display_node(child, level + 1)
+        for child in node.children:
+            self._display_node(child, level + 1)
     
     def display_tree_visual(self):
         """Display the B-tree in a visual tree format"""
@@ -215,20 +708,12 @@ class BTree:
             print("Empty tree")
             return
         
-        # Calculate tree height for better formatting
-        height = self._get_height(self.root)
-        print(f"Tree Height: {height}")
+        print(f"Tree Height: {self.height}")
         print()
         
         self._display_visual_node(self.root, "", True, True)
         print("="*80)
     
-    def _get_height(self, node):
-        """Calculate the height of the tree"""
-        if node.leaf:
-            return 1
-        return 1 + max(self._get_height(child) for child in node.children)
-    
     def _display_visual_node(self, node, prefix, is_last, is_root=False):
         """Display node in visual tree format with branches"""
         # Create the node display string
@@ -243,7 +728,7 @@ class BTree:
         
         # Format keys and values for display
         if len(node.keys) <= 3:
-            content = str(list(zip(node.keys, node.values)))
+            content = str(list(zip(node.keys, node.values)) if node.values else node.keys)
         else:
             # Truncate if too many keys for clean display
             content = f"[{len(node.keys)} items: {node.keys[0]}...{node.keys[-1]}]"
@@ -265,15 +750,347 @@ class BTree:
                 is_last_child = (i == len(node.children) - 1)
                 self._display_visual_node(child, child_prefix, is_last_child)
 
+class BTreeSnapshot(BTree):
+    """Read-only view of a BTree at the moment BTree.snapshot() was called
+
+    Supports the same reads as the tree (search, scan, range_search,
+    display). The nodes it sees are never changed again: the live tree
+    copies them before writing.
+    """
+    
+    def __init__(self, tree):
+        self.root = tree.root
+        self.degree = tree.degree
+        self.bplus = tree.bplus
+        self.tracer = tree.tracer
+        self.tracing = tree.tracing
+        self.version = tree.version
+        
+        # The counters as they were at snapshot time
+        self.height = tree.height
+        self.node_count = tree.node_count
+        self.key_count = tree.key_count
+        self.splits = tree.splits
+        self.leaf_fill = list(tree.leaf_fill)
+        self.cache = None  # The live tree's cache follows its writes, not this snapshot
+    
+    def snapshot(self):
+        return self
+    
+    def insert(self, key, value):
+        raise TypeError("Snapshots are read-only")
+    
+    def delete(self, key):
+        raise TypeError("Snapshots are read-only")
+    
+    def delete_range(self, start_key, end_key):
+        raise TypeError("Snapshots are read-only")
+    
+    def scan(self, start=None, end=None, reverse=False):
+        """Lazily yield (key, value) pairs with start <= key <= end (None means unbounded)"""
+        if not self.bplus:
+            return super().scan(start, end, reverse)
+        # The live tree relinks shared leaves, so walk the tree instead of the chain
+        if reverse:
+            return self._scan_bplus_reverse(self.root, start, end)
+        return self._scan_bplus(self.root, start, end)
+    
+    def search_many(self, keys):
+        """Look up several keys; B+ snapshots search each one, since the shared leaf chain may have moved on"""
+        if not self.bplus:
+            return super().search_many(keys)
+        return [self.search(key) for key in keys]
+    
+    def _scan_bplus(self, node, start, end):
+        """In-order scan of a B+ subtree without using the leaf links"""
+        if node.leaf:
+            i = 0 if start is None else bisect.bisect_left(node.keys, start)
+            while i < len(node.keys) and (end is None or node.keys[i] <= end):
+                yield (node.keys[i], node.values[i])
+                i += 1
+            return
+        
+        # Child i only holds keys between separators i - 1 and i
+        i = 0 if start is None else bisect.bisect_left(node.keys, start)
+        while i < len(node.children):
+            if i > 0 and end is not None and node.keys[i - 1] > end:
+                return
+            yield from self._scan_bplus(node.children[i], start, end)
+            i += 1
+    
+    def _scan_bplus_reverse(self, node, start, end):
+        """Reverse in-order scan of a B+ subtree without using the leaf links"""
+        if node.leaf:
+            i = len(node.keys) if end is None else bisect.bisect_right(node.keys, end)
+            while i > 0 and (start is None or node.keys[i - 1] >= start):
+                yield (node.keys[i - 1], node.values[i - 1])
+                i -= 1
+            return
+        
+        i = len(node.keys) if end is None else bisect.bisect_right(node.keys, end)
+        while i >= 0:
+            if i < len(node.keys) and start is not None and node.keys[i] < start:
+                return
+            yield from self._scan_bplus_reverse(node.children[i], start, end)
+            i -= 1
+
 # Simulate SQL Database Operations using B-Tree
+# Write-ahead log opcodes
+LOG_CREATE_TABLE = 1
+LOG_INSERT = 2
+LOG_DELETE = 3
+LOG_DELETE_RANGE = 4
+LOG_CREATE_INDEX = 5
+
+# Bloom filters start with room for this many keys and are rebuilt at twice
+# the row count whenever they fill up or too many of their keys were deleted
+FILTER_MIN_CAPACITY = 1024
+
+def column_value(record, column):
+    """The value of column in a record, or None if the record has no such column
+
+    Dict records are looked up by name and tuple/list records by position;
+    column "value" stands for the whole record when it is a plain value.
+    """
+    if isinstance(record, dict):
+        return record.get(column)
+    if isinstance(record, (tuple, list)):
+        if isinstance(column, int) and -len(record) <= column < len(record):
+            return record[column]
+        return None
+    return record if column == "value" else None
+
+def _new_postings(key):
+    """Posting list for one primary key: a compact array('q') for ints, a list otherwise"""
+    if isinstance(key, int) and -2**63 <= key < 2**63:
+        return array('q', [key])
+    return [key]
+
 class SimpleSQLDatabase:
-    def __init__(self):
+    """Tables, secondary indexes and Bloom filters over the B-tree engines
+
+    With wal_path every change is appended to a write-ahead log before it
+    is applied, and the log is replayed on start. wal_sync picks the
+    WriteAheadLog fsync policy. The default "group" acknowledges writes
+    before they are fsynced, so a crash can lose the last group_records
+    records or group_ms of acknowledged writes. Use "always" when every
+    acknowledged write must survive, or call wal.commit() at the points
+    that need it.
+    """
+    
+    def __init__(self, tracer=None, wal_path=None, wal_sync="group", group_records=128, group_ms=5):
         self.tables = {}
+        self.table_options = {}  # CREATE TABLE arguments, needed to rewrite the log
+        # table -> column -> BTree from column value to a sorted posting list of primary keys
+        self.indexes = {}
+        self.filters = {}  # table -> BloomFilter of its primary keys, or None
+        self.filter_stale = {}  # table -> keys deleted since its filter was built
+        # Shared with every table; pass ConsoleTracer() to see each step
+        self.tracer = tracer if tracer is not None else NULL_TRACER
+        
+        # With a log, every change is appended before it is applied and the
+        # log is replayed here to recover the tables after a restart
+        self.wal = None
+        if wal_path is not None:
+            self.wal = WriteAheadLog(wal_path, wal_sync, group_records, group_ms)
+            for op, fields in self.wal.replay():
+                self._apply(op, fields)
+    
+    def _apply(self, op, fields):
+        """Apply one logged change without logging it again"""
+        if op == LOG_CREATE_TABLE:
+            self._open_table(*fields)
+        elif op == LOG_INSERT:
+            self._insert(*fields)
+        elif op == LOG_DELETE:
+            self._delete(*fields)
+        elif op == LOG_DELETE_RANGE:
+            self._delete_range(*fields)
+        elif op == LOG_CREATE_INDEX:
+            self._build_index(*fields)
+        else:
+            raise ValueError(f"Unknown log record type {op}")
+    
+    def create_table(self, table_name, degree=3, storage="btree", path=None, page_size=4096,
+                     bloom_fp_rate=None, engine="btree"):
+        """CREATE TABLE equivalent (storage="bplus" keeps rows in linked leaves)
+
+        With a path the table is stored in (or reopened from) a page file and
+        the degree follows from the page size instead. bloom_fp_rate (e.g.
+        0.01) adds a Bloom filter of the primary keys, so select_record can
+        reject most missing keys without searching the tree.
+        
+        engine="lsm" stores the table in an LSMTree in the directory path
+        instead: writes go to a memtable and sequential run files, which suits
+        append-mostly tables. Like disk tables, it replaces the row under a key.
+        """
+        if engine not in TABLE_ENGINES:
+            raise ValueError(f"Unknown table engine {engine!r}, expected one of {TABLE_ENGINES}")
+        if engine == "lsm" and path is None:
+            raise ValueError("LSM tables need a directory path for their run files")
+        
+        self.tracer.on_create_table(self, table_name)
+        options = (table_name, degree, storage, path, page_size, bloom_fp_rate, engine)
+        if self.wal is not None:
+            self.wal.append(LOG_CREATE_TABLE, *options)
+        self._open_table(*options)
+    
+    def _open_table(self, table_name, degree, storage, path, page_size, bloom_fp_rate=None, engine="btree"):
+        self.table_options[table_name] = (table_name, degree, storage, path, page_size, bloom_fp_rate, engine)
+        self.indexes[table_name] = {}
+        if engine == "lsm":
+            self.tables[table_name] = LSMTree(path, tracer=self.tracer)
+        elif path is not None:
+            self.tables[table_name] = DiskBTree(path, page_size, tracer=self.tracer)
+        else:
+            self.tables[table_name] = BTree(degree, storage, self.tracer)
+        
+        self.filters[table_name] = None
+        if bloom_fp_rate is not None:
+            # A reopened page file or LSM directory may already hold rows
+            self.rebuild_filter(table_name)
+    
+    def rebuild_filter(self, table_name):
+        """Rebuild a table's Bloom filter from its rows, e.g. after loading a tree directly"""
+        fp_rate = self.table_options[table_name][5]
+        if fp_rate is None:
+            return
+        keys = [key for key, _ in self.tables[table_name].scan()]
+        bloom = BloomFilter(max(FILTER_MIN_CAPACITY, 2 * len(keys)), fp_rate)
+        for key in keys:
+            bloom.add(key)
+        self.filters[table_name] = bloom
+        self.filter_stale[table_name] = 0
+    
+    def _filter_add(self, table_name, key):
+        bloom = self.filters[table_name]
+        if bloom is None:
+            return
+        bloom.add(key)
+        if bloom.count > bloom.capacity:
+            # Past its capacity the false-positive rate climbs quickly
+            self.rebuild_filter(table_name)
+    
+    def _filter_removed(self, table_name, count):
+        """Deleted keys stay in the filter as false positives until the next rebuild"""
+        bloom = self.filters[table_name]
+        if bloom is None or not count:
+            return
+        self.filter_stale[table_name] += count
+        if 4 * self.filter_stale[table_name] > bloom.count:
+            self.rebuild_filter(table_name)
+    
+    def create_index(self, table_name, column):
+        """CREATE INDEX ON table (column)
+
+        Keeps a second B-tree from each column value to the sorted primary keys
+        of the rows holding it (a posting list), so select_where can find them
+        without scanning the table. Rows without the column are not indexed.
+        """
+        if table_name not in self.tables:
+            print(f"Table {table_name} does not exist!")
+            return
+        if column in self.indexes[table_name]:
+            return
+        
+        self.tracer.on_statement(self, f"CREATE INDEX ON {table_name} ({column})")
+        if self.wal is not None:
+            self.wal.append(LOG_CREATE_INDEX, table_name, column)
+        self._build_index(table_name, column)
+    
+    def _build_index(self, table_name, column):
+        """Index every existing row of the table, inserting the values in sorted order"""
+        postings = {}
+        for key, record in self.tables[table_name].scan():
+            value = column_value(record, column)
+            if value is None:
+                continue
+            if value not in postings:
+                postings[value] = _new_postings(key)
+            elif postings[value][-1] != key:  # Rows come in key order, duplicates are adjacent
+                postings[value].append(key)
+        
+        index = BTree(self.table_options[table_name][1])
+        for value in sorted(postings):
+            index.insert(value, postings[value])
+        self.indexes[table_name][column] = index
+    
+    def _index_add(self, index, value, key):
+        found = index.search(value)
+        if found is None:
+            index.insert(value, _new_postings(key))
+            return
+        postings = found[1]
+        pos = bisect.bisect_left(postings, key)
+        if pos < len(postings) and postings[pos] == key:
+            return
+        try:
+            postings.insert(pos, key)
+        except (TypeError, OverflowError):
+            # A key that does not fit the int array: switch to a plain list
+            index.delete(value)
+            postings = list(postings)
+            postings.insert(pos, key)
+            index.insert(value, postings)
+    
+    def _index_remove(self, index, value, key):
+        found = index.search(value)
+        if found is None:
+            return
+        postings = found[1]
+        pos = bisect.bisect_left(postings, key)
+        if pos < len(postings) and postings[pos] == key:
+            del postings[pos]
+            if not postings:
+                index.delete(value)
     
-    def create_table(self, table_name, degree=3):
-        """CREATE TABLE equivalent"""
-        print(f"\n### Creating table '{table_name}' with B-Tree index ###")
-        self.tables[table_name] = BTree(degree)
+    def _reindex(self, table_name, key, before, after):
+        """Bring every index of a table in line after the rows stored under key changed"""
+        for column, index in self.indexes[table_name].items():
+            old = {column_value(record, column) for _, record in before}
+            new = {column_value(record, column) for _, record in after}
+            for value in old - new:
+                if value is not None:
+                    self._index_remove(index, value, key)
+            for value in new - old:
+                if value is not None:
+                    self._index_add(index, value, key)
+    
+    def _insert(self, table_name, key, value):
+        table = self.tables[table_name]
+        if self.indexes[table_name]:
+            # Disk and LSM tables replace the row under key, in-memory ones add another
+            before = list(table.scan(key, key))
+            table.insert(key, value)
+            self._reindex(table_name, key, before, list(table.scan(key, key)))
+        else:
+            table.insert(key, value)
+        self._filter_add(table_name, key)
+    
+    def _delete(self, table_name, key):
+        table = self.tables[table_name]
+        if self.indexes[table_name]:
+            before = list(table.scan(key, key))
+            removed = table.delete(key)
+            self._reindex(table_name, key, before, list(table.scan(key, key)))
+        else:
+            removed = table.delete(key)
+        if removed:
+            self._filter_removed(table_name, 1)
+        return removed
+    
+    def _delete_range(self, table_name, start_key, end_key):
+        table = self.tables[table_name]
+        rows = list(table.scan(start_key, end_key)) if self.indexes[table_name] else []
+        removed = table.delete_range(start_key, end_key)
+        for column, index in self.indexes[table_name].items():
+            for key, record in rows:
+                value = column_value(record, column)
+                if value is not None:
+                    self._index_remove(index, value, key)
+        if removed and self.filters[table_name] is not None:
+            self.rebuild_filter(table_name)  # A bulk delete, rebuild right away
+        return removed
     
     def insert_record(self, table_name, key, value):
         """INSERT INTO equivalent"""
@@ -281,8 +1098,38 @@ class SimpleSQLDatabase:
             print(f"Table {table_name} does not exist!")
             return
         
-        print(f"\nSQL: INSERT INTO {table_name} VALUES ({key}, '{value}')")
-        self.tables[table_name].insert(key, value)
+        self.tracer.on_statement(self, f"INSERT INTO {table_name} VALUES ({key}, '{value}')")
+        if self.wal is not None:
+            self.wal.append(LOG_INSERT, table_name, key, value)
+        self._insert(table_name, key, value)
+    
+    def delete_record(self, table_name, key):
+        """DELETE FROM table WHERE id = key"""
+        if table_name not in self.tables:
+            print(f"Table {table_name} does not exist!")
+            return
+        if isinstance(self.tables[table_name], DiskBTree):
+            print(f"Table {table_name} is disk-backed and does not support deletes!")
+            return
+        
+        self.tracer.on_statement(self, f"DELETE FROM {table_name} WHERE id = {key}")
+        if self.wal is not None:
+            self.wal.append(LOG_DELETE, table_name, key)
+        return self._delete(table_name, key)
+    
+    def delete_range(self, table_name, start_key, end_key):
+        """DELETE FROM table WHERE id BETWEEN start AND end"""
+        if table_name not in self.tables:
+            print(f"Table {table_name} does not exist!")
+            return
+        if isinstance(self.tables[table_name], DiskBTree):
+            print(f"Table {table_name} is disk-backed and does not support deletes!")
+            return
+        
+        self.tracer.on_statement(self, f"DELETE FROM {table_name} WHERE id BETWEEN {start_key} AND {end_key}")
+        if self.wal is not None:
+            self.wal.append(LOG_DELETE_RANGE, table_name, start_key, end_key)
+        return self._delete_range(table_name, start_key, end_key)
     
     def select_record(self, table_name, key):
         """SELECT * FROM table WHERE key = value"""
@@ -290,17 +1137,86 @@ class SimpleSQLDatabase:
             print(f"Table {table_name} does not exist!")
             return
         
-        print(f"\nSQL: SELECT * FROM {table_name} WHERE id = {key}")
+        self.tracer.on_statement(self, f"SELECT * FROM {table_name} WHERE id = {key}")
+        bloom = self.filters[table_name]
+        if bloom is not None and key not in bloom:
+            # Definitely absent: skip the descent (and any page reads) entirely
+            self.tracer.on_filter_reject(self, table_name, key)
+            return None
         return self.tables[table_name].search(key)
     
     def select_range(self, table_name, start_key, end_key):
-        """SELECT * FROM table WHERE key BETWEEN start AND end"""
+        """SELECT * FROM table WHERE key BETWEEN start AND end (rows are streamed)
+
+        In-memory tables are read from a snapshot (LSM scans are consistent by
+        themselves), so the rows are consistent even if the table changes while
+        they are being consumed.
+        """
         if table_name not in self.tables:
             print(f"Table {table_name} does not exist!")
             return
         
-        print(f"\nSQL: SELECT * FROM {table_name} WHERE id BETWEEN {start_key} AND {end_key}")
-        return self.tables[table_name].range_search(start_key, end_key)
+        self.tracer.on_statement(self, f"SELECT * FROM {table_name} WHERE id BETWEEN {start_key} AND {end_key}")
+        table = self.tables[table_name]
+        if isinstance(table, BTree):
+            table = table.snapshot()
+        return table.scan(start_key, end_key)
+    
+    def select_where(self, table_name, column, value):
+        """SELECT * FROM table WHERE column = value, through an index if there is one
+
+        Returns the matching (key, record) rows in key order. Without an index
+        on the column the whole table is scanned.
+        """
+        if table_name not in self.tables:
+            print(f"Table {table_name} does not exist!")
+            return
+        
+        self.tracer.on_statement(self, f"SELECT * FROM {table_name} WHERE {column} = '{value}'")
+        table = self.tables[table_name]
+        index = self.indexes[table_name].get(column)
+        if index is None:
+            return [(key, record) for key, record in table.scan()
+                    if value is not None and column_value(record, column) == value]
+        
+        found = index.search(value)
+        if found is None:
+            return []
+        rows = []
+        for key in found[1]:
+            rows.extend(row for row in table.scan(key, key) if column_value(row[1], column) == value)
+        return rows
+    
+    def checkpoint(self):
+        """Make the current state durable and truncate the write-ahead log
+
+        Disk tables are flushed to their page files and LSM tables write out
+        their memtable. In-memory tables have no other copy, so their rows are
+        written into the fresh log as one compacted run of inserts.
+        """
+        if self.wal is None:
+            return
+        
+        records = []
+        for table_name, table in self.tables.items():
+            records.append((LOG_CREATE_TABLE, self.table_options[table_name]))
+            if isinstance(table, (DiskBTree, LSMTree)):
+                table.flush()
+            else:
+                for key, value in table.scan():
+                    records.append((LOG_INSERT, (table_name, key, value)))
+            # Indexes are rebuilt from the rows when the log is replayed
+            for column in self.indexes[table_name]:
+                records.append((LOG_CREATE_INDEX, (table_name, column)))
+        self.wal.checkpoint(records)
+    
+    def close(self):
+        """Flush and close every disk-backed and LSM table and the log"""
+        for table in self.tables.values():
+            if isinstance(table, (DiskBTree, LSMTree)):
+                table.close()
+        if self.wal is not None:
+            self.wal.close()
     
     def show_table_structure(self, table_name):
         """Show the B-tree structure of a table"""
@@ -314,16 +1230,108 @@ class SimpleSQLDatabase:
         # Also show visual tree format
         self.tables[table_name].display_tree_visual()
 
+def run_duplicate_key_test(seeds=40, operations=600):
+    """Random inserts and deletes with many repeated keys, checked against a multiset of rows
+
+    Every delete must remove exactly one row with its key, and only when
+    search() can see one, in both storage modes and through the database.
+    """
+    errors = []
+    
+    # Deleting an internal key used to re-delete its predecessor by key and hit a duplicate
+    tree = BTree(2)
+    for value, key in enumerate([1, 3, 2, 1, 1]):
+        tree.insert(key, value)
+    tree.delete(2)
+    if sorted(tree.scan()) != [(1, 0), (1, 3), (1, 4), (3, 1)]:
+        errors.append(f"btree delete(2) left {list(tree.scan())}")
+    
+    db = SimpleSQLDatabase()
+    db.create_table("rows", degree=2)
+    for value, key in enumerate([1, 3, 2, 1, 1]):
+        db.insert_record("rows", key, f"r{value}")
+    db.delete_record("rows", 2)
+    if sorted(db.select_range("rows", None, None)) != [(1, 'r0'), (1, 'r3'), (1, 'r4'), (3, 'r1')]:
+        errors.append(f"delete_record left {list(db.select_range('rows', None, None))}")
+    
+    # B+ duplicates equal to a separator can sit in the leaf left of it
+    tree = BTree(2, "bplus")
+    for value, key in enumerate([3, 0, 0, 2]):
+        tree.insert(key, value)
+    if not (tree.delete(0) and tree.delete(0) and tree.search(0) is None):
+        errors.append("bplus delete missed a duplicate of a separator")
+    
+    for storage in STORAGE_MODES:
+        for degree in (2, 3, 4):
+            for seed in range(seeds):
+                rng = random.Random(seed)
+                tree = BTree(degree, storage)
+                rows = Counter()
+                for value in range(operations):
+                    key = rng.randrange(30)
+                    if rng.random() < 0.55:
+                        tree.insert(key, value)
+                        rows[(key, value)] += 1
+                        continue
+                    present = any(row_key == key for row_key, _ in rows)
+                    if tree.delete(key) != present:
+                        errors.append(f"{storage} t={degree} seed {seed}: delete({key}) disagrees with the rows")
+                        break
+                    after = Counter(tree.scan())
+                    if present and (after - rows or sum((rows - after).values()) != 1
+                                    or next(iter(rows - after))[0] != key):
+                        errors.append(f"{storage} t={degree} seed {seed}: delete({key}) removed the wrong row")
+                        break
+                    rows = after
+    
+    print(f"Duplicate key test: {len(STORAGE_MODES) * 3 * seeds} random runs of {operations} operations")
+    if errors:
+        raise AssertionError("; ".join(errors[:10]))
+    print("   ✔ every delete removed exactly one row with its key")
+
+def run_snapshot_search_test(seeds=20, operations=400):
+    """Snapshots must keep answering search_many() with their own rows while the tree changes"""
+    errors = []
+    for storage in STORAGE_MODES:
+        for seed in range(seeds):
+            rng = random.Random(seed)
+            tree = BTree(2, storage)
+            for key in rng.sample(range(100), 12):
+                tree.insert(key, f"v{key}")
+            snapshots = [(tree.snapshot(), sorted(tree.scan()))]
+            
+            for i in range(operations):
+                key = rng.randrange(100)
+                if rng.random() < 0.5:
+                    tree.insert(key, f"v{key}_{i}")
+                else:
+                    tree.delete(key)
+                if i % 50 == 0:
+                    snapshots.append((tree.snapshot(), sorted(tree.scan())))
+            
+            for snapshot, rows in snapshots:
+                keys = list(range(100))
+                found = snapshot.search_many(keys)
+                if found != [snapshot.search(key) for key in keys] or \
+                        {key for key, _ in rows} != {result[0] for result in found if result is not None}:
+                    errors.append(f"{storage} seed {seed}: snapshot search_many sees the live tree")
+                    break
+    
+    print(f"Snapshot search test: {len(STORAGE_MODES) * seeds} trees changed under their snapshots")
+    if errors:
+        raise AssertionError("; ".join(errors[:10]))
+    print("   ✔ search_many on every snapshot matches the rows it was taken with")
+
 def main():
     print("="*60)
     print("B-TREE DEMONSTRATION FOR SQL DATABASE OPERATIONS")
     print("="*60)
     
-    # Create database instance
-    db = SimpleSQLDatabase()
+    # Create database instance (the console tracer prints every step)
+    db = SimpleSQLDatabase(tracer=ConsoleTracer())
     
     # Create a table (with B-tree index)
-    db.create_table("employees", degree=3)
+    db.create_table("employees", degree=3, bloom_fp_rate=0.01)
     
     # Insert records (this will trigger B-tree splits as needed)
     print("\n" + "="*50)
@@ -361,7 +1369,23 @@ def main():
     db.select_record("employees", 999)  # Not found
     
     # Range search
-    db.select_range("employees", 120, 200)
+    for key, value in db.select_range("employees", 120, 200):
+        print(f"  Key={key}, Value={value}")
+    
+    print("\n" + "="*50)
+    print("SECONDARY INDEX (LOOKUP BY NAME)")
+    print("="*50)
+    
+    db.create_index("employees", "value")
+    for key, value in db.select_where("employees", "value", "Carol Davis"):
+        print(f"  Key={key}, Value={value}")
+    
+    print("\n" + "="*50)
+    print("DELETE OPERATIONS (B-TREE REBALANCING)")
+    print("="*50)
+    
+    db.delete_record("employees", 175)
+    db.delete_record("employees", 999)  # Not found
     
     print("\n" + "="*60)
     print("DEMONSTRATION COMPLETE")
@@ -375,4 +1399,6 @@ def main():
     print("• Each node can contain multiple keys (unlike binary trees)")
 
 if __name__ == "__main__":
+    run_duplicate_key_test()
+    run_snapshot_search_test()
     main()
\ No newline at end of file
@@ -2,60 +2,252 @@ import time
 import random
 import statistics
 import bisect
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from contextlib import contextmanager
+from operator import itemgetter
+
+from lookup_cache import LookupCache, MISS
+from wal import encode_value, decode_value
+
+_MISSING = object()  # Sentinel for lookups where None is a valid value
+TOMBSTONE = object()  # Value of a lazily deleted key until compact() removes it
+
+# Typed key modes: keys are stored unboxed in a contiguous array
+KEY_TYPES = {'int': 'q', 'float': 'd'}
+
+# Tree files written by BTreeCorrected.save (the layout is described there)
+SNAPSHOT_MAGIC = b"BTCS"
+SNAPSHOT_VERSION = 1
+# magic, version, key format, key type, lazy_delete, degree, node count, height, tombstones, splits,
+# keys offset, values offset
+_SNAPSHOT_HEADER = struct.Struct("<4sHBBBIQIQQQQ")
+# leaf flag, key count, subtree size, first child, key offset, value offset
+_SNAPSHOT_NODE = struct.Struct("<BIQQQQ")
+_KEY_FORMATS = (None, 'q', 'd')  # Code -> array type code; None stores WAL-encoded keys
+_KEY_TYPE_CODES = (None, 'int', 'float')
+_TOMBSTONE_TAG = b"X"  # Not a tag encode_value uses
 
 class BTreeNode:
-    def __init__(self, leaf=False):
-        self.keys = []
+    __slots__ = ('keys', 'values', 'children', 'leaf', 'size')
+    
+    def __init__(self, leaf=False, keys=None):
+        self.keys = keys if keys is not None else []
         self.values = []
         self.children = []
         self.leaf = leaf
+        self.size = 0  # Live (non-tombstone) keys in this subtree
+
+class LazyBTreeNode(BTreeNode):
+    """Node of a lazily loaded tree file: keys, values and children are decoded on first access
+
+    Until then only leaf and size are set. Reading an unset slot falls
+    through to __getattr__, which fills it in from the file, so once
+    materialised the node costs exactly what a BTreeNode does. Keys and
+    children come together; values separately, since a lookup passing
+    through a node does not need them.
+    """
+    __slots__ = ('_reader', '_index')
+    
+    def __init__(self, reader, index, leaf, size):
+        self._reader = reader
+        self._index = index
+        self.leaf = leaf
+        self.size = size
+    
+    def __getattr__(self, name):
+        if name == 'values':
+            self._reader.fill_values(self, self._index)
+        elif name in ('keys', 'children'):
+            self._reader.fill_keys(self, self._index)
+        else:
+            raise AttributeError(name)
+        return object.__getattribute__(self, name)
+
+class _SnapshotReader:
+    """Decodes the nodes of a tree file held in a buffer (bytes or an mmap)"""
+    
+    def __init__(self, buffer, key_format, keep_arrays, keys_offset, values_offset, nodes_offset,
+                 allow_pickle=False):
+        self.buffer = buffer
+        self.allow_pickle = allow_pickle  # Whether pickled keys and values may be decoded
+        self.key_format = key_format
+        self.keep_arrays = keep_arrays  # Typed trees keep array keys, others get lists
+        self.keys_offset = keys_offset
+        self.values_offset = values_offset
+        self.nodes_offset = nodes_offset
+    
+    def record(self, index):
+        return _SNAPSHOT_NODE.unpack_from(self.buffer, self.nodes_offset + index * _SNAPSHOT_NODE.size)
+    
+    def fill_keys(self, node, index, lazy=True):
+        """Decode a node's keys; lazy also creates its children as LazyBTreeNodes"""
+        leaf, count, _, first_child, key_offset, _ = self.record(index)
+        buffer = self.buffer
+        
+        offset = self.keys_offset + key_offset
+        if self.key_format is None:
+            keys = []
+            for _ in range(count):
+                key, offset = decode_value(buffer, offset, self.allow_pickle)
+                keys.append(key)
+        else:
+            keys = array(self.key_format)
+            keys.frombytes(buffer[offset:offset + count * keys.itemsize])
+            if sys.byteorder == "big":
+                keys.byteswap()
+            if not self.keep_arrays:
+                keys = keys.tolist()
+        node.keys = keys
+        
+        node.children = []
+        if lazy and not leaf:
+            for child in range(first_child, first_child + count + 1):
+                child_leaf, _, child_size, _, _, _ = self.record(child)
+                node.children.append(LazyBTreeNode(self, child, bool(child_leaf), child_size))
+    
+    def fill_values(self, node, index):
+        _, count, _, _, _, value_offset = self.record(index)
+        buffer = self.buffer
+        values = []
+        offset = self.values_offset + value_offset
+        for _ in range(count):
+            if buffer[offset:offset + 1] == _TOMBSTONE_TAG:
+                values.append(TOMBSTONE)
+                offset += 1
+            else:
+                value, offset = decode_value(buffer, offset, self.allow_pickle)
+                values.append(value)
+        node.values = values
 
 class BTreeCorrected:
-    def __init__(self, degree=50):
-        self.root = BTreeNode(leaf=True)
+    def __init__(self, degree=50, key_type=None, lazy_delete=False):
+        # key_type "int" or "float" keeps each node's keys in an array instead of a list
+        if key_type is not None and key_type not in KEY_TYPES:
+            raise ValueError(f"Unknown key type {key_type!r}, expected one of {tuple(KEY_TYPES)}")
+        self.key_type = key_type
         self.degree = degree
-        self.search_comparisons = 0
-        self.binary_searches = 0  # Track binary search operations
+        self.root = self._new_node(leaf=True)
+        # lazy_delete only writes tombstones; compact() later removes them and repacks.
+        # The mode is fixed for the life of the tree.
+        self.lazy_delete = lazy_delete
+        self.tombstones = 0
+        
+        # Structure counters kept up to date by every change, read by stats()
+        self.height = 1
+        self.node_count = 1
+        self.splits = 0
+        self.leaf_fill = [0] * (2 * degree)  # Number of leaves holding i keys
+        self.leaf_fill[0] = 1
+        
+        self.cache = None  # Optional LookupCache in front of get(), see enable_cache()
+    
+    def enable_cache(self, capacity=4096, max_bytes=None):
+        """Put an LRU cache of lookup results in front of get(); every write invalidates its key"""
+        self.cache = LookupCache(capacity, max_bytes)
+        return self.cache
+    
+    def disable_cache(self):
+        self.cache = None
+    
+    def _new_node(self, leaf=False):
+        return BTreeNode(leaf, self._make_keys())
+    
+    def _grow_root(self, child):
+        """Put a new, empty root above child (which is about to be split)"""
+        new_root = self._new_node()
+        new_root.children.append(child)
+        new_root.size = child.size
+        self.root = new_root
+        self.height += 1
+        self.node_count += 1
+        return new_root
+    
+    def _make_keys(self, items=()):
+        """Key container for a node: a typed array in typed mode, a list otherwise"""
+        if self.key_type is None:
+            return list(items)
+        return array(KEY_TYPES[self.key_type], items)
     
     def insert(self, key, value):
         """Insert without printing for performance"""
+        if self.cache is not None:
+            self.cache.invalidate(key)
         root = self.root
         
         if len(root.keys) == (2 * self.degree) - 1:
-            new_root = BTreeNode()
-            self.root = new_root
-            new_root.children.append(root)
+            new_root = self._grow_root(root)
             self._split_child(new_root, 0)
             self._insert_non_full(new_root, key, value)
         else:
             self._insert_non_full(root, key, value)
     
     def _insert_non_full(self, node, key, value):
+        """Insert below a node that is not full; returns 1 if a live key was added, else 0"""
         if node.leaf:
             # Use binary search to find insertion position
             pos = bisect.bisect_left(node.keys, key)
-            node.keys.insert(pos, key)
-            node.values.insert(pos, value)
+            if pos < len(node.keys) and node.keys[pos] == key:
+                # Key already exists, update value
+                added = self._replace_value(node, pos, value)
+            else:
+                node.keys.insert(pos, key)
+                node.values.insert(pos, value)
+                self.leaf_fill[len(node.keys) - 1] -= 1
+                self.leaf_fill[len(node.keys)] += 1
+                added = 1
         else:
             # Use binary search to find child to insert into
             pos = bisect.bisect_left(node.keys, key)
             
             if pos < len(node.keys) and node.keys[pos] == key:
                 # Key already exists, update value
-                node.values[pos] = value
-                return
-            
-            if len(node.children[pos].keys) == (2 * self.degree) - 1:
-                self._split_child(node, pos)
-                if key > node.keys[pos]:
-                    pos += 1
-            
-            self._insert_non_full(node.children[pos], key, value)
+                added = self._replace_value(node, pos, value)
+            else:
+                if len(node.children[pos].keys) == (2 * self.degree) - 1:
+                    self._split_child(node, pos)
+                    if key > node.keys[pos]:
+                        pos += 1
+                
+                if pos < len(node.keys) and node.keys[pos] == key:
+                    # The promoted middle key is the one being inserted
+                    added = self._replace_value(node, pos, value)
+                else:
+                    added = self._insert_non_full(node.children[pos], key, value)
+        
+        node.size += added
+        return added
+    
+    def _replace_value(self, node, pos, value):
+        """Overwrite the value of an existing key, reviving it if it was a tombstone
+
+        Returns 1 if a tombstone came back to life (the live key count grew), else 0.
+        """
+        if node.values[pos] is TOMBSTONE:
+            self.tombstones -= 1
+            node.values[pos] = value
+            return 1
+        node.values[pos] = value
+        return 0
+    
+    def _live_count(self, values):
+        """Number of values that are not tombstones"""
+        if not self.tombstones:
+            return len(values)
+        return sum(1 for value in values if value is not TOMBSTONE)
+    
+    def _subtree_size(self, node):
+        """Recompute a node's size from its own keys and its children's sizes"""
+        return self._live_count(node.values) + sum(child.size for child in node.children)
     
     def _split_child(self, parent, index):
         degree = self.degree
         full_child = parent.children[index]
-        new_child = BTreeNode(leaf=full_child.leaf)
+        new_child = BTreeNode(leaf=full_child.leaf)  # Keys come from a slice of the full child
         
         mid_index = degree - 1
         mid_key = full_child.keys[mid_index]
@@ -70,82 +262,1077 @@ class BTreeCorrected:
             new_child.children = full_child.children[degree:]
             full_child.children = full_child.children[:degree]
         
+        new_child.size = self._subtree_size(new_child)
+        full_child.size -= new_child.size + (mid_value is not TOMBSTONE)
+        
+        self.splits += 1
+        self.node_count += 1
+        if full_child.leaf:
+            self.leaf_fill[(2 * degree) - 1] -= 1
+            self.leaf_fill[len(full_child.keys)] += 1
+            self.leaf_fill[len(new_child.keys)] += 1
+        
         parent.children.insert(index + 1, new_child)
         parent.keys.insert(index, mid_key)
         parent.values.insert(index, mid_value)
     
-    def search_with_stats(self, key):
-        """Search using binary search and return timing + comparison statistics"""
-        self.search_comparisons = 0
-        self.binary_searches = 0
-        start_time = time.perf_counter()
+    def insert_many(self, pairs):
+        """Upsert a batch of (key, value) pairs into the existing tree
+
+        The batch is sorted once; every run of keys that lands in the same leaf
+        is merged into it in one step, and the resulting overflow is split
+        into as many nodes as needed once per node on the way back up.
+        Within the batch the last value for a key wins.
+        """
+        keys = []
+        values = []
+        for key, value in sorted(pairs, key=itemgetter(0)):
+            if keys and keys[-1] == key:
+                values[-1] = value
+            else:
+                keys.append(key)
+                values.append(value)
         
-        result = self._search_node_binary(self.root, key)
+        if self.cache is not None:
+            for key in keys:
+                self.cache.invalidate(key)
         
-        end_time = time.perf_counter()
-        search_time = (end_time - start_time) * 1000000  # Convert to microseconds
+        i = 0
+        while i < len(keys):
+            i = self._merge_run(keys, values, i)
+    
+    def _merge_run(self, keys, values, start):
+        """Merge the run of batch keys beginning at start into its leaf; returns where the run ends"""
+        key = keys[start]
+        path = []  # (node, child index) pairs from the root down to the leaf's parent
+        upper = None  # Smallest separator above key, which bounds the leaf's key range
+        node = self.root
+        
+        while True:
+            pos = bisect.bisect_left(node.keys, key)
+            if pos < len(node.keys) and node.keys[pos] == key:
+                # Key already exists in an internal node, update value
+                added = self._replace_value(node, pos, values[start])
+                node.size += added
+                for ancestor, _ in path:
+                    ancestor.size += added
+                return start + 1
+            if node.leaf:
+                break
+            if pos < len(node.keys):
+                upper = node.keys[pos]
+            path.append((node, pos))
+            node = node.children[pos]
+        
+        end = len(keys) if upper is None else bisect.bisect_left(keys, upper, start)
         
-        return result, search_time, self.search_comparisons, self.binary_searches
+        # The leaf leaves the fill histogram until its final size is known
+        self.leaf_fill[len(node.keys)] -= 1
+        if end - start == 1:
+            node.keys.insert(pos, key)
+            node.values.insert(pos, values[start])
+            added = 1
+        else:
+            before = node.size
+            self._merge_into_leaf(node, keys, values, start, end)
+            added = self._live_count(node.values) - before
+        
+        node.size += added
+        for ancestor, _ in path:
+            ancestor.size += added
+        if len(node.keys) <= (2 * self.degree) - 1:
+            self.leaf_fill[len(node.keys)] += 1
+        self._split_overflow(path, node)
+        return end
     
-    def _search_node_binary(self, node, key):
-        """Search using binary search within nodes"""
-        self.binary_searches += 1
+    def _merge_into_leaf(self, leaf, keys, values, start, end):
+        """Merge the sorted batch slice keys[start:end] into a leaf, replacing equal keys"""
+        merged_keys = []
+        merged_values = []
+        leaf_keys = leaf.keys
+        i, j = 0, start
         
-        # Use binary search to find position
-        pos = bisect.bisect_left(node.keys, key)
+        while i < len(leaf_keys) and j < end:
+            if leaf_keys[i] < keys[j]:
+                merged_keys.append(leaf_keys[i])
+                merged_values.append(leaf.values[i])
+                i += 1
+            else:
+                if leaf_keys[i] == keys[j]:
+                    # Upsert: the batch value replaces the stored one
+                    if leaf.values[i] is TOMBSTONE:
+                        self.tombstones -= 1
+                    i += 1
+                merged_keys.append(keys[j])
+                merged_values.append(values[j])
+                j += 1
         
-        # Count the comparisons that bisect would make
-        # Binary search makes approximately log2(n) comparisons
-        if len(node.keys) > 0:
-            import math
-            self.search_comparisons += max(1, int(math.log2(len(node.keys)) + 1))
+        merged_keys.extend(leaf_keys[i:])
+        merged_values.extend(leaf.values[i:])
+        merged_keys.extend(keys[j:end])
+        merged_values.extend(values[j:end])
         
-        # Check if key found at this position
-        if pos < len(node.keys) and node.keys[pos] == key:
-            return (node.keys[pos], node.values[pos])
+        leaf.keys = self._make_keys(merged_keys)
+        leaf.values = merged_values
+    
+    def _split_overflow(self, path, node):
+        """Split an overfull node (and any ancestor it overfills) into valid nodes"""
+        while len(node.keys) > (2 * self.degree) - 1:
+            if path:
+                parent, index = path.pop()
+            else:
+                parent = self._grow_root(node)
+                index = 0
+            pieces, separators = self._split_pieces(node)
+            
+            parent.keys[index:index] = self._make_keys(key for key, _ in separators)
+            parent.values[index:index] = [value for _, value in separators]
+            parent.children[index + 1:index + 1] = pieces[1:]
+            node = parent
+    
+    def _split_pieces(self, node):
+        """Cut an overfull node into the fewest nodes of at most 2t-1 keys, sized evenly"""
+        degree = self.degree
+        keys, values, children = node.keys, node.values, node.children
+        
+        count = -(-(len(keys) + 1) // (2 * degree))  # ceil((m + 1) / 2t)
+        total = len(keys) - (count - 1)  # Keys left after taking out the separators
+        size, extra = divmod(total, count)
+        
+        pieces = []
+        separators = []
+        pos = 0
+        for i in range(count):
+            piece_size = size + (1 if i < extra else 0)
+            piece = node if i == 0 else BTreeNode(leaf=node.leaf)
+            piece.keys = keys[pos:pos + piece_size]
+            piece.values = values[pos:pos + piece_size]
+            if not node.leaf:
+                piece.children = children[pos:pos + piece_size + 1]
+            piece.size = self._subtree_size(piece)
+            pieces.append(piece)
+            
+            pos += piece_size
+            if i < count - 1:
+                separators.append((keys[pos], values[pos]))
+                pos += 1
         
-        # If leaf node and key not found
+        self.splits += count - 1
+        self.node_count += count - 1
         if node.leaf:
-            return None
+            for piece in pieces:
+                self.leaf_fill[len(piece.keys)] += 1
+        return pieces, separators
+    
+    def bulk_load(self, items, fill_factor=1.0):
+        """Replace the tree contents with (key, value) pairs, built bottom-up in one pass
+
+        Sorted input (including generators) is streamed straight into packed
+        leaves without an extra copy; unsorted input is detected on the fly and
+        sorted first. Duplicate keys keep the last value, like insert.
+        """
+        max_keys = (2 * self.degree) - 1
+        min_keys = self.degree - 1
+        capacity = max(min_keys, 1, min(max_keys, int(round(fill_factor * max_keys))))
+        
+        leaves = [self._new_node(leaf=True)]
+        separators = []  # (key, value) pairs that end up between two leaves
+        pending = None  # Held back one step so duplicates can be collapsed
+        iterator = iter(items)
+        
+        for key, value in iterator:
+            if pending is not None:
+                if key == pending[0]:
+                    pending = (key, value)
+                    continue
+                if key < pending[0]:
+                    # Input is not sorted: gather everything and start over sorted
+                    collected = self._bulk_collect(leaves, separators)
+                    collected.append(pending)
+                    collected.append((key, value))
+                    collected.extend(iterator)
+                    collected.sort(key=itemgetter(0))  # Stable, so the last duplicate wins
+                    return self.bulk_load(collected, fill_factor)
+                self._bulk_append(leaves, separators, pending, capacity)
+            pending = (key, value)
+        
+        if pending is not None:
+            self._bulk_append(leaves, separators, pending, capacity)
+        
+        # Stack the internal levels on top of the leaves
+        level = leaves
+        height = node_count = 0
+        while True:
+            self._bulk_fix_last(level, separators)
+            for node in level:
+                node.size = self._subtree_size(node)
+            height += 1
+            node_count += len(level)
+            if len(level) == 1:
+                break
+            level, separators = self._bulk_build_parents(level, separators, capacity)
+        
+        self.root = level[0]
+        if self.cache is not None:
+            self.cache.clear()
+        self.tombstones = 0
+        self.height = height
+        self.node_count = node_count
+        self.leaf_fill = [0] * (2 * self.degree)
+        for leaf in leaves:
+            self.leaf_fill[len(leaf.keys)] += 1
+        return self
+    
+    def _bulk_append(self, leaves, separators, pair, capacity):
+        """Append a pair to the last leaf, or promote it and open a new leaf"""
+        leaf = leaves[-1]
+        if len(leaf.keys) < capacity:
+            leaf.keys.append(pair[0])
+            leaf.values.append(pair[1])
+        else:
+            separators.append(pair)
+            leaves.append(self._new_node(leaf=True))
+    
+    def _bulk_collect(self, leaves, separators):
+        """Return the pairs already placed by bulk_load, in order"""
+        collected = []
+        for i, leaf in enumerate(leaves):
+            collected.extend(zip(leaf.keys, leaf.values))
+            if i < len(separators):
+                collected.append(separators[i])
+        return collected
+    
+    def _bulk_build_parents(self, children, separators, capacity):
+        """Group one level of nodes under a new level of internal nodes"""
+        parents = []
+        promoted = []
+        node = self._new_node()
+        
+        for i, child in enumerate(children):
+            node.children.append(child)
+            if i == len(separators):
+                break
+            key, value = separators[i]
+            if len(node.keys) < capacity:
+                node.keys.append(key)
+                node.values.append(value)
+            else:
+                # Node is full: the separator moves up and a new node starts
+                promoted.append((key, value))
+                parents.append(node)
+                node = self._new_node()
+        
+        parents.append(node)
+        return parents, promoted
+    
+    def _bulk_fix_last(self, nodes, separators):
+        """Rebalance the trailing (possibly underfull) node of a level with its left neighbour"""
+        if len(nodes) < 2 or len(nodes[-1].keys) >= self.degree - 1:
+            return
+        
+        left = nodes[-2]
+        right = nodes.pop()
+        sep_key, sep_value = separators.pop()
+        
+        keys = left.keys + self._make_keys([sep_key]) + right.keys
+        values = left.values + [sep_value] + right.values
+        children = left.children + right.children
+        
+        if len(keys) <= (2 * self.degree) - 1:
+            # Everything fits into one node
+            left.keys, left.values, left.children = keys, values, children
+            return
+        
+        # Otherwise split the combined keys evenly between the two nodes
+        mid = len(keys) // 2
+        left.keys, right.keys = keys[:mid], keys[mid + 1:]
+        left.values, right.values = values[:mid], values[mid + 1:]
+        if children:
+            left.children, right.children = children[:mid + 1], children[mid + 1:]
+        separators.append((keys[mid], values[mid]))
+        nodes.append(right)
+    
+    def get(self, key, default=None):
+        """Return the value stored for key, or default if it is missing"""
+        cache = self.cache
+        if cache is not None:
+            value = cache.get(key)
+            if value is not MISS:
+                return default if value is _MISSING else value
+        
+        bisect_left = bisect.bisect_left
+        node = self.root
+        while True:
+            keys = node.keys
+            pos = bisect_left(keys, key)
+            if pos < len(keys) and keys[pos] == key:
+                value = node.values[pos]
+                if value is TOMBSTONE:
+                    value = _MISSING
+                break
+            if node.leaf:
+                value = _MISSING
+                break
+            node = node.children[pos]
+        
+        if cache is not None:
+            cache.put(key, value)  # Misses are cached too, as _MISSING
+        return default if value is _MISSING else value
+    
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+    
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+    
+    def search_many(self, keys, default=None):
+        """Look up a batch of keys with one shared descent
+
+        Returns (values, found): values in the order of keys (default where a
+        key is missing) and a matching list of booleans. The batch is sorted
+        once and split at each node with bisect, so nodes shared by several
+        keys are visited once per batch instead of once per key.
+        """
+        if hasattr(keys, 'tolist'):
+            keys = keys.tolist()  # NumPy arrays and similar buffers
+        keys = list(keys)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        batch = [keys[i] for i in order]
+        
+        values = [default] * len(keys)
+        found = [False] * len(keys)
+        bisect_left = bisect.bisect_left
+        bisect_right = bisect.bisect_right
+        
+        stack = [(self.root, 0, len(batch))] if batch else []
+        while stack:
+            node, lo, hi = stack.pop()
+            node_keys = node.keys
+            i = lo
+            j = 0
+            
+            while i < hi:
+                # Next node key that can match or bound batch[i]
+                j = bisect_left(node_keys, batch[i], j)
+                if j == len(node_keys):
+                    if not node.leaf:
+                        stack.append((node.children[j], i, hi))
+                    break
+                
+                node_key = node_keys[j]
+                cut = bisect_left(batch, node_key, i, hi)
+                if cut > i and not node.leaf:
+                    # Keys below node_key continue in the child left of it
+                    stack.append((node.children[j], i, cut))
+                
+                end = bisect_right(batch, node_key, cut, hi)
+                value = node.values[j]
+                if value is not TOMBSTONE:
+                    for p in range(cut, end):
+                        values[order[p]] = value
+                        found[order[p]] = True
+                i = end
+                j += 1
         
-        # Recursively search appropriate child
-        return self._search_node_binary(node.children[pos], key)
+        return values, found
     
+    def items(self, start=None, end=None):
+        """Yield live (key, value) pairs with start <= key <= end in order (None means unbounded)"""
+        return self._items_node(self.root, start, end)
+    
+    def _items_node(self, node, start, end):
+        """In-order walk of a subtree that skips children below start and stops after end"""
+        i = 0 if start is None else bisect.bisect_left(node.keys, start)
+        
+        while i < len(node.keys):
+            if not node.leaf:
+                yield from self._items_node(node.children[i], start, end)
+            
+            key = node.keys[i]
+            if end is not None and key > end:
+                return
+            if node.values[i] is not TOMBSTONE:
+                yield (key, node.values[i])
+            i += 1
+        
+        if not node.leaf:
+            yield from self._items_node(node.children[i], start, end)
+    
+    def __len__(self):
+        """Number of live keys, from the root's subtree size"""
+        return self.root.size
+    
+    def rank(self, key):
+        """Number of live keys smaller than key, in O(t log n)"""
+        return self._count_below(key, inclusive=False)
+    
+    def count_range(self, start=None, end=None):
+        """COUNT(*) of live keys with start <= key <= end (None means unbounded), without visiting them"""
+        high = self.root.size if end is None else self._count_below(end, inclusive=True)
+        low = 0 if start is None else self._count_below(start, inclusive=False)
+        return max(0, high - low)
+    
+    def _count_below(self, key, inclusive):
+        """Live keys < key (or <= key when inclusive), adding up subtree sizes on one descent"""
+        bisect_key = bisect.bisect_right if inclusive else bisect.bisect_left
+        count = 0
+        node = self.root
+        
+        while True:
+            pos = bisect_key(node.keys, key)
+            count += self._live_count(node.values[:pos]) if self.tombstones else pos
+            if node.leaf:
+                return count
+            for child in node.children[:pos]:
+                count += child.size
+            node = node.children[pos]
+    
+    def select_kth(self, k):
+        """The (key, value) pair with rank k (0-based; negative counts from the end)
 
+        Descends once using subtree sizes, so OFFSET-style pagination and
+        percentiles (select_kth(int(p * len(tree)))) cost O(t log n) instead
+        of a scan. Raises IndexError if k is out of range.
+        """
+        if k < 0:
+            k += self.root.size
+        if not 0 <= k < self.root.size:
+            raise IndexError(f"rank {k} out of range for {self.root.size} keys")
+        
+        node = self.root
+        while True:
+            for i, value in enumerate(node.values):
+                if not node.leaf:
+                    child_size = node.children[i].size
+                    if k < child_size:
+                        break
+                    k -= child_size
+                if value is not TOMBSTONE:
+                    if k == 0:
+                        return (node.keys[i], value)
+                    k -= 1
+            else:
+                # Past every key of this node: only the last child is left
+                node = node.children[-1]
+                continue
+            node = node.children[i]
     
-    def get_tree_stats(self):
-        """Get statistics about the B-tree structure"""
-        height = self._get_height(self.root)
-        node_count = self._count_nodes(self.root)
-        total_keys = self._count_keys(self.root)
-        avg_keys_per_node = total_keys / node_count if node_count > 0 else 0
+    def delete(self, key):
+        """Remove key, returning True if it was present
+
+        Nodes on the way down are topped up to at least t keys by borrowing
+        from a sibling or merging with it, so the removal never underfills a
+        node. In lazy_delete mode the value is replaced by a tombstone instead.
+        """
+        if self.cache is not None:
+            self.cache.invalidate(key)
+        if self.lazy_delete:
+            return self._delete_lazy(key)
+        
+        removed = self._delete(key)
+        
+        # A root emptied by a merge hands over to its only child
+        if not self.root.keys and not self.root.leaf:
+            self.root = self.root.children[0]
+            self.height -= 1
+            self.node_count -= 1
+        return removed
+    
+    def _delete_lazy(self, key):
+        path = []
+        node = self.root
+        while True:
+            path.append(node)
+            pos = bisect.bisect_left(node.keys, key)
+            if pos < len(node.keys) and node.keys[pos] == key:
+                if node.values[pos] is TOMBSTONE:
+                    return False
+                node.values[pos] = TOMBSTONE
+                self.tombstones += 1
+                for ancestor in path:
+                    ancestor.size -= 1
+                return True
+            if node.leaf:
+                return False
+            node = node.children[pos]
+    
+    def _delete(self, key):
+        min_keys = self.degree - 1
+        path = []  # Every node whose subtree loses the key if it is found
+        node = self.root
+        
+        while True:
+            path.append(node)
+            pos = bisect.bisect_left(node.keys, key)
+            found = pos < len(node.keys) and node.keys[pos] == key
+            
+            if node.leaf:
+                if not found:
+                    return False
+                del node.keys[pos]
+                del node.values[pos]
+                self.leaf_fill[len(node.keys) + 1] -= 1
+                self.leaf_fill[len(node.keys)] += 1
+                for ancestor in path:
+                    ancestor.size -= 1
+                return True
+            
+            if found:
+                left = node.children[pos]
+                right = node.children[pos + 1]
+                if len(left.keys) > min_keys:
+                    # Replace the key with its predecessor, then delete that from the left subtree
+                    pred = left
+                    while not pred.leaf:
+                        pred = pred.children[-1]
+                    node.keys[pos], node.values[pos] = pred.keys[-1], pred.values[-1]
+                    key = pred.keys[-1]
+                    node = left
+                elif len(right.keys) > min_keys:
+                    # Same with the successor from the right subtree
+                    succ = right
+                    while not succ.leaf:
+                        succ = succ.children[0]
+                    node.keys[pos], node.values[pos] = succ.keys[0], succ.values[0]
+                    key = succ.keys[0]
+                    node = right
+                else:
+                    # Both neighbours are minimal: merge them around the key and continue there
+                    self._merge_children(node, pos)
+                    node = left
+                continue
+            
+            if len(node.children[pos].keys) == min_keys:
+                pos = self._fill_child(node, pos)
+            node = node.children[pos]
+    
+    def _fill_child(self, node, pos):
+        """Give a minimal child an extra key; returns the index of the child to descend into"""
+        child = node.children[pos]
+        
+        if pos > 0 and len(node.children[pos - 1].keys) > self.degree - 1:
+            # Borrow through the parent from the left sibling
+            left = node.children[pos - 1]
+            moved = left.children[-1].size if not child.leaf else 0
+            child.size += moved + (node.values[pos - 1] is not TOMBSTONE)
+            left.size -= moved + (left.values[-1] is not TOMBSTONE)
+            child.keys.insert(0, node.keys[pos - 1])
+            child.values.insert(0, node.values[pos - 1])
+            node.keys[pos - 1] = left.keys.pop()
+            node.values[pos - 1] = left.values.pop()
+            if not child.leaf:
+                child.children.insert(0, left.children.pop())
+            else:
+                self._leaf_moved(left, child)
+            return pos
+        
+        if pos < len(node.keys) and len(node.children[pos + 1].keys) > self.degree - 1:
+            # Borrow through the parent from the right sibling
+            right = node.children[pos + 1]
+            moved = right.children[0].size if not child.leaf else 0
+            child.size += moved + (node.values[pos] is not TOMBSTONE)
+            right.size -= moved + (right.values[0] is not TOMBSTONE)
+            child.keys.append(node.keys[pos])
+            child.values.append(node.values[pos])
+            node.keys[pos] = right.keys.pop(0)
+            node.values[pos] = right.values.pop(0)
+            if not child.leaf:
+                child.children.append(right.children.pop(0))
+            else:
+                self._leaf_moved(right, child)
+            return pos
+        
+        # No sibling can spare a key: merge with one
+        if pos < len(node.keys):
+            self._merge_children(node, pos)
+            return pos
+        self._merge_children(node, pos - 1)
+        return pos - 1
+    
+    def _leaf_moved(self, donor, receiver):
+        """Update the fill histogram after one key went from donor to receiver (both leaves)"""
+        fill = self.leaf_fill
+        fill[len(donor.keys) + 1] -= 1
+        fill[len(donor.keys)] += 1
+        fill[len(receiver.keys) - 1] -= 1
+        fill[len(receiver.keys)] += 1
+    
+    def _merge_children(self, node, index):
+        """Merge children index and index + 1 around the separator between them"""
+        left = node.children[index]
+        right = node.children[index + 1]
+        left.size += right.size + (node.values[index] is not TOMBSTONE)
+        self.node_count -= 1
+        if left.leaf:
+            self.leaf_fill[len(left.keys)] -= 1
+            self.leaf_fill[len(right.keys)] -= 1
+            self.leaf_fill[len(left.keys) + len(right.keys) + 1] += 1
+        
+        left.keys.append(node.keys[index])
+        left.values.append(node.values[index])
+        left.keys.extend(right.keys)
+        left.values.extend(right.values)
+        left.children.extend(right.children)
+        
+        del node.keys[index]
+        del node.values[index]
+        del node.children[index + 1]
+    
+    def delete_range(self, start, end):
+        """Delete every key with start <= key <= end, returning how many were removed"""
+        keys = [key for key, _ in self.items(start, end)]
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+    
+    def compact(self, fill_factor=1.0):
+        """Drop tombstones and repack every node by bulk loading the live keys"""
+        # bulk_load only swaps in the new root at the end, so the old tree can feed it
+        return self.bulk_load(self.items(), fill_factor)
+    
+    def save(self, path):
+        """Write the tree to a file that load() turns back into the same tree
+
+        The file holds, in order (integers little-endian):
+          header, then the leaf fill counters as 2t uint64
+          node table: one fixed-size record per node in level order; the
+            children of a node are consecutive there, so each record only
+            says where they start
+          keys: one contiguous int64 or float64 array when every key fits,
+            otherwise WAL-encoded values
+          values: WAL-encoded, a tombstone as a single tag byte
+        The file is written next to path and renamed over it, so a tree still
+        loaded lazily from the old file keeps working.
+        """
+        nodes = [self.root]
+        i = 0
+        while i < len(nodes):
+            if not nodes[i].leaf:
+                nodes.extend(nodes[i].children)
+            i += 1
+        
+        key_format = self._snapshot_key_format(nodes)
+        if key_format is None:
+            key_parts = []
+        else:
+            key_array = array(key_format)
+        value_parts = []
+        records = []
+        key_offset = value_offset = 0
+        next_child = 1
+        
+        for node in nodes:
+            count = len(node.keys)
+            records.append(_SNAPSHOT_NODE.pack(1 if node.leaf else 0, count, node.size,
+                                               0 if node.leaf else next_child, key_offset, value_offset))
+            if not node.leaf:
+                next_child += count + 1
+            
+            if key_format is None:
+                encoded = b"".join(encode_value(key) for key in node.keys)
+                key_parts.append(encoded)
+                key_offset += len(encoded)
+            else:
+                key_array.extend(node.keys)
+                key_offset += count * key_array.itemsize
+            
+            encoded = b"".join(_TOMBSTONE_TAG if value is TOMBSTONE else encode_value(value)
+                               for value in node.values)
+            value_parts.append(encoded)
+            value_offset += len(encoded)
+        
+        if key_format is None:
+            keys_data = b"".join(key_parts)
+        else:
+            if sys.byteorder == "big":
+                key_array.byteswap()
+            keys_data = key_array.tobytes()
+        
+        leaf_fill = struct.pack(f"<{len(self.leaf_fill)}Q", *self.leaf_fill)
+        keys_offset = _SNAPSHOT_HEADER.size + len(leaf_fill) + len(records) * _SNAPSHOT_NODE.size
+        header = _SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, _KEY_FORMATS.index(key_format),
+            _KEY_TYPE_CODES.index(self.key_type), 1 if self.lazy_delete else 0, self.degree,
+            len(nodes), self.height, self.tombstones, self.splits, keys_offset, keys_offset + len(keys_data))
+        
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as tree_file:
+            tree_file.write(header)
+            tree_file.write(leaf_fill)
+            tree_file.write(b"".join(records))
+            tree_file.write(keys_data)
+            for part in value_parts:
+                tree_file.write(part)
+        os.replace(temp_path, path)
+    
+    def _snapshot_key_format(self, nodes):
+        """Array type code that can hold every key of the tree, or None"""
+        if self.key_type is not None:
+            return KEY_TYPES[self.key_type]
+        key_types = {type(key) for node in nodes for key in node.keys}
+        if key_types == {int}:
+            if all(-2**63 <= key < 2**63 for node in nodes for key in (node.keys[:1] + node.keys[-1:])):
+                return 'q'
+        elif key_types == {float}:
+            return 'd'
+        return None
+    
+    @classmethod
+    def load(cls, path, lazy=False, allow_pickle=False):
+        """Load a tree written by save()
+
+        lazy=True memory-maps the file and decodes only the root; every other
+        node is decoded the first time something reaches it, so loading takes
+        the same short time at any size. Otherwise the whole file is decoded
+        up front, which is still far faster than inserting every row again.
+        
+        Keys and values that save() had to pickle (anything but None, bools,
+        64-bit ints, floats, str, bytes and tuples, lists and dicts of those) raise
+        ValueError unless allow_pickle=True, since unpickling a crafted file
+        runs arbitrary code. Only allow it for files you wrote yourself. In
+        lazy mode the error comes from the first access to such a node.
+        """
+        with open(path, "rb") as tree_file:
+            if lazy:
+                buffer = mmap.mmap(tree_file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = tree_file.read()
+        
+        (magic, version, key_format, key_type, lazy_delete, degree, node_count, height, tombstones,
+         splits, keys_offset, values_offset) = _SNAPSHOT_HEADER.unpack_from(buffer, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a B-tree file")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} has unsupported format version {version}")
+        
+        tree = cls(degree, _KEY_TYPE_CODES[key_type], bool(lazy_delete))
+        tree.height = height
+        tree.node_count = node_count
+        tree.tombstones = tombstones
+        tree.splits = splits
+        tree.leaf_fill = list(struct.unpack_from(f"<{2 * degree}Q", buffer, _SNAPSHOT_HEADER.size))
+        
+        reader = _SnapshotReader(buffer, _KEY_FORMATS[key_format], tree.key_type is not None,
+                                 keys_offset, values_offset, _SNAPSHOT_HEADER.size + 16 * degree, allow_pickle)
+        if lazy:
+            leaf, _, size, _, _, _ = reader.record(0)
+            tree.root = LazyBTreeNode(reader, 0, bool(leaf), size)
+            return tree
+        
+        # Level order puts a node's children in one consecutive slice of the table
+        nodes = []
+        first_children = []
+        for index in range(node_count):
+            leaf, _, size, first_child, _, _ = reader.record(index)
+            node = BTreeNode(bool(leaf))
+            node.size = size
+            reader.fill_keys(node, index, lazy=False)
+            reader.fill_values(node, index)
+            nodes.append(node)
+            first_children.append(first_child)
+        for node, first_child in zip(nodes, first_children):
+            if not node.leaf:
+                node.children = nodes[first_child:first_child + len(node.keys) + 1]
+        tree.root = nodes[0]
+        return tree
+    
+    def stats(self):
+        """Structure statistics from counters kept up to date by every change
+
+        Costs O(t) for the leaf fill summary and nothing proportional to the
+        number of keys, so it is cheap enough to poll for monitoring.
+        """
+        max_keys = (2 * self.degree) - 1
+        leaves = sum(self.leaf_fill)
+        keys = self.root.size + self.tombstones
+        
+        # Leaves bucketed by how full they are, in steps of 10%
+        fill_deciles = [0] * 10
+        leaf_keys = 0
+        for count, leaf_count in enumerate(self.leaf_fill):
+            if leaf_count:
+                fill_deciles[min(9, count * 10 // max_keys)] += leaf_count
+                leaf_keys += count * leaf_count
         
         return {
-            'height': height,
-            'nodes': node_count,
-            'keys': total_keys,
+            'height': self.height,
+            'nodes': self.node_count,
+            'leaves': leaves,
+            'keys': keys,
+            'live_keys': self.root.size,
+            'tombstones': self.tombstones,
+            'splits': self.splits,
             'degree': self.degree,
-            'avg_keys_per_node': avg_keys_per_node
+            'avg_keys_per_node': keys / self.node_count,
+            'avg_leaf_fill': leaf_keys / (leaves * max_keys),
+            'leaf_fill': {f"{10 * i}-{10 * i + 10}%": n for i, n in enumerate(fill_deciles)},
+            'cache': self.cache.stats() if self.cache is not None else None,
         }
     
-    def _get_height(self, node):
-        if node.leaf:
-            return 1
-        return 1 + max(self._get_height(child) for child in node.children)
+    def get_tree_stats(self):
+        """Get statistics about the B-tree structure (same as stats())"""
+        return self.stats()
+
+class CountingKey:
+    """Search key wrapper that counts every comparison made against it
+
+    bisect compares node keys with the wrapper, which lands in the reflected
+    methods here, so the count is exact rather than estimated.
+    """
+    __slots__ = ('key', 'stats')
     
-    def _count_nodes(self, node):
-        count = 1
-        if not node.leaf:
-            for child in node.children:
-                count += self._count_nodes(child)
-        return count
+    def __init__(self, key, stats):
+        self.key = key
+        self.stats = stats
     
-    def _count_keys(self, node):
-        count = len(node.keys)
-        if not node.leaf:
-            for child in node.children:
-                count += self._count_keys(child)
-        return count
+    def __lt__(self, other):
+        self.stats.comparisons += 1
+        return self.key < other
+    
+    def __le__(self, other):
+        self.stats.comparisons += 1
+        return self.key <= other
+    
+    def __gt__(self, other):
+        self.stats.comparisons += 1
+        return self.key > other
+    
+    def __ge__(self, other):
+        self.stats.comparisons += 1
+        return self.key >= other
+    
+    def __eq__(self, other):
+        self.stats.comparisons += 1
+        return self.key == other
+    
+    def __ne__(self, other):
+        self.stats.comparisons += 1
+        return self.key != other
+    
+    __hash__ = None
+
+class OperationStats:
+    """Counters collected by InstrumentedBTreeCorrected for its sampled operations
+
+    Each operation is sampled with probability sample_rate; only sampled
+    operations pay for comparison counting and show up in the counters.
+    """
+    
+    def __init__(self, sample_rate=1.0, seed=0):
+        if not 0 < sample_rate <= 1:
+            raise ValueError(f"sample_rate must be in (0, 1], got {sample_rate}")
+        self.sample_rate = sample_rate
+        self._rng = random.Random(seed)
+        
+        self.operations = 0  # Every get/insert seen, sampled or not
+        self.sampled = 0
+        self.comparisons = 0
+        self.node_visits = 0
+        self.splits = 0
+        self.bytes_moved = 0  # Pointers and typed keys shifted by list.insert or copied by slicing
+        self.level_visits = []  # Node visits per depth, root = 0
+        self.latency_ns = {}  # Operation -> {bucket upper bound in ns: count}, power-of-two buckets
+    
+    def sample(self):
+        self.operations += 1
+        if self.sample_rate >= 1 or self._rng.random() < self.sample_rate:
+            self.sampled += 1
+            return True
+        return False
+    
+    def visit(self, depth):
+        self.node_visits += 1
+        if depth == len(self.level_visits):
+            self.level_visits.append(0)
+        self.level_visits[depth] += 1
+    
+    def record_latency(self, operation, elapsed_ns):
+        buckets = self.latency_ns.setdefault(operation, {})
+        bucket = 1 << elapsed_ns.bit_length()
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+    
+    def summary(self):
+        sampled = self.sampled or 1
+        return {
+            'operations': self.operations,
+            'sampled': self.sampled,
+            'comparisons_per_op': self.comparisons / sampled,
+            'node_visits_per_op': self.node_visits / sampled,
+            'splits': self.splits,
+            'bytes_moved': self.bytes_moved,
+            'level_visits': list(self.level_visits),
+            'latency_ns': {operation: dict(sorted(buckets.items()))
+                           for operation, buckets in self.latency_ns.items()},
+        }
+    
+    def report(self):
+        summary = self.summary()
+        print(f"   Sampled {summary['sampled']:,} of {summary['operations']:,} operations "
+              f"(rate {self.sample_rate:g})")
+        print(f"   Comparisons/op: {summary['comparisons_per_op']:.1f}, "
+              f"node visits/op: {summary['node_visits_per_op']:.2f}, "
+              f"splits: {summary['splits']:,}, bytes moved: {summary['bytes_moved']:,}")
+        print("   Visits per level: " + ", ".join(
+            f"L{depth}={count:,}" for depth, count in enumerate(summary['level_visits'])))
+        for operation, buckets in summary['latency_ns'].items():
+            print(f"   {operation} latency: " + ", ".join(
+                f"<{bucket / 1000:,.1f}μs: {count:,}" for bucket, count in buckets.items()))
+
+class InstrumentedBTreeCorrected(BTreeCorrected):
+    """BTreeCorrected that measures real comparisons, node visits, splits and bytes moved
+
+    Use it as a context manager on the tree:
+
+        with tree.instrument(sample_rate=0.01) as stats:
+            ...  # get() and insert() calls
+        stats.report()
+
+    instrument() swaps instrumented get() and insert() onto the instance for
+    the duration of the block, so outside it they are the plain
+    BTreeCorrected methods with no extra cost.
+    """
+    
+    def __init__(self, degree=50, key_type=None, lazy_delete=False):
+        super().__init__(degree, key_type, lazy_delete)
+        self.search_comparisons = 0
+        self.binary_searches = 0  # Nodes searched by the last search_with_stats
+        
+        self.operation_stats = None  # OperationStats while instrument() is active
+        self._active_stats = None  # Set only during a sampled operation
+        # Bytes per key and per pointer moved when a node's lists shift or get sliced
+        self._pointer_bytes = struct.calcsize('P')
+        self._key_bytes = array(KEY_TYPES[key_type]).itemsize if key_type else self._pointer_bytes
+    
+    @contextmanager
+    def instrument(self, sample_rate=1.0, seed=0):
+        """Collect OperationStats for get() and insert() inside the with block"""
+        previous = self.operation_stats
+        self.operation_stats = OperationStats(sample_rate, seed)
+        self.get = self._get_instrumented
+        self.insert = self._insert_instrumented
+        try:
+            yield self.operation_stats
+        finally:
+            self.operation_stats = previous
+            if previous is None:
+                del self.get, self.insert
+    
+    def search_with_stats(self, key):
+        """Search and return (result, time in μs, real comparisons, nodes searched)"""
+        stats = OperationStats()
+        start_time = time.perf_counter()
+        
+        result = self._search_counted(key, stats)
+        
+        end_time = time.perf_counter()
+        search_time = (end_time - start_time) * 1000000  # Convert to microseconds
+        
+        self.search_comparisons = stats.comparisons
+        self.binary_searches = stats.node_visits
+        return result, search_time, stats.comparisons, stats.node_visits
+    
+    def _search_counted(self, key, stats):
+        """Iterative search that records every comparison and node visit in stats"""
+        probe = CountingKey(key, stats)
+        node = self.root
+        depth = 0
+        
+        while True:
+            stats.visit(depth)
+            pos = bisect.bisect_left(node.keys, probe)
+            if pos < len(node.keys) and probe == node.keys[pos]:
+                if node.values[pos] is TOMBSTONE:
+                    return None
+                return (node.keys[pos], node.values[pos])
+            if node.leaf:
+                return None
+            node = node.children[pos]
+            depth += 1
+    
+    def _get_instrumented(self, key, default=None):
+        stats = self.operation_stats
+        if not stats.sample():
+            return BTreeCorrected.get(self, key, default)
+        
+        start_time = time.perf_counter_ns()
+        result = self._search_counted(key, stats)
+        stats.record_latency('get', time.perf_counter_ns() - start_time)
+        return default if result is None else result[1]
+    
+    def _insert_instrumented(self, key, value):
+        stats = self.operation_stats
+        if not stats.sample():
+            BTreeCorrected.insert(self, key, value)
+            return
+        
+        if self.cache is not None:
+            self.cache.invalidate(key)
+        self._active_stats = stats
+        start_time = time.perf_counter_ns()
+        try:
+            self._insert_counted(key, value, stats)
+        finally:
+            self._active_stats = None
+        stats.record_latency('insert', time.perf_counter_ns() - start_time)
+    
+    def _insert_counted(self, key, value, stats):
+        """BTreeCorrected.insert, descending iteratively so visits and comparisons can be counted"""
+        max_keys = (2 * self.degree) - 1
+        probe = CountingKey(key, stats)
+        
+        if len(self.root.keys) == max_keys:
+            self._split_child(self._grow_root(self.root), 0)
+        
+        path = []
+        node = self.root
+        while True:
+            stats.visit(len(path))
+            path.append(node)
+            pos = bisect.bisect_left(node.keys, probe)
+            if pos < len(node.keys) and probe == node.keys[pos]:
+                added = self._replace_value(node, pos, value)
+                break
+            
+            if node.leaf:
+                # Every key and value after pos shifts one slot to the right
+                stats.bytes_moved += (len(node.keys) - pos) * (self._key_bytes + self._pointer_bytes)
+                node.keys.insert(pos, key)
+                node.values.insert(pos, value)
+                self.leaf_fill[len(node.keys) - 1] -= 1
+                self.leaf_fill[len(node.keys)] += 1
+                added = 1
+                break
+            
+            if len(node.children[pos].keys) == max_keys:
+                self._split_child(node, pos)
+                if probe == node.keys[pos]:
+                    added = self._replace_value(node, pos, value)
+                    break
+                if probe > node.keys[pos]:
+                    pos += 1
+            
+            node = node.children[pos]
+        
+        for ancestor in path:
+            ancestor.size += added
+    
+    def _split_child(self, parent, index):
+        stats = self._active_stats
+        if stats is not None:
+            child = parent.children[index]
+            entry_bytes = self._key_bytes + self._pointer_bytes
+            # Both halves are copied out by slicing, the parent shifts to make room
+            moved = (len(child.keys) - 1) * entry_bytes
+            if not child.leaf:
+                moved += len(child.children) * self._pointer_bytes
+            moved += (len(parent.keys) - index) * entry_bytes
+            moved += (len(parent.children) - index - 1) * self._pointer_bytes
+            stats.splits += 1
+            stats.bytes_moved += moved
+        super()._split_child(parent, index)
 
 def linear_search(data_list, target):
     """Linear search for comparison"""
@@ -201,16 +1388,15 @@ def run_corrected_performance_test():
     # Create sorted data for comparison searches
     sorted_data = sorted(test_data)
     
-    print("\nBuilding B-trees...")
+    print("\nBulk loading B-trees...")
     btrees = {}
     
     for degree in degrees:
-        print(f"  Building B-tree with degree {degree}...")
-        btree = BTreeCorrected(degree)
+        print(f"  Bulk loading B-tree with degree {degree}...")
+        btree = InstrumentedBTreeCorrected(degree)
         
         start_time = time.perf_counter()
-        for key, value in test_data:
-            btree.insert(key, value)
+        btree.bulk_load(test_data)
         end_time = time.perf_counter()
         
         btrees[degree] = btree
@@ -255,8 +1441,8 @@ def run_corrected_performance_test():
     print(f"   Average comparisons: {statistics.mean(binary_comparisons):.1f}")
     print(f"   Max comparisons: {max(binary_comparisons)}")
     
-    # 3. B-tree with binary search
-    print(f"\n🔍 B-TREE with BINARY SEARCH:")
+    # 3. B-tree with binary search (comparisons are counted, not estimated)
+    print("\n🔍 B-TREE with BINARY SEARCH (instrumented):")
     
     best_binary_degree = None
     best_binary_time = float('inf')
@@ -285,6 +1471,68 @@ def run_corrected_performance_test():
               f"{statistics.mean(binary_searches):3.1f} binary searches, "
               f"(avg {stats['avg_keys_per_node']:.1f} keys/node)")
     
+    # 4. Plain get() without any per-lookup bookkeeping
+    print("\n🔍 B-TREE get() (uninstrumented, timed over the whole batch):")
+    
+    for degree in degrees:
+        btree = btrees[degree]
+        get = btree.get
+        
+        start_time = time.perf_counter()
+        for search_id in test_ids:
+            get(search_id)
+        end_time = time.perf_counter()
+        
+        print(f"   Degree {degree:4d}: {(end_time - start_time) * 1000000 / len(test_ids):6.2f} μs per lookup")
+    
+    # 5. The whole batch of lookups in one shared descent
+    print(f"\n🔍 B-TREE search_many() (one batched descent for all {len(test_ids)} keys):")
+    
+    for degree in degrees:
+        btree = btrees[degree]
+        
+        start_time = time.perf_counter()
+        btree.search_many(test_ids)
+        end_time = time.perf_counter()
+        
+        print(f"   Degree {degree:4d}: {(end_time - start_time) * 1000000 / len(test_ids):6.2f} μs per lookup")
+    
+    # 6. Sampled instrumentation of a mixed workload
+    print(f"\n🔍 INSTRUMENTED MIX (10% sampled, {len(test_ids)} lookups + {len(test_ids)} inserts):")
+    
+    for degree in degrees:
+        btree = btrees[degree]
+        with btree.instrument(sample_rate=0.1, seed=degree) as stats:
+            for search_id in test_ids:
+                btree.get(search_id)
+            for new_id in range(num_records + 1000, num_records + 1000 + len(test_ids)):
+                btree.insert(new_id, f"Employee_{new_id}")
+        print(f"   Degree {degree}:")
+        stats.report()
+    
+    # 7. Startup from a saved tree file instead of rebuilding
+    print(f"\n💾 SAVE / LOAD (degree 50, {len(test_ids)} lookups after loading):")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "employees.bt")
+        start_time = time.perf_counter()
+        btrees[50].save(path)
+        print(f"   save():          {time.perf_counter() - start_time:7.3f}s, "
+              f"{os.path.getsize(path) / 2**20:.1f} MiB")
+        
+        for lazy in (False, True):
+            start_time = time.perf_counter()
+            loaded = InstrumentedBTreeCorrected.load(path, lazy=lazy)
+            load_time = time.perf_counter() - start_time
+            
+            start_time = time.perf_counter()
+            for search_id in test_ids:
+                loaded.get(search_id)
+            lookup_time = time.perf_counter() - start_time
+            print(f"   load(lazy={lazy!s:<5}): {load_time:7.3f}s, "
+                  f"then {lookup_time * 1000000 / len(test_ids):6.2f} μs per lookup")
+            del loaded
+    
     print("\n" + "="*80)
     print("PERFORMANCE ANALYSIS")
     print("="*80)
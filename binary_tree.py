@@ -1,5 +1,7 @@
 import time
 
+from buffer_pool import BufferPool
+
 class Node:
     def __init__(self, value, left, right):
         self.value = value
@@ -15,34 +17,73 @@ class Node:
 
 
 class Hdd:
-    def __init__(self, sectors, rings):
-        self.data = [[0] * sectors for _ in range(rings)]
+    """Backing store of fixed-size pages laid out in rings of sectors, with a configurable latency"""
+
+    def __init__(self, sectors, rings, latency=0.0, page_size=64):
+        self.sectors = sectors
+        self.rings = rings
+        self.page_size = page_size
+        self.latency = latency  # Seconds per access, like a seek on a real disk
+        self.data = [[bytes(page_size)] * sectors for _ in range(rings)]
+        self.page_count = 0
+        self.reads = 0
+        self.writes = 0
+
+    def get(self, ring, sector):
+        self.reads += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.data[ring][sector]
+
+    def put(self, ring, sector, data):
+        self.writes += 1
+        if self.latency:
+            time.sleep(self.latency)
+        self.data[ring][sector] = bytes(data)
+
+    # Page interface used by BufferPool: page numbers map onto (ring, sector)
+
+    def read_page(self, page_no):
+        return self.get(*divmod(page_no, self.sectors))
+
+    def write_page(self, page_no, data):
+        self.put(*divmod(page_no, self.sectors), data)
+
+    def allocate_page(self):
+        if self.page_count == self.sectors * self.rings:
+            raise RuntimeError("Hdd is full")
+        self.page_count += 1
+        return self.page_count - 1
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
 
-    def get(self, sector, ring):
-        return self.data[sector][ring]
 
-class Ram:
-    def __init__(self, size):
-        self.data = [0] * size
+if __name__ == "__main__":
+    bm = Node("bm", None, None)
+    sg = Node("sg", None, None)
+    hm = Node("hm", None, None)
+    fe = Node("fe", None, None)
 
-    def load(self, hdd, ring, sector, address):
-        print("Loading data")
-        time.sleep(2)
-        self.data[address] = hdd.get(ring, sector)
-        print(f"Data at address: {self.data[address]} loaded\nFineshed loading!")
-    
+    akku = Node("Akku", bm, sg)
+    man = Node("Man", hm, fe)
 
-bm = Node("bm", None, None)
-sg = Node("sg", None, None)
-hm = Node("hm", None, None)
-fe = Node("fe", None, None)
+    werkzeug = Node("Werkzeug", akku, man)
+    werkzeug.dump()
 
-akku = Node("Akku", bm, sg)
-man = Node("Man", hm, fe)
+    # The RAM is a buffer pool of two frames in front of a slow disk
+    hdd = Hdd(3, 5, latency=0.5)
+    for _ in range(4):
+        hdd.write_page(hdd.allocate_page(), b"data")
+    ram = BufferPool(hdd, frames=2, policy="clock")
 
-werkzeug = Node("Werkzeug", akku, man)
-werkzeug.dump()
+    for page_no in [0, 1, 0, 2, 0, 1]:
+        print(f"Loading page {page_no}")
+        start_time = time.perf_counter()
+        data = ram.read_page(page_no)
+        print(f"Data {data[:4]} loaded in {time.perf_counter() - start_time:.2f}s")
 
-hdd = Hdd(3, 5)
-ram = Ram(5)
-ram.load(hdd, 2, 1, 0)
+    print(ram.stats())
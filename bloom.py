@@ -0,0 +1,78 @@
+import math
+
+# Bloom filter used by SimpleSQLDatabase to answer "definitely not here"
+# without touching the tree (or, for disk tables, any page).
+#
+# Bit positions come from double hashing: one 64-bit hash of the key is
+# mixed into two values h1 and h2, and the i-th position is h1 + i * h2.
+# Python's hash() is salted per process for strings, so a filter is only
+# valid inside the process that built it and is never persisted.
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(value):
+    """splitmix64 finaliser: spreads the bits of hash() (which is the identity for small ints)"""
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+class BloomFilter:
+    """Set membership with no false negatives and a configurable false-positive rate
+
+    Sized for `capacity` keys; past that the false-positive rate climbs, so
+    the owner should rebuild it larger. Keys cannot be removed: after deletes
+    the filter only gets less selective, never wrong.
+    """
+
+    def __init__(self, capacity, fp_rate=0.01):
+        if not 0 < fp_rate < 1:
+            raise ValueError(f"fp_rate must be between 0 and 1, got {fp_rate}")
+        self.capacity = max(1, capacity)
+        self.fp_rate = fp_rate
+        # Optimal size and hash count for the target rate: m = -n ln p / ln(2)^2, k = m/n ln 2
+        self.num_bits = max(64, math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0  # Keys added, including repeats
+
+    def _hashes(self, key):
+        h1 = _mix(hash(key) & _MASK64)
+        h2 = _mix(h1) | 1  # Odd, so the probe sequence never repeats early
+        return h1, h2
+
+    def add(self, key):
+        h1, h2 = self._hashes(key)
+        bits = self.bits
+        num_bits = self.num_bits
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % num_bits
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        """False means the key was never added; True means it probably was"""
+        h1, h2 = self._hashes(key)
+        bits = self.bits
+        num_bits = self.num_bits
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % num_bits
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def estimated_fp_rate(self):
+        """Expected false-positive rate for the keys added so far"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def stats(self):
+        return {
+            'capacity': self.capacity,
+            'keys': self.count,
+            'bits': self.num_bits,
+            'hashes': self.num_hashes,
+            'target_fp_rate': self.fp_rate,
+            'estimated_fp_rate': self.estimated_fp_rate(),
+        }
@@ -0,0 +1,193 @@
+import random
+from collections import OrderedDict
+
+# Buffer-pool manager: a fixed number of page frames cached in front of a
+# backing store (the mmap Pager in disk_btree.py, or Hdd in binary_tree.py).
+# A store only needs page_size, read_page(page_no), write_page(page_no, data),
+# allocate_page(), flush() and close().
+
+
+class Frame:
+    def __init__(self, page_no, data):
+        self.page_no = page_no
+        self.data = bytearray(data)
+        self.pin_count = 0
+        self.dirty = False
+        self.referenced = True  # Second-chance bit for CLOCK
+
+
+class LRUPolicy:
+    """Evict the least recently used unpinned page"""
+
+    def __init__(self):
+        self.order = OrderedDict()
+
+    def touch(self, frame):
+        self.order[frame.page_no] = frame
+        self.order.move_to_end(frame.page_no)
+
+    def remove(self, page_no):
+        del self.order[page_no]
+
+    def victim(self):
+        for page_no, frame in self.order.items():
+            if frame.pin_count == 0:
+                return page_no
+        return None
+
+
+class ClockPolicy:
+    """Second-chance eviction: sweep a hand over the frames, clearing reference bits"""
+
+    def __init__(self):
+        self.ring = []  # Frames in clock order
+        self.members = set()  # Page numbers in the ring
+        self.hand = 0
+
+    def touch(self, frame):
+        frame.referenced = True
+        if frame.page_no not in self.members:
+            self.members.add(frame.page_no)
+            self.ring.append(frame)
+
+    def remove(self, page_no):
+        self.members.discard(page_no)
+        for i, frame in enumerate(self.ring):
+            if frame.page_no == page_no:
+                del self.ring[i]
+                if self.hand > i:
+                    self.hand -= 1
+                break
+        if self.hand >= len(self.ring):
+            self.hand = 0
+
+    def victim(self):
+        # Two full sweeps clear every reference bit, so a third finds nothing new
+        for _ in range(2 * len(self.ring)):
+            frame = self.ring[self.hand]
+            self.hand = (self.hand + 1) % len(self.ring)
+            if frame.pin_count > 0:
+                continue
+            if frame.referenced:
+                frame.referenced = False
+                continue
+            return frame.page_no
+        return None
+
+
+POLICIES = {"lru": LRUPolicy, "clock": ClockPolicy}
+
+
+class BufferPool:
+    """Caches up to `frames` pages of a backing store with pin/unpin and dirty write-back"""
+
+    def __init__(self, store, frames=64, policy="lru"):
+        if frames < 1:
+            raise ValueError("A buffer pool needs at least one frame")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown eviction policy {policy!r}, expected one of {tuple(POLICIES)}")
+        self.store = store
+        self.capacity = frames
+        self.policy_name = policy
+        self.policy = POLICIES[policy]()
+        self.frames = {}  # page_no -> Frame
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+
+    def fetch_page(self, page_no):
+        """Pin a page and return its frame; the caller must unpin_page it"""
+        frame = self.frames.get(page_no)
+        if frame is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            if len(self.frames) >= self.capacity:
+                self._evict()
+            frame = Frame(page_no, self.store.read_page(page_no))
+            self.frames[page_no] = frame
+
+        frame.pin_count += 1
+        self.policy.touch(frame)
+        return frame
+
+    def unpin_page(self, page_no, dirty=False):
+        frame = self.frames[page_no]
+        if frame.pin_count == 0:
+            raise RuntimeError(f"Page {page_no} is not pinned")
+        frame.pin_count -= 1
+        if dirty:
+            frame.dirty = True
+
+    def _evict(self):
+        page_no = self.policy.victim()
+        if page_no is None:
+            raise RuntimeError("Buffer pool exhausted: every frame is pinned")
+
+        frame = self.frames.pop(page_no)
+        self.policy.remove(page_no)
+        self.evictions += 1
+        if frame.dirty:
+            self.store.write_page(page_no, bytes(frame.data))
+            self.writebacks += 1
+
+    # The store interface, so a pool can stand in for the store it caches
+
+    def read_page(self, page_no):
+        frame = self.fetch_page(page_no)
+        try:
+            return bytes(frame.data)
+        finally:
+            self.unpin_page(page_no)
+
+    def write_page(self, page_no, data):
+        frame = self.fetch_page(page_no)
+        frame.data[:len(data)] = data
+        self.unpin_page(page_no, dirty=True)
+
+    def allocate_page(self):
+        """Allocate a page in the store and cache it as a zeroed, dirty frame"""
+        page_no = self.store.allocate_page()
+        if len(self.frames) >= self.capacity:
+            self._evict()
+        frame = Frame(page_no, bytes(self.store.page_size))
+        frame.dirty = True
+        self.frames[page_no] = frame
+        self.policy.touch(frame)
+        return page_no
+
+    def flush(self):
+        """Write every dirty frame back to the store"""
+        for page_no, frame in self.frames.items():
+            if frame.dirty:
+                self.store.write_page(page_no, bytes(frame.data))
+                frame.dirty = False
+                self.writebacks += 1
+        self.store.flush()
+
+    def close(self):
+        self.flush()
+        self.store.close()
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'frames': self.capacity,
+            'policy': self.policy_name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'writebacks': self.writebacks,
+            'hit_rate': self.hits / requests if requests else 0.0,
+        }
+
+
+def zipf_keys(keys, count, skew=1.0, seed=42):
+    """Draw count keys with Zipfian popularity (rank r is picked with weight 1/r^skew)"""
+    rng = random.Random(seed)
+    ranked = list(keys)
+    rng.shuffle(ranked)  # Popular keys are spread over the key space
+    weights = [1 / (rank ** skew) for rank in range(1, len(ranked) + 1)]
+    return rng.choices(ranked, weights=weights, k=count)
@@ -0,0 +1,405 @@
+import bisect
+import random
+import threading
+import time
+
+# A B-tree that many threads can use at once.
+#
+# Every node carries a reader/writer latch, and operations "crab" down the
+# tree: a thread latches the child before letting go of the parent, and lets
+# go of the parent as soon as the child cannot be affected by a split.
+#
+# - get() holds shared latches, at most two at a time.
+# - insert() first tries an optimistic descent with shared latches and only
+#   write-latches the leaf; if the leaf is full it retries pessimistically.
+# - The pessimistic descent write-latches nodes and splits full children on
+#   the way down, so every child is safe as soon as it is latched and the
+#   parent can be released right away.
+
+
+class RWLatch:
+    """Reader/writer latch that lets waiting writers go before new readers"""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class ConcurrentNode:
+    __slots__ = ('keys', 'values', 'children', 'leaf', 'latch')
+
+    def __init__(self, leaf=False):
+        self.keys = []
+        self.values = []
+        self.children = []
+        self.leaf = leaf
+        self.latch = RWLatch()
+
+
+class ConcurrentBTree:
+    """Thread-safe B-tree using per-node latches and latch crabbing
+
+    io_latency (seconds) is slept on every node visit while the latch is
+    held, to model page loads that release the GIL.
+    """
+
+    def __init__(self, degree=50, io_latency=0.0):
+        self.degree = degree
+        self.root = ConcurrentNode(leaf=True)
+        # Guards the root pointer itself, which changes when the root splits
+        self.root_latch = RWLatch()
+        self.io_latency = io_latency
+
+        self.optimistic_inserts = 0
+        self.pessimistic_inserts = 0
+
+    def _visit(self):
+        if self.io_latency:
+            time.sleep(self.io_latency)
+
+    def get(self, key, default=None):
+        """Return the value for key, or default"""
+        self.root_latch.acquire_read()
+        node = self.root
+        node.latch.acquire_read()
+        self.root_latch.release_read()
+
+        while True:
+            self._visit()
+            pos = bisect.bisect_left(node.keys, key)
+            if pos < len(node.keys) and node.keys[pos] == key:
+                value = node.values[pos]
+                node.latch.release_read()
+                return value
+            if node.leaf:
+                node.latch.release_read()
+                return default
+
+            child = node.children[pos]
+            child.latch.acquire_read()
+            node.latch.release_read()
+            node = child
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def insert(self, key, value):
+        """Insert or replace a key-value pair"""
+        if self._insert_optimistic(key, value):
+            self.optimistic_inserts += 1
+            return
+        self.pessimistic_inserts += 1
+        self._insert_pessimistic(key, value)
+
+    def _insert_optimistic(self, key, value):
+        """Descend with shared latches and write-latch only the leaf
+
+        Returns False, holding no latches, when the insert could split a node
+        or has to update an internal node.
+        """
+        max_keys = (2 * self.degree) - 1
+
+        self.root_latch.acquire_read()
+        node = self.root
+        if node.leaf:
+            node.latch.acquire_write()
+            self.root_latch.release_read()
+        else:
+            node.latch.acquire_read()
+            self.root_latch.release_read()
+
+            while True:
+                self._visit()
+                pos = bisect.bisect_left(node.keys, key)
+                if pos < len(node.keys) and node.keys[pos] == key:
+                    node.latch.release_read()
+                    return False
+
+                child = node.children[pos]
+                if child.leaf:
+                    child.latch.acquire_write()
+                    node.latch.release_read()
+                    node = child
+                    break
+                child.latch.acquire_read()
+                node.latch.release_read()
+                node = child
+
+        self._visit()
+        pos = bisect.bisect_left(node.keys, key)
+        if pos < len(node.keys) and node.keys[pos] == key:
+            node.values[pos] = value
+        elif len(node.keys) < max_keys:
+            node.keys.insert(pos, key)
+            node.values.insert(pos, value)
+        else:
+            node.latch.release_write()
+            return False
+        node.latch.release_write()
+        return True
+
+    def _insert_pessimistic(self, key, value):
+        """Write-latched descent that splits full children before entering them"""
+        max_keys = (2 * self.degree) - 1
+
+        self.root_latch.acquire_write()
+        node = self.root
+        node.latch.acquire_write()
+
+        if len(node.keys) == max_keys:
+            # Nobody can reach the new root before root_latch is released
+            new_root = ConcurrentNode()
+            new_root.children.append(node)
+            new_root.latch.acquire_write()
+            self._split_child(new_root, 0)
+            self.root = new_root
+            node.latch.release_write()
+            node = new_root
+        self.root_latch.release_write()
+
+        while True:
+            self._visit()
+            pos = bisect.bisect_left(node.keys, key)
+            if pos < len(node.keys) and node.keys[pos] == key:
+                node.values[pos] = value
+                node.latch.release_write()
+                return
+
+            if node.leaf:
+                node.keys.insert(pos, key)
+                node.values.insert(pos, value)
+                node.latch.release_write()
+                return
+
+            child = node.children[pos]
+            child.latch.acquire_write()
+            if len(child.keys) == max_keys:
+                self._split_child(node, pos)
+                if node.keys[pos] == key:
+                    # The promoted middle key is the one being inserted
+                    node.values[pos] = value
+                    child.latch.release_write()
+                    node.latch.release_write()
+                    return
+                if key > node.keys[pos]:
+                    # Continue in the new right half instead
+                    sibling = node.children[pos + 1]
+                    sibling.latch.acquire_write()
+                    child.latch.release_write()
+                    child = sibling
+
+            # The child is not full, so nothing below can reach this node any more
+            node.latch.release_write()
+            node = child
+
+    def _split_child(self, parent, index):
+        """Split a full, write-latched child of a write-latched parent"""
+        degree = self.degree
+        full_child = parent.children[index]
+        new_child = ConcurrentNode(leaf=full_child.leaf)
+
+        mid_index = degree - 1
+        mid_key = full_child.keys[mid_index]
+        mid_value = full_child.values[mid_index]
+
+        new_child.keys = full_child.keys[degree:]
+        new_child.values = full_child.values[degree:]
+        full_child.keys = full_child.keys[:mid_index]
+        full_child.values = full_child.values[:mid_index]
+
+        if not full_child.leaf:
+            new_child.children = full_child.children[degree:]
+            full_child.children = full_child.children[:degree]
+
+        parent.children.insert(index + 1, new_child)
+        parent.keys.insert(index, mid_key)
+        parent.values.insert(index, mid_value)
+
+    def items(self):
+        """All (key, value) pairs in order; takes the root latch exclusively to get a consistent view"""
+        self.root_latch.acquire_write()
+        try:
+            # Wait for writers already below the root to leave it
+            self.root.latch.acquire_write()
+            self.root.latch.release_write()
+            result = []
+            self._collect(self.root, result)
+            return result
+        finally:
+            self.root_latch.release_write()
+
+    def _collect(self, node, result):
+        node.latch.acquire_read()
+        try:
+            for i, key in enumerate(node.keys):
+                if not node.leaf:
+                    self._collect(node.children[i], result)
+                result.append((key, node.values[i]))
+            if not node.leaf:
+                self._collect(node.children[-1], result)
+        finally:
+            node.latch.release_read()
+
+    def check(self):
+        """Verify ordering, fill and balance invariants; raises AssertionError on corruption"""
+        depths = set()
+
+        def walk(node, low, high, depth, is_root):
+            assert list(node.keys) == sorted(node.keys), "keys out of order"
+            assert len(node.keys) <= (2 * self.degree) - 1, "node over capacity"
+            if not is_root:
+                assert len(node.keys) >= self.degree - 1, "node under minimum fill"
+            for key in node.keys:
+                assert (low is None or key > low) and (high is None or key < high), "key outside its range"
+            if node.leaf:
+                depths.add(depth)
+                return
+            assert len(node.children) == len(node.keys) + 1, "wrong child count"
+            for i, child in enumerate(node.children):
+                walk(child, node.keys[i - 1] if i > 0 else low,
+                     node.keys[i] if i < len(node.keys) else high, depth + 1, False)
+
+        walk(self.root, None, None, 0, True)
+        assert len(depths) <= 1, "leaves at different depths"
+
+
+_MISSING = object()
+
+
+class GlobalLockBTree:
+    """Baseline: the same tree behind one global lock, as services use today"""
+
+    def __init__(self, degree=50, io_latency=0.0):
+        self.tree = ConcurrentBTree(degree, io_latency)
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.tree.get(key, default)
+
+    def insert(self, key, value):
+        with self.lock:
+            self.tree.insert(key, value)
+
+
+def run_stress_test(num_threads=8, ops_per_thread=20_000, degree=4, seed=7):
+    """Hammer one tree from many threads, then check that nothing was lost or corrupted"""
+    tree = ConcurrentBTree(degree)
+    errors = []
+    barrier = threading.Barrier(num_threads)
+
+    def worker(thread_id):
+        rng = random.Random(seed + thread_id)
+        # Each thread owns the keys congruent to its id, so final values are known
+        own_keys = list(range(thread_id, num_threads * ops_per_thread, num_threads))
+        rng.shuffle(own_keys)
+        barrier.wait()
+        try:
+            for i, key in enumerate(own_keys):
+                tree.insert(key, (thread_id, key))
+                if i % 3 == 0:
+                    # Read back an own key (must be there) and a random one (may be anything)
+                    probe = own_keys[rng.randrange(i + 1)]
+                    if tree.get(probe) != (thread_id, probe):
+                        errors.append(f"thread {thread_id} lost key {probe}")
+                    tree.get(rng.randrange(num_threads * ops_per_thread))
+                if i % 5 == 0:
+                    tree.insert(key, (thread_id, key))  # Concurrent upserts
+        except Exception as error:  # Report instead of dying silently in the thread
+            errors.append(f"thread {thread_id}: {error!r}")
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(num_threads)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+
+    tree.check()
+    items = tree.items()
+    expected = num_threads * ops_per_thread
+    if len(items) != expected:
+        errors.append(f"expected {expected} keys, found {len(items)}")
+    for key, value in items:
+        if value != (key % num_threads, key):
+            errors.append(f"key {key} has wrong value {value}")
+            break
+
+    print(f"Stress test: {num_threads} threads, {expected:,} inserts in {elapsed:.2f}s, "
+          f"{tree.optimistic_inserts:,} optimistic / {tree.pessimistic_inserts:,} pessimistic inserts")
+    if errors:
+        raise AssertionError("; ".join(errors[:10]))
+    print("   ✔ all keys present, values correct, invariants hold")
+
+
+def run_throughput_benchmark(thread_counts=(1, 2, 4, 8, 16), num_records=100_000,
+                             ops_per_thread=2_000, read_ratio=0.9, io_latency=0.0001, degree=32):
+    """Compare per-node latches with a global lock at 1-16 threads (90% reads by default)"""
+    print("=" * 80)
+    print(f"CONCURRENT B-TREE THROUGHPUT ({read_ratio:.0%} reads, "
+          f"{io_latency * 1000000:.0f} μs simulated page load per node)")
+    print("=" * 80)
+    print(f"{'Threads':<10} {'Global lock (ops/s)':<22} {'Latch crabbing (ops/s)':<24} {'Speedup'}")
+
+    for num_threads in thread_counts:
+        results = []
+        for tree_class in (GlobalLockBTree, ConcurrentBTree):
+            # Preload without simulated I/O, then switch it on for the timed part
+            tree = tree_class(degree)
+            for key in range(0, 2 * num_records, 2):
+                tree.insert(key, key)
+            inner = tree.tree if isinstance(tree, GlobalLockBTree) else tree
+            inner.io_latency = io_latency
+
+            def worker(thread_id):
+                rng = random.Random(thread_id)
+                for _ in range(ops_per_thread):
+                    key = rng.randrange(2 * num_records)
+                    if rng.random() < read_ratio:
+                        tree.get(key)
+                    else:
+                        tree.insert(key, key)
+
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(num_threads)]
+            start_time = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start_time
+            results.append(num_threads * ops_per_thread / elapsed)
+
+        print(f"{num_threads:<10} {results[0]:<22,.0f} {results[1]:<24,.0f} {results[1] / results[0]:.2f}x")
+
+
+if __name__ == "__main__":
+    run_stress_test()
+    run_throughput_benchmark()
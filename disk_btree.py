@@ -0,0 +1,444 @@
+import bisect
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+from buffer_pool import BufferPool, POLICIES, zipf_keys
+from tracing import Tracer, NULL_TRACER
+from wal import encode_value, decode_value
+
+# A real version of the Hdd/Ram idea from binary_tree.py: every node is a
+# fixed-size page in a file, and the file is accessed through mmap.
+#
+# Page 0 holds the file header, every other page holds one node:
+#   leaf flag (1 byte), key count n (2 bytes)
+#   n keys as little-endian int64
+#   n + 1 child page numbers as uint32 (internal nodes only)
+#   n values, each a uint16 length followed by the value in the write-ahead
+#   log's encoding (wal.encode_value), so ints, tuples etc. keep their type
+#
+# Version 1 files stored values as bare UTF-8 strings; they can still be
+# opened and written, but only with str values.
+
+MAGIC = b"BTPG"
+FORMAT_VERSION = 2
+READABLE_VERSIONS = (1, 2)
+PAGE_SIZES = (4096, 8192, 16384)
+
+_FILE_HEADER = struct.Struct("<4sHIIII")  # magic, version, page size, max value size, root page, page count
+_NODE_HEADER = struct.Struct("<BH")  # leaf flag, key count
+_VALUE_LENGTH = struct.Struct("<H")
+_ENCODING_OVERHEAD = 5  # Type tag and length that encode_value adds to a str or bytes value
+
+KEY_SIZE = 8
+CHILD_SIZE = 4
+
+
+def degree_for_page(page_size, max_value_size):
+    """Largest minimum degree t whose full node (2t-1 keys) always fits into one page"""
+    entry_size = KEY_SIZE + _VALUE_LENGTH.size + max_value_size
+    # header + (2t - 1) entries + 2t children <= page_size
+    return (page_size - _NODE_HEADER.size + entry_size) // (2 * (entry_size + CHILD_SIZE))
+
+
+class DiskNode:
+    __slots__ = ('page_no', 'keys', 'values', 'children', 'leaf')
+
+    def __init__(self, page_no, leaf=False):
+        self.page_no = page_no  # Page that stores this node
+        self.keys = []
+        self.values = []
+        self.children = []  # Child page numbers, not node objects
+        self.leaf = leaf
+
+    def __str__(self):
+        return f"Page {self.page_no}: {self.keys}"
+
+
+class Pager:
+    """Fixed-size pages in a memory-mapped file, with an optional simulated access latency"""
+
+    def __init__(self, path, page_size=4096, max_value_size=64, latency=0.0):
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.path = path
+        self.file = open(path, "r+b" if exists else "w+b")
+
+        if exists:
+            header = self.file.read(_FILE_HEADER.size)
+            magic, version, page_size, max_value_size, root_page, page_count = _FILE_HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a B-tree page file")
+            if version not in READABLE_VERSIONS:
+                raise ValueError(f"{path} has unsupported format version {version}")
+        else:
+            if page_size not in PAGE_SIZES:
+                raise ValueError(f"Page size must be one of {PAGE_SIZES}, got {page_size}")
+            version, root_page, page_count = FORMAT_VERSION, 0, 1
+            self.file.truncate(page_size)
+
+        self.version = version
+        self.page_size = page_size
+        self.max_value_size = max_value_size
+        self.root_page = root_page
+        self.page_count = page_count
+        self.latency = latency  # Seconds per page read or write
+        self.reads = 0
+        self.writes = 0
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+
+        if not exists:
+            self.write_header()
+
+    def write_header(self):
+        self.mm[:_FILE_HEADER.size] = _FILE_HEADER.pack(
+            MAGIC, self.version, self.page_size, self.max_value_size, self.root_page, self.page_count)
+
+    def read_page(self, page_no):
+        self.reads += 1
+        if self.latency:
+            time.sleep(self.latency)
+        offset = page_no * self.page_size
+        return self.mm[offset:offset + self.page_size]
+
+    def write_page(self, page_no, data):
+        self.writes += 1
+        if self.latency:
+            time.sleep(self.latency)
+        offset = page_no * self.page_size
+        self.mm[offset:offset + len(data)] = data
+
+    def allocate_page(self):
+        """Return the number of a fresh page, growing the file when needed"""
+        page_no = self.page_count
+        self.page_count += 1
+
+        needed = self.page_count * self.page_size
+        if needed > len(self.mm):
+            # Grow geometrically so appends stay cheap
+            new_size = max(needed, 2 * len(self.mm))
+            self.mm.close()
+            self.file.truncate(new_size)
+            self.mm = mmap.mmap(self.file.fileno(), 0)
+
+        self.write_header()
+        return page_no
+
+    def flush(self):
+        self.write_header()
+        self.mm.flush()
+
+    def close(self):
+        if not self.mm.closed:
+            self.flush()
+            self.mm.close()
+        self.file.close()
+
+
+class DiskBTree:
+    """B-tree whose nodes live in fixed-size pages of a memory-mapped file
+
+    With cache_pages set, every node fetch goes through a BufferPool of that
+    many frames (cache_policy "lru" or "clock") instead of straight to the file.
+    """
+
+    def __init__(self, path, page_size=4096, max_value_size=64, tracer=None,
+                 cache_pages=None, cache_policy="lru", latency=0.0):
+        self.pager = Pager(path, page_size, max_value_size, latency)
+        if cache_pages:
+            self.pages = BufferPool(self.pager, cache_pages, cache_policy)
+        else:
+            self.pages = self.pager
+        self.page_size = self.pager.page_size
+        self.max_value_size = self.pager.max_value_size
+        # Room for one encoded value: a str of max_value_size bytes must fit
+        self.value_room = self.max_value_size + (_ENCODING_OVERHEAD if self.pager.version >= 2 else 0)
+        self.degree = degree_for_page(self.page_size, self.value_room)
+        if self.degree < 2:
+            raise ValueError(f"Values of {self.max_value_size} bytes do not fit into {self.page_size}-byte pages")
+
+        self.tracer = tracer if tracer is not None else NULL_TRACER
+        self.tracing = type(self.tracer) is not Tracer
+
+        if self.pager.root_page == 0:
+            # Fresh file: start with an empty root leaf
+            root = DiskNode(self.pages.allocate_page(), leaf=True)
+            self._write_node(root)
+            self.pager.root_page = root.page_no
+            self.pager.write_header()
+
+    def _read_node(self, page_no):
+        """Read a page and decode the node stored in it"""
+        return self._decode_node(page_no, self.pages.read_page(page_no))
+
+    def _decode_node(self, page_no, page):
+        """Decode the node stored in a page that was already read"""
+        leaf, count = _NODE_HEADER.unpack_from(page, 0)
+        offset = _NODE_HEADER.size
+
+        node = DiskNode(page_no, leaf=bool(leaf))
+        node.keys = list(struct.unpack_from(f"<{count}q", page, offset))
+        offset += KEY_SIZE * count
+
+        if not node.leaf:
+            node.children = list(struct.unpack_from(f"<{count + 1}I", page, offset))
+            offset += CHILD_SIZE * (count + 1)
+
+        for _ in range(count):
+            (length,) = _VALUE_LENGTH.unpack_from(page, offset)
+            offset += _VALUE_LENGTH.size
+            node.values.append(page[offset:offset + length])  # Kept encoded until returned
+            offset += length
+
+        if self.tracing:
+            self.tracer.on_visit(self, node)
+        return node
+
+    def _write_node(self, node):
+        """Encode a node into its page"""
+        count = len(node.keys)
+        parts = [_NODE_HEADER.pack(1 if node.leaf else 0, count),
+                 struct.pack(f"<{count}q", *node.keys)]
+        if not node.leaf:
+            parts.append(struct.pack(f"<{count + 1}I", *node.children))
+        for value in node.values:
+            parts.append(_VALUE_LENGTH.pack(len(value)))
+            parts.append(value)
+        self.pages.write_page(node.page_no, b"".join(parts))
+
+    def _encode_value(self, value):
+        if self.pager.version >= 2:
+            encoded = encode_value(value)
+        elif isinstance(value, str):
+            encoded = value.encode("utf-8")
+        else:
+            raise TypeError(f"{self.path} is a version 1 page file, which only stores str values, "
+                            f"got {type(value).__name__}")
+        if len(encoded) > self.value_room:
+            raise ValueError(f"Value is {len(encoded)} bytes encoded, the page layout allows {self.value_room}")
+        return encoded
+
+    def _decode_value(self, raw):
+        """The value stored in a node's raw value bytes"""
+        if self.pager.version >= 2:
+            return decode_value(raw)[0]
+        return raw.decode("utf-8")
+
+    def insert(self, key, value):
+        """Insert or replace a key-value pair"""
+        if not isinstance(key, int):
+            raise TypeError(f"Disk tables use integer keys, got {type(key).__name__}")
+        if self.tracing:
+            self.tracer.on_insert(self, key, value)
+
+        encoded = self._encode_value(value)
+        root = self._read_node(self.pager.root_page)
+
+        if len(root.keys) == (2 * self.degree) - 1:
+            new_root = DiskNode(self.pages.allocate_page())
+            new_root.children.append(root.page_no)
+            self._split_child(new_root, 0, root)
+            self.pager.root_page = new_root.page_no
+            self.pager.write_header()
+            root = new_root
+
+        self._insert_non_full(root, key, encoded)
+
+        if self.tracing:
+            self.tracer.on_insert_done(self, key, value)
+
+    def _insert_non_full(self, node, key, encoded):
+        while True:
+            pos = bisect.bisect_left(node.keys, key)
+
+            if pos < len(node.keys) and node.keys[pos] == key:
+                # Key already exists, update value in place
+                node.values[pos] = encoded
+                self._write_node(node)
+                return
+
+            if node.leaf:
+                node.keys.insert(pos, key)
+                node.values.insert(pos, encoded)
+                self._write_node(node)
+                return
+
+            child = self._read_node(node.children[pos])
+            if len(child.keys) == (2 * self.degree) - 1:
+                self._split_child(node, pos, child)
+                if key == node.keys[pos]:
+                    continue  # The promoted key is the one being inserted
+                if key > node.keys[pos]:
+                    child = self._read_node(node.children[pos + 1])
+            node = child
+
+    def _split_child(self, parent, index, full_child):
+        """Split a full child page, writing all three touched pages"""
+        degree = self.degree
+        mid_index = degree - 1
+
+        if self.tracing:
+            self.tracer.on_split(self, full_child, mid_index)
+
+        new_child = DiskNode(self.pages.allocate_page(), leaf=full_child.leaf)
+        mid_key = full_child.keys[mid_index]
+        mid_value = full_child.values[mid_index]
+
+        new_child.keys = full_child.keys[degree:]
+        new_child.values = full_child.values[degree:]
+        full_child.keys = full_child.keys[:mid_index]
+        full_child.values = full_child.values[:mid_index]
+
+        if not full_child.leaf:
+            new_child.children = full_child.children[degree:]
+            full_child.children = full_child.children[:degree]
+
+        parent.children.insert(index + 1, new_child.page_no)
+        parent.keys.insert(index, mid_key)
+        parent.values.insert(index, mid_value)
+
+        self._write_node(full_child)
+        self._write_node(new_child)
+        self._write_node(parent)
+
+        if self.tracing:
+            self.tracer.on_split_done(self, parent, index)
+
+    def search(self, key):
+        """Return (key, value) for key, or None"""
+        node = self._read_node(self.pager.root_page)
+        result = None
+
+        while True:
+            pos = bisect.bisect_left(node.keys, key)
+            if pos < len(node.keys) and node.keys[pos] == key:
+                result = (key, self._decode_value(node.values[pos]))
+                break
+            if node.leaf:
+                break
+            node = self._read_node(node.children[pos])
+
+        if self.tracing:
+            self.tracer.on_search(self, key, result)
+        return result
+
+    def range_search(self, start_key, end_key):
+        results = list(self.scan(start_key, end_key))
+        if self.tracing:
+            self.tracer.on_range_search(self, start_key, end_key, results)
+        return results
+
+    def scan(self, start=None, end=None, reverse=False):
+        """Lazily yield (key, value) pairs with start <= key <= end, reading pages on demand"""
+        root = self._read_node(self.pager.root_page)
+        if reverse:
+            return self._scan_node_reverse(root, start, end)
+        return self._scan_node(root, start, end)
+
+    def _scan_node(self, node, start, end):
+        i = 0 if start is None else bisect.bisect_left(node.keys, start)
+
+        while i < len(node.keys):
+            if not node.leaf:
+                yield from self._scan_node(self._read_node(node.children[i]), start, end)
+
+            key = node.keys[i]
+            if end is not None and key > end:
+                return
+            yield (key, self._decode_value(node.values[i]))
+            i += 1
+
+        if not node.leaf:
+            yield from self._scan_node(self._read_node(node.children[i]), start, end)
+
+    def _scan_node_reverse(self, node, start, end):
+        i = len(node.keys) if end is None else bisect.bisect_right(node.keys, end)
+
+        while i > 0:
+            if not node.leaf:
+                yield from self._scan_node_reverse(self._read_node(node.children[i]), start, end)
+
+            key = node.keys[i - 1]
+            if start is not None and key < start:
+                return
+            yield (key, self._decode_value(node.values[i - 1]))
+            i -= 1
+
+        if not node.leaf:
+            yield from self._scan_node_reverse(self._read_node(node.children[0]), start, end)
+
+    def display(self):
+        """Display the page structure of the tree"""
+        print(f"\n--- Disk B-Tree Structure ({self.path}) ---")
+        self._display_node(self._read_node(self.pager.root_page), 0)
+        print("------------------------")
+
+    def _display_node(self, node, level):
+        indent = "  " * level
+        pairs = [(key, self._decode_value(value)) for key, value in zip(node.keys, node.values)]
+
+        if node.leaf:
+            print(f"{indent}LEAF (page {node.page_no}): {pairs}")
+        else:
+            print(f"{indent}NODE (page {node.page_no}): {pairs}")
+            for child in node.children:
+                self._display_node(self._read_node(child), level + 1)
+
+    def display_tree_visual(self):
+        """Print the page statistics of the file"""
+        print(f"Page size: {self.page_size} bytes, degree: {self.degree}, "
+              f"pages: {self.pager.page_count}, root page: {self.pager.root_page}")
+
+    @property
+    def path(self):
+        return self.pager.path
+
+    def flush(self):
+        self.pages.flush()
+
+    def close(self):
+        self.pages.close()
+
+
+def run_buffer_pool_experiment():
+    """Measure page reads per lookup for different page sizes and pool sizes"""
+    num_records = 100_000
+    num_lookups = 20_000
+    page_sizes = [4096, 8192, 16384]
+    pool_sizes = [8, 32, 128, 512]
+
+    print("=" * 80)
+    print("BUFFER POOL: PAGE READS PER LOOKUP (Zipfian lookups, skew 1.0)")
+    print("=" * 80)
+
+    lookups = zipf_keys(range(num_records), num_lookups)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for page_size in page_sizes:
+            path = os.path.join(directory, f"table_{page_size}.db")
+            tree = DiskBTree(path, page_size)
+            for key in range(num_records):
+                tree.insert(key, f"Employee_{key}")
+            tree.close()
+
+            for policy in POLICIES:
+                for frames in pool_sizes:
+                    tree = DiskBTree(path, cache_pages=frames, cache_policy=policy)
+                    tree.pages.hits = tree.pages.misses = 0
+
+                    start_time = time.perf_counter()
+                    for key in lookups:
+                        tree.search(key)
+                    end_time = time.perf_counter()
+
+                    stats = tree.pages.stats()
+                    print(f"  page {page_size:5d} B, degree {tree.degree:3d}, {policy:5s} {frames:4d} frames: "
+                          f"{stats['misses'] / num_lookups:5.2f} reads/lookup, "
+                          f"hit rate {stats['hit_rate']:6.1%}, "
+                          f"{(end_time - start_time) * 1000000 / num_lookups:6.2f} μs/lookup")
+                    tree.close()
+
+
+if __name__ == "__main__":
+    run_buffer_pool_experiment()
@@ -0,0 +1,94 @@
+import sys
+from collections import OrderedDict
+
+# Bounded LRU cache for point-lookup results, used by BTree and
+# BTreeCorrected through enable_cache(). The tree stores whatever its lookup
+# returns (including "not found") and invalidates a key on every write to it,
+# so a cached answer is always the answer the tree would give.
+
+MISS = object()  # Returned by LookupCache.get when the key is not cached
+
+# Rough per-entry cost of the OrderedDict slot and its link node
+_ENTRY_OVERHEAD = 100
+
+
+class LookupCache:
+    """LRU cache bounded by an entry count and, optionally, an estimated memory budget
+
+    max_bytes counts sys.getsizeof of each key and value (shallow) plus a
+    fixed per-entry overhead, so it is an estimate, not an exact limit.
+    """
+
+    def __init__(self, capacity=4096, max_bytes=None):
+        if capacity < 1:
+            raise ValueError("A lookup cache needs room for at least one entry")
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> value, least recently used first
+        self.sizes = {}  # key -> estimated bytes, only kept when max_bytes is set
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        value = self.entries.get(key, MISS)
+        if value is MISS:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        entries = self.entries
+        if key in entries:
+            entries.move_to_end(key)
+        entries[key] = value
+
+        if self.max_bytes is not None:
+            size = _ENTRY_OVERHEAD + sys.getsizeof(key) + sys.getsizeof(value)
+            self.bytes += size - self.sizes.get(key, 0)
+            self.sizes[key] = size
+            while self.bytes > self.max_bytes and len(entries) > 1:
+                self._evict()
+        if len(entries) > self.capacity:
+            self._evict()
+
+    def _evict(self):
+        key, _ = self.entries.popitem(last=False)
+        if self.max_bytes is not None:
+            self.bytes -= self.sizes.pop(key)
+        self.evictions += 1
+
+    def invalidate(self, key):
+        """Forget key; called by the tree on every insert, update or delete of it"""
+        if self.entries.pop(key, MISS) is not MISS:
+            if self.max_bytes is not None:
+                self.bytes -= self.sizes.pop(key)
+            self.invalidations += 1
+
+    def clear(self):
+        self.invalidations += len(self.entries)
+        self.entries.clear()
+        self.sizes.clear()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'capacity': self.capacity,
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_rate': self.hits / requests if requests else 0.0,
+        }
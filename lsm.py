@@ -0,0 +1,549 @@
+import bisect
+import heapq
+import mmap
+import os
+import random
+import shutil
+import struct
+import tempfile
+import threading
+import time
+
+from bloom import BloomFilter
+from tracing import Tracer, NULL_TRACER
+from wal import encode_value, decode_value
+
+# Log-structured merge tree: a table engine for append-mostly data.
+#
+# Writes go to an in-memory sorted memtable. When it fills up it is written
+# out in one sequential pass as an immutable sorted run, and a compaction
+# (in a background thread by default) merges runs into larger ones:
+#
+#   level 0   runs flushed from the memtable, newest first, key ranges overlap
+#   level 1+  at most one run per level, each level_ratio times larger than
+#             the one above (leveled compaction)
+#
+# Reads look at the memtable, then level 0 newest to oldest, then each
+# deeper level, and the first version found wins. Deletes write tombstones,
+# which are only dropped when a compaction writes the deepest level.
+#
+# Run file layout (all integers little-endian):
+#   header: magic "LSMR", version (uint16), record count (uint32), index offset (uint64)
+#   records in key order: tombstone flag (1 byte), key, then for puts the
+#     value's length (uint32) and the value, so lookups can skip values unread
+#   sparse index: (key, record offset) for every INDEX_INTERVAL-th record
+# Keys and values use the write-ahead log's encoding (wal.encode_value).
+#
+# A MANIFEST file in the table directory lists the live runs of every level;
+# it is replaced atomically after each flush and compaction, so a crash leaves
+# either the old or the new set of runs. The memtable itself is not durable:
+# tables opened by SimpleSQLDatabase rely on its write-ahead log for that.
+
+RUN_MAGIC = b"LSMR"
+RUN_FORMAT_VERSION = 1
+INDEX_INTERVAL = 16  # Records per sparse index entry (and at most per point lookup)
+
+_RUN_HEADER = struct.Struct("<4sHIQ")
+_OFFSET = struct.Struct("<Q")
+_LENGTH = struct.Struct("<I")
+_PUT = b"\x00"
+_TOMBSTONE_FLAG = b"\x01"
+
+TOMBSTONE = object()  # Stored value of a deleted key until compaction drops it
+_MISSING = object()  # Sentinel for lookups where None is a valid value
+
+
+class SortedRun:
+    """One immutable run file, memory-mapped, with its sparse index and Bloom filter in memory"""
+
+    def __init__(self, path, bloom=None):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(path, "rb") as run_file:
+            self.mm = mmap.mmap(run_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.count, index_offset = _RUN_HEADER.unpack_from(self.mm, 0)
+        if magic != RUN_MAGIC:
+            raise ValueError(f"{path} is not an LSM run file")
+        if version != RUN_FORMAT_VERSION:
+            raise ValueError(f"{path} has unsupported format version {version}")
+        self.data_end = index_offset
+        self.size = len(self.mm)
+
+        self.index_keys = []
+        self.index_offsets = []
+        offset = index_offset
+        while offset < len(self.mm):
+            key, offset = decode_value(self.mm, offset)
+            self.index_keys.append(key)
+            self.index_offsets.append(_OFFSET.unpack_from(self.mm, offset)[0])
+            offset += _OFFSET.size
+
+        if bloom is None:
+            # hash() is salted per process, so filters are rebuilt rather than stored
+            bloom = BloomFilter(self.count)
+            for key, _ in self.records():
+                bloom.add(key)
+        self.bloom = bloom
+
+    @classmethod
+    def write(cls, path, records, count):
+        """Write sorted (key, value or TOMBSTONE) records to a new run file and open it
+
+        count is an upper bound used to size the Bloom filter.
+        """
+        bloom = BloomFilter(count)
+        index = []
+        written = 0
+        with open(path, "wb") as run_file:
+            run_file.write(bytes(_RUN_HEADER.size))
+            offset = _RUN_HEADER.size
+            for key, value in records:
+                if written % INDEX_INTERVAL == 0:
+                    index.append(encode_value(key) + _OFFSET.pack(offset))
+                if value is TOMBSTONE:
+                    data = _TOMBSTONE_FLAG + encode_value(key)
+                else:
+                    encoded = encode_value(value)
+                    data = _PUT + encode_value(key) + _LENGTH.pack(len(encoded)) + encoded
+                run_file.write(data)
+                offset += len(data)
+                bloom.add(key)
+                written += 1
+
+            run_file.write(b"".join(index))
+            run_file.seek(0)
+            run_file.write(_RUN_HEADER.pack(RUN_MAGIC, RUN_FORMAT_VERSION, written, offset))
+            run_file.flush()
+            os.fsync(run_file.fileno())
+        return cls(path, bloom)
+
+    def _decode(self, offset):
+        """Decode the record at offset, returning (key, value or TOMBSTONE, next offset)"""
+        flag = self.mm[offset:offset + 1]
+        key, offset = decode_value(self.mm, offset + 1)
+        if flag == _TOMBSTONE_FLAG:
+            return key, TOMBSTONE, offset
+        value, offset = decode_value(self.mm, offset + _LENGTH.size)
+        return key, value, offset
+
+    def get(self, key):
+        """Return the stored value (possibly TOMBSTONE), or _MISSING if the run has no record for key"""
+        if not self.count or key not in self.bloom:
+            return _MISSING
+        block = bisect.bisect_right(self.index_keys, key) - 1
+        if block < 0:
+            return _MISSING
+
+        mm = self.mm
+        offset = self.index_offsets[block]
+        for _ in range(INDEX_INTERVAL):
+            if offset >= self.data_end:
+                break
+            tombstone = mm[offset] == _TOMBSTONE_FLAG[0]
+            record_key, offset = decode_value(mm, offset + 1)
+            if record_key == key:
+                return TOMBSTONE if tombstone else decode_value(mm, offset + _LENGTH.size)[0]
+            if record_key > key:
+                break
+            if not tombstone:
+                offset += _LENGTH.size + _LENGTH.unpack_from(mm, offset)[0]
+        return _MISSING
+
+    def records(self, start=None, end=None):
+        """Yield (key, value or TOMBSTONE) with start <= key <= end in key order"""
+        offset = _RUN_HEADER.size
+        if start is not None and self.index_keys:
+            block = bisect.bisect_right(self.index_keys, start) - 1
+            if block >= 0:
+                offset = self.index_offsets[block]
+        while offset < self.data_end:
+            key, value, offset = self._decode(offset)
+            if start is not None and key < start:
+                continue
+            if end is not None and key > end:
+                return
+            yield key, value
+
+    def key_range(self):
+        if not self.count:
+            return None, None
+        last = None
+        for last, _ in self.records(self.index_keys[-1]):
+            pass
+        return self.index_keys[0], last
+
+
+class LSMTree:
+    """Table engine with a memtable, sorted run files and leveled compaction
+
+    Same interface as DiskBTree (insert replaces the row under a key) plus
+    delete and delete_range. path is a directory, created if needed and
+    reopened with its runs if it already holds a table.
+    """
+
+    def __init__(self, path, memtable_size=4096, level0_runs=4, level_ratio=10,
+                 background=True, tracer=None):
+        self.path = path
+        self.memtable_size = memtable_size
+        self.level0_runs = level0_runs  # Level 0 runs that trigger a compaction into level 1
+        self.level0_stop = 3 * level0_runs  # Writers wait for compaction beyond this many
+        self.level_ratio = level_ratio
+        self.tracer = tracer if tracer is not None else NULL_TRACER
+        self.tracing = type(self.tracer) is not Tracer
+
+        self.memtable = {}
+        self.memtable_keys = []  # The memtable's keys, sorted
+
+        # Counters for stats(); bytes are run-file bytes
+        self.flushes = 0
+        self.compactions = 0
+        self.bytes_flushed = 0
+        self.bytes_compacted = 0
+
+        os.makedirs(path, exist_ok=True)
+        self.next_run = 0
+        # levels[0] holds level 0 runs newest first, levels[i] at most one run.
+        # The list is replaced, never changed in place, so a reader holding it
+        # sees a consistent set of runs while compaction installs a new one.
+        self.levels = [[]]
+        self._load_manifest()
+
+        self.background = background
+        self.error = None  # Set if the background compaction fails
+        self.closing = False
+        self.cond = threading.Condition()
+        self.worker = None
+        if background:
+            self.worker = threading.Thread(target=self._compaction_loop, daemon=True)
+            self.worker.start()
+        self._schedule_compaction()
+
+    # Manifest
+
+    def _manifest_path(self):
+        return os.path.join(self.path, "MANIFEST")
+
+    def _load_manifest(self):
+        manifest_path = self._manifest_path()
+        if not os.path.exists(manifest_path):
+            return
+        with open(manifest_path, "rb") as manifest:
+            (self.next_run, names), _ = decode_value(manifest.read())
+        self.levels = [[SortedRun(os.path.join(self.path, name)) for name in level] for level in names]
+
+        # Runs left behind by a flush or compaction that never reached the manifest
+        live = {name for level in names for name in level}
+        for name in os.listdir(self.path):
+            if name.endswith(".run") and name not in live:
+                os.remove(os.path.join(self.path, name))
+
+    def _write_manifest(self, levels):
+        names = [[run.name for run in level] for level in levels]
+        temp_path = self._manifest_path() + ".tmp"
+        with open(temp_path, "wb") as manifest:
+            manifest.write(encode_value((self.next_run, names)))
+            manifest.flush()
+            os.fsync(manifest.fileno())
+        os.replace(temp_path, self._manifest_path())
+
+    def _new_run_path(self):
+        with self.cond:
+            number = self.next_run
+            self.next_run += 1
+        return os.path.join(self.path, f"{number:06d}.run")
+
+    # Writes
+
+    def insert(self, key, value):
+        """Insert or replace a key-value pair"""
+        if self.tracing:
+            self.tracer.on_insert(self, key, value)
+        self._put(key, value)
+        if self.tracing:
+            self.tracer.on_insert_done(self, key, value)
+
+    def delete(self, key):
+        """Delete key, returning True if it was present"""
+        removed = self.get(key, _MISSING) is not _MISSING
+        if removed:
+            self._put(key, TOMBSTONE)
+        if self.tracing:
+            self.tracer.on_delete(self, key, removed)
+        return removed
+
+    def delete_range(self, start_key, end_key):
+        """Delete every key with start_key <= key <= end_key, returning how many were removed"""
+        keys = [key for key, _ in self.scan(start_key, end_key)]
+        for key in keys:
+            self._put(key, TOMBSTONE)
+        return len(keys)
+
+    def _put(self, key, value):
+        if key not in self.memtable:
+            bisect.insort(self.memtable_keys, key)
+        self.memtable[key] = value
+        if len(self.memtable) >= self.memtable_size:
+            self.flush()
+
+    def flush(self):
+        """Write the memtable out as a new level 0 run"""
+        if self.error is not None:
+            raise RuntimeError("Background compaction failed") from self.error
+        if not self.memtable:
+            return
+
+        memtable = self.memtable
+        run = SortedRun.write(self._new_run_path(), ((key, memtable[key]) for key in self.memtable_keys),
+                              len(memtable))
+        with self.cond:
+            # Back-pressure: let compaction catch up before level 0 grows further
+            while self.background and len(self.levels[0]) >= self.level0_stop and self.error is None:
+                self.cond.wait()
+            levels = [[run] + self.levels[0]] + self.levels[1:]
+            self._write_manifest(levels)
+            self.levels = levels
+            self.memtable = {}
+            self.memtable_keys = []
+            self.flushes += 1
+            self.bytes_flushed += run.size
+        self._schedule_compaction()
+
+    # Compaction
+
+    def _level_limit(self, level):
+        """Records a level may hold before it is merged into the next one"""
+        return self.memtable_size * self.level0_runs * self.level_ratio ** (level - 1)
+
+    def _pick_compaction(self, levels):
+        """Return (source level, runs to merge) for the next compaction, or None"""
+        if len(levels[0]) >= self.level0_runs:
+            return 0, levels[0] + (levels[1] if len(levels) > 1 else [])
+        for level in range(1, len(levels)):
+            runs = levels[level]
+            if runs and runs[0].count > self._level_limit(level):
+                return level, runs + (levels[level + 1] if level + 1 < len(levels) else [])
+        return None
+
+    def _schedule_compaction(self):
+        if self.background:
+            with self.cond:
+                self.cond.notify_all()
+        else:
+            while self._compact_once():
+                pass
+
+    def _compaction_loop(self):
+        while True:
+            with self.cond:
+                while not self.closing and self._pick_compaction(self.levels) is None:
+                    self.cond.wait()
+                if self.closing:
+                    return
+            try:
+                self._compact_once()
+            except Exception as error:
+                with self.cond:
+                    self.error = error
+                    self.cond.notify_all()
+                return
+
+    def _compact_once(self):
+        """Merge one level into the next; returns False if no level needed it"""
+        levels = self.levels
+        picked = self._pick_compaction(levels)
+        if picked is None:
+            return False
+        source, runs = picked
+        target = source + 1
+        # Below the target nothing older can be shadowed, so tombstones can go
+        bottom = all(not level for level in levels[target + 1:])
+
+        records = merge_records([run.records() for run in runs])
+        if bottom:
+            records = ((key, value) for key, value in records if value is not TOMBSTONE)
+        run = SortedRun.write(self._new_run_path(), records, sum(run.count for run in runs))
+        new_runs = [run] if run.count else []
+
+        merged = set(runs)
+        with self.cond:
+            # Flushes may have added level 0 runs meanwhile; keep those
+            levels = [[run for run in level if run not in merged] for level in self.levels]
+            while len(levels) <= target:
+                levels.append([])
+            levels[target] = new_runs
+            self._write_manifest(levels)
+            self.levels = levels
+            self.compactions += 1
+            self.bytes_compacted += run.size
+            self.cond.notify_all()
+
+        if not new_runs:
+            os.remove(run.path)
+        # Open readers keep their mapping of a removed run until they finish
+        for old in runs:
+            os.remove(old.path)
+        return True
+
+    def wait_for_compaction(self):
+        """Block until no level needs compacting (a no-op without a background thread)"""
+        with self.cond:
+            while self.background and self.error is None and self._pick_compaction(self.levels) is not None:
+                self.cond.wait()
+        if self.error is not None:
+            raise RuntimeError("Background compaction failed") from self.error
+
+    # Reads
+
+    def get(self, key, default=None):
+        """Return the value stored for key, or default if it is missing"""
+        value = self.memtable.get(key, _MISSING)
+        if value is _MISSING:
+            value = self._get_from_runs(key)
+        return default if value is _MISSING or value is TOMBSTONE else value
+
+    def _get_from_runs(self, key):
+        """The newest stored value of key in any run (possibly TOMBSTONE), or _MISSING"""
+        for level in self.levels:
+            for run in level:
+                value = run.get(key)
+                if value is not _MISSING:
+                    return value
+        return _MISSING
+
+    def search(self, key):
+        """Return (key, value) for key, or None"""
+        value = self.get(key, _MISSING)
+        result = None if value is _MISSING else (key, value)
+        if self.tracing:
+            self.tracer.on_search(self, key, result)
+        return result
+
+    def range_search(self, start_key, end_key):
+        results = list(self.scan(start_key, end_key))
+        if self.tracing:
+            self.tracer.on_range_search(self, start_key, end_key, results)
+        return results
+
+    def scan(self, start=None, end=None, reverse=False):
+        """Yield (key, value) pairs with start <= key <= end in order (None means unbounded)
+
+        The memtable part of the range is copied and the set of runs fixed
+        when the scan starts, so the rows reflect that moment even if the
+        table changes while they are consumed. reverse=True collects the rows first.
+        """
+        keys = self.memtable_keys
+        low = 0 if start is None else bisect.bisect_left(keys, start)
+        high = len(keys) if end is None else bisect.bisect_right(keys, end)
+        memtable_records = [(key, self.memtable[key]) for key in keys[low:high]]
+
+        sources = [iter(memtable_records)]
+        sources.extend(run.records(start, end) for level in self.levels for run in level)
+        rows = ((key, value) for key, value in merge_records(sources) if value is not TOMBSTONE)
+        if reverse:
+            return reversed(list(rows))
+        return rows
+
+    # Inspection
+
+    def stats(self):
+        levels = self.levels
+        user_bytes = self.bytes_flushed
+        return {
+            'memtable_keys': len(self.memtable),
+            'runs_per_level': [len(level) for level in levels],
+            'records_per_level': [sum(run.count for run in level) for level in levels],
+            'flushes': self.flushes,
+            'compactions': self.compactions,
+            'bytes_flushed': self.bytes_flushed,
+            'bytes_compacted': self.bytes_compacted,
+            # Run bytes written per byte flushed from the memtable
+            'write_amplification': (user_bytes + self.bytes_compacted) / user_bytes if user_bytes else 0.0,
+        }
+
+    def display(self):
+        """Display the memtable and the runs of every level"""
+        print(f"\n--- LSM Tree Structure ({self.path}) ---")
+        print(f"MEMTABLE: {len(self.memtable)} keys")
+        for number, level in enumerate(self.levels):
+            for run in level:
+                low, high = run.key_range()
+                print(f"  L{number} {run.name}: {run.count} records, keys {low}..{high}, {run.size} bytes")
+        print("------------------------")
+
+    def display_tree_visual(self):
+        stats = self.stats()
+        print(f"Memtable: {stats['memtable_keys']} keys, runs per level: {stats['runs_per_level']}, "
+              f"write amplification: {stats['write_amplification']:.2f}")
+
+    def close(self):
+        """Flush the memtable and stop the compaction thread (finishing its current merge)"""
+        self.flush()
+        if self.worker is not None:
+            with self.cond:
+                self.closing = True
+                self.cond.notify_all()
+            self.worker.join()
+            self.worker = None
+
+
+def merge_records(sources):
+    """Merge sorted (key, value) sources, newest source first, keeping only the newest version of each key"""
+    tagged = [((key, age, value) for key, value in source) for age, source in enumerate(sources)]
+    last = _MISSING
+    for key, _, value in heapq.merge(*tagged, key=lambda record: (record[0], record[1])):
+        if last is not _MISSING and key == last:
+            continue
+        last = key
+        yield key, value
+
+
+def run_append_log_experiment(num_records=100_000, memtable_size=4096):
+    """Ingest time for an append-mostly log: LSM runs vs. in-place page updates"""
+    from disk_btree import DiskBTree
+
+    print("=" * 80)
+    print(f"APPEND-MOSTLY INGEST: {num_records:,} RECORDS")
+    print("=" * 80)
+
+    rng = random.Random(42)
+    orders = {
+        "sequential": list(range(num_records)),
+        "random": rng.sample(range(num_records), num_records),
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        for order, keys in orders.items():
+            btree = DiskBTree(os.path.join(directory, f"btree_{order}.db"))
+            start_time = time.perf_counter()
+            for key in keys:
+                btree.insert(key, f"Event_{key}")
+            btree.flush()
+            btree_time = time.perf_counter() - start_time
+            btree_writes = btree.pager.writes
+            btree.close()
+
+            lsm_path = os.path.join(directory, f"lsm_{order}")
+            lsm = LSMTree(lsm_path, memtable_size)
+            start_time = time.perf_counter()
+            for key in keys:
+                lsm.insert(key, f"Event_{key}")
+            lsm.flush()
+            lsm_time = time.perf_counter() - start_time
+            lsm.wait_for_compaction()
+            stats = lsm.stats()
+
+            assert all(lsm.get(key) == f"Event_{key}" for key in keys[::97])
+            assert sum(1 for _ in lsm.scan()) == num_records
+            lsm.close()
+            shutil.rmtree(lsm_path)
+
+            print(f"  {order:<10} DiskBTree: {btree_time * 1000000 / num_records:6.2f} μs/insert, "
+                  f"{btree_writes / num_records:5.2f} page writes/insert")
+            print(f"  {'':<10} LSMTree:   {lsm_time * 1000000 / num_records:6.2f} μs/insert, "
+                  f"{stats['flushes']} flushes, {stats['compactions']} compactions, "
+                  f"write amplification {stats['write_amplification']:.2f}, runs {stats['runs_per_level']}")
+
+
+if __name__ == "__main__":
+    run_append_log_experiment()
@@ -0,0 +1,524 @@
+import bisect
+import multiprocessing
+import os
+import random
+import time
+import weakref
+from array import array
+from collections import deque
+from operator import eq, itemgetter
+
+from b_tree_time import BTreeCorrected, KEY_TYPES
+
+# A table split by key range over worker processes, one BTreeCorrected each.
+#
+# The parent keeps only the split-key map: shard i owns the keys k with
+# bounds[i - 1] <= k < bounds[i]. Requests are pickled over a Pipe to the
+# owning worker. Batch operations (get_many, insert_many, bulk_load, scans)
+# send to every shard involved before reading any reply, so the shards work
+# at the same time and throughput grows with the number of cores.
+#
+# A new table routes every key to its first worker and keeps the others
+# spare; bulk_load spreads the data over all of them, and splits put spare
+# (or new) workers to use.
+#
+# Every check_every routed keys the table looks at the shards:
+# - a shard over max_shard_keys, or one getting hot_factor times its share
+#   of the traffic, is split in two at its median key (for hot shards, the
+#   median of recently accessed keys) and the upper half moves to a spare or
+#   new worker, as long as there are fewer than max_shards shards (while
+#   spare workers are idle, the busiest shard always counts as hot);
+# - otherwise neighbouring shards whose sizes differ by more than 2x move
+#   the boundary between them (rebalance()).
+#
+# At most one request per shard is outstanding at a time, so a worker never
+# blocks on a reply while the parent is still writing to it.
+
+_SAMPLE_SIZE = 512  # Recently accessed keys kept per shard for hot splits
+
+
+def _extract(tree, start, end):
+    """Remove and return the rows with start <= key < end (None means unbounded)"""
+    moved = [(key, value) for key, value in tree.items(start, end) if end is None or key < end]
+    if 4 * len(moved) > len(tree):
+        # Large moves: rebuild from the rows that stay instead of deleting one by one
+        tree.bulk_load([(key, value) for key, value in tree.items()
+                        if not ((start is None or key >= start) and (end is None or key < end))])
+    else:
+        for key, _ in moved:
+            tree.delete(key)
+    return moved
+
+
+def _bulk_load(tree, keys, values):
+    """Load sorted, distinct keys sent as two columns, which pickle much faster than pairs"""
+    return len(tree.bulk_load(zip(keys, values)))
+
+
+def _kth_key(tree, k):
+    return tree.select_kth(k)[0]
+
+
+def _rank(tree, key):
+    return tree.rank(key)
+
+
+_SHARD_OPS = {
+    'insert': BTreeCorrected.insert,
+    'insert_many': BTreeCorrected.insert_many,
+    'bulk_load': _bulk_load,
+    'get_many': BTreeCorrected.search_many,
+    'delete': BTreeCorrected.delete,
+    'delete_range': BTreeCorrected.delete_range,
+    'count_range': BTreeCorrected.count_range,
+    'kth_key': _kth_key,
+    'select_kth': BTreeCorrected.select_kth,
+    'rank': _rank,
+    'len': len,
+    'extract': _extract,
+    'stats': BTreeCorrected.stats,
+}
+
+
+def _shard_worker(conn, degree, key_type):
+    """Serve one shard's tree until the parent sends "close" or goes away"""
+    tree = BTreeCorrected(degree, key_type)
+    while True:
+        try:
+            op, args = conn.recv()
+        except EOFError:
+            return
+        if op == 'close':
+            conn.send((True, None))
+            return
+        if op == 'scan':
+            # Stream the rows in chunks; an empty chunk ends the scan
+            start, end, chunk_size = args
+            chunk = []
+            for row in tree.items(start, end):
+                chunk.append(row)
+                if len(chunk) == chunk_size:
+                    conn.send((True, chunk))
+                    chunk = []
+            if chunk:
+                conn.send((True, chunk))
+            conn.send((True, []))
+            continue
+        try:
+            conn.send((True, _SHARD_OPS[op](tree, *args)))
+        except Exception as error:
+            conn.send((False, error))
+
+
+class _Shard:
+    __slots__ = ('process', 'conn', 'ops', 'recent')
+
+    def __init__(self, context, degree, key_type):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_shard_worker, args=(child_conn, degree, key_type), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ops = 0  # Keys routed here since the last check
+        self.recent = deque(maxlen=_SAMPLE_SIZE)  # Keys accessed lately, for hot splits
+
+    def send(self, op, *args):
+        self.conn.send((op, args))
+
+    def receive(self):
+        ok, result = self.conn.recv()
+        if not ok:
+            raise result
+        return result
+
+    def call(self, op, *args):
+        self.send(op, *args)
+        return self.receive()
+
+
+class ShardedTable:
+    """Key-value table range-partitioned over worker processes, each owning a BTreeCorrected
+
+    Keys must be ordered and picklable. Starts num_shards workers (default:
+    one per core) and splits up to max_shards. A table is used from one
+    thread; while a scan() is open, other calls raise RuntimeError.
+    Call close() (or use it as a context manager) to stop the workers.
+    """
+
+    def __init__(self, num_shards=None, degree=50, key_type=None, max_shards=None,
+                 max_shard_keys=1_000_000, hot_factor=4.0, check_every=100_000, start_method=None):
+        num_shards = num_shards or os.cpu_count() or 1
+        self.degree = degree
+        self.key_type = key_type
+        self.max_shards = max(num_shards, max_shards or 2 * num_shards)
+        self.max_shard_keys = max_shard_keys
+        self.hot_factor = hot_factor
+        self.check_every = check_every
+        self.context = multiprocessing.get_context(start_method)
+
+        workers = [_Shard(self.context, degree, key_type) for _ in range(num_shards)]
+        self.shards = workers[:1]  # In key order
+        self.spare = workers[1:]  # Started, owning no keys yet
+        self.bounds = []  # bounds[i] is the first key of shard i + 1
+        self.routed = 0  # Keys routed since the last check
+        self.scan_pending = []  # Shards an open scan still has to read from
+        self.scan_owner = None  # Weak reference to the open scan's generator
+
+        self.shard_splits = 0
+        self.boundary_moves = 0
+        self.rows_moved = 0
+
+    def _new_shard(self):
+        if self.spare:
+            return self.spare.pop(0)
+        return _Shard(self.context, self.degree, self.key_type)
+
+    def _check_idle(self):
+        if self.scan_pending:
+            if self.scan_owner() is not None:
+                raise RuntimeError("Finish or close the open scan before using the table again")
+            self._drain_scan()  # Dropped without being started, so its cleanup never ran
+
+    def _shard_for(self, key):
+        return bisect.bisect_right(self.bounds, key)
+
+    def _route(self, shard, keys):
+        shard.ops += len(keys)
+        shard.recent.extend(keys[::max(1, len(keys) // 32)])
+        self.routed += len(keys)
+
+    def _maybe_check(self):
+        if self.routed >= self.check_every:
+            self.check_balance()
+
+    def _call_all(self, calls, shards=None):
+        """Send {shard index: (op, args)} to every shard first, then collect the replies in the same order"""
+        shards = self.shards if shards is None else shards
+        for index, (op, args) in calls.items():
+            shards[index].send(op, *args)
+        return {index: shards[index].receive() for index in calls}
+
+    def _group(self, keys):
+        """Positions of keys grouped by owning shard"""
+        groups = {}
+        for position, key in enumerate(keys):
+            groups.setdefault(self._shard_for(key), []).append(position)
+        return groups
+
+    def insert(self, key, value):
+        self._check_idle()
+        shard = self.shards[self._shard_for(key)]
+        shard.call('insert', key, value)
+        self._route(shard, [key])
+        self._maybe_check()
+
+    def insert_many(self, pairs):
+        """Upsert (key, value) pairs; every shard merges its part at the same time"""
+        self._check_idle()
+        pairs = list(pairs)
+        groups = self._group([key for key, _ in pairs])
+        self._call_all({index: ('insert_many', ([pairs[p] for p in positions],))
+                        for index, positions in groups.items()})
+        for index, positions in groups.items():
+            self._route(self.shards[index], [pairs[p][0] for p in positions])
+        self._maybe_check()
+
+    def get(self, key, default=None):
+        self._check_idle()
+        shard = self.shards[self._shard_for(key)]
+        values, found = shard.call('get_many', [key])
+        self._route(shard, [key])
+        self._maybe_check()
+        return values[0] if found[0] else default
+
+    def __contains__(self, key):
+        self._check_idle()
+        return self.shards[self._shard_for(key)].call('get_many', [key])[1][0]
+
+    def get_many(self, keys, default=None):
+        """Values for keys in order (default where missing), looked up by all owning shards in parallel"""
+        self._check_idle()
+        keys = list(keys)
+        groups = self._group(keys)
+        replies = self._call_all({index: ('get_many', ([keys[p] for p in positions], default))
+                                  for index, positions in groups.items()})
+        values = [default] * len(keys)
+        for index, positions in groups.items():
+            for position, value in zip(positions, replies[index][0]):
+                values[position] = value
+            self._route(self.shards[index], [keys[p] for p in positions])
+        self._maybe_check()
+        return values
+
+    def delete(self, key):
+        """Remove key, returning True if it was present"""
+        self._check_idle()
+        shard = self.shards[self._shard_for(key)]
+        removed = shard.call('delete', key)
+        self._route(shard, [key])
+        self._maybe_check()
+        return removed
+
+    def _shards_for_range(self, start, end):
+        first = 0 if start is None else self._shard_for(start)
+        last = len(self.shards) - 1 if end is None else self._shard_for(end)
+        return range(first, last + 1)
+
+    def delete_range(self, start, end):
+        """Delete every key with start <= key <= end, returning how many were removed"""
+        self._check_idle()
+        replies = self._call_all({index: ('delete_range', (start, end))
+                                  for index in self._shards_for_range(start, end)})
+        return sum(replies.values())
+
+    def count_range(self, start=None, end=None):
+        self._check_idle()
+        replies = self._call_all({index: ('count_range', (start, end))
+                                  for index in self._shards_for_range(start, end)})
+        return sum(replies.values())
+
+    def _sizes(self):
+        replies = self._call_all({index: ('len', ()) for index in range(len(self.shards))})
+        return [replies[index] for index in range(len(self.shards))]
+
+    def __len__(self):
+        self._check_idle()
+        return sum(self._sizes())
+
+    def select_kth(self, k):
+        """The (key, value) pair with global rank k (0-based; negative counts from the end)"""
+        self._check_idle()
+        sizes = self._sizes()
+        total = sum(sizes)
+        if k < 0:
+            k += total
+        if not 0 <= k < total:
+            raise IndexError(f"rank {k} out of range for {total} keys")
+        for index, size in enumerate(sizes):
+            if k < size:
+                return self.shards[index].call('select_kth', k)
+            k -= size
+
+    def scan(self, start=None, end=None, chunk_size=1024):
+        """Yield (key, value) pairs with start <= key <= end in order (None means unbounded)
+
+        Every owning shard starts streaming its rows at once; the chunks are
+        read back shard by shard, which keeps them in key order.
+        """
+        self._check_idle()
+        indexes = list(self._shards_for_range(start, end))
+        for index in indexes:
+            self.shards[index].send('scan', start, end, chunk_size)
+        self.scan_pending = indexes
+        stream = self._stream()
+        self.scan_owner = weakref.ref(stream)
+        return stream
+
+    def _stream(self):
+        try:
+            while self.scan_pending:
+                chunk = self.shards[self.scan_pending[0]].receive()
+                if chunk:
+                    yield from chunk
+                else:
+                    self.scan_pending.pop(0)
+        finally:
+            self._drain_scan()
+
+    def _drain_scan(self):
+        """Read and drop what the shards of an abandoned scan still send"""
+        for index in self.scan_pending:
+            while self.shards[index].receive():
+                pass
+        self.scan_pending = []
+
+    def range_search(self, start_key, end_key):
+        return list(self.scan(start_key, end_key))
+
+    def items(self):
+        return self.scan()
+
+    def bulk_load(self, items):
+        """Replace the table with (key, value) pairs, one equal slice per worker built in parallel
+
+        Every worker, spare ones included, gets a slice, and the split-key
+        map is recomputed from the data. Duplicate keys keep the last value.
+        """
+        self._check_idle()
+        items = sorted(items, key=itemgetter(0))  # Stable, so the last duplicate stays last
+        keys = [key for key, _ in items]
+        if any(map(eq, keys, keys[1:])):
+            items = [pair for i, pair in enumerate(items) if i + 1 == len(items) or keys[i + 1] != pair[0]]
+            keys = [key for key, _ in items]
+        values = [value for _, value in items]
+        workers = self.shards + self.spare
+        active = max(1, min(len(workers), len(keys)))
+        cuts = [i * len(keys) // active for i in range(active + 1)]
+
+        calls = {}
+        for index in range(len(workers)):
+            low, high = (cuts[index], cuts[index + 1]) if index < active else (0, 0)
+            shard_keys = keys[low:high]
+            if self.key_type is not None:
+                shard_keys = array(KEY_TYPES[self.key_type], shard_keys)
+            calls[index] = ('bulk_load', (shard_keys, values[low:high]))
+        self._call_all(calls, workers)
+        self.shards = workers[:active]
+        self.spare = workers[active:]
+        self.bounds = [keys[cut] for cut in cuts[1:-1]]
+        for shard in self.shards:
+            shard.ops = 0
+            shard.recent.clear()
+        self.routed = 0
+        return self
+
+    def check_balance(self):
+        """Split a shard that is too large or too hot, or rebalance neighbours once max_shards is reached"""
+        self.routed = 0
+        sizes = self._sizes()
+        fair_share = sum(shard.ops for shard in self.shards) / len(self.shards)
+        splittable = [index for index in range(len(self.shards)) if sizes[index] >= 2]
+        too_large = [index for index in splittable if sizes[index] > self.max_shard_keys]
+        busiest = max(splittable, key=lambda index: self.shards[index].ops, default=None)
+        # While workers sit idle any busy shard counts as hot
+        hot = busiest is not None and self.shards[busiest].ops > 0 and (
+            self.spare or self.shards[busiest].ops > self.hot_factor * fair_share)
+
+        for shard in self.shards:
+            shard.ops = 0
+        if len(self.shards) < self.max_shards and too_large:
+            self.split_shard(max(too_large, key=sizes.__getitem__))
+        elif len(self.shards) < self.max_shards and hot:
+            self.split_shard(busiest, by_traffic=True)
+        elif len(self.shards) > 1:
+            self.rebalance(sizes)
+
+    def split_shard(self, index, by_traffic=False):
+        """Move the upper half of a shard to a new worker
+
+        The split key is the shard's median key, or with by_traffic the
+        median of its recently accessed keys, so a hot spot is divided.
+        """
+        self._check_idle()
+        shard = self.shards[index]
+        size = shard.call('len')
+        if size < 2:
+            return
+        split_key = None
+        if by_traffic and shard.recent:
+            recent = sorted(shard.recent)
+            split_key = recent[len(recent) // 2]
+            if not 0 < shard.call('rank', split_key) < size:
+                split_key = None
+        if split_key is None:
+            split_key = shard.call('kth_key', size // 2)
+
+        rows = shard.call('extract', split_key, None)
+        new_shard = self._new_shard()
+        new_shard.call('bulk_load', [key for key, _ in rows], [value for _, value in rows])
+        self.shards.insert(index + 1, new_shard)
+        self.bounds.insert(index, split_key)
+        shard.recent.clear()
+        self.shard_splits += 1
+        self.rows_moved += len(rows)
+
+    def rebalance(self, sizes=None):
+        """Move boundaries between neighbouring shards whose sizes differ by more than 2x"""
+        self._check_idle()
+        sizes = list(sizes) if sizes is not None else self._sizes()
+        for left in range(len(self.shards) - 1):
+            right = left + 1
+            low, high = sorted((sizes[left], sizes[right]))
+            if high <= 2 * low + 1:
+                continue
+            count = (high - low) // 2
+            if sizes[left] > sizes[right]:
+                # The top count keys of the left shard move right
+                boundary = self.shards[left].call('kth_key', sizes[left] - count)
+                rows = self.shards[left].call('extract', boundary, None)
+                self.shards[right].call('insert_many', rows)
+            else:
+                # The bottom count keys of the right shard move left; the boundary is the first key staying
+                boundary = self.shards[right].call('kth_key', count)
+                rows = self.shards[right].call('extract', None, boundary)
+                self.shards[left].call('insert_many', rows)
+            self.bounds[left] = boundary
+            shift = count if sizes[left] > sizes[right] else -count
+            sizes[left] -= shift
+            sizes[right] += shift
+            self.boundary_moves += 1
+            self.rows_moved += len(rows)
+
+    def stats(self):
+        sizes = self._sizes()
+        return {
+            'shards': len(self.shards),
+            'spare_workers': len(self.spare),
+            'max_shards': self.max_shards,
+            'shard_sizes': sizes,
+            'rows': sum(sizes),
+            'bounds': list(self.bounds),
+            'shard_splits': self.shard_splits,
+            'boundary_moves': self.boundary_moves,
+            'rows_moved': self.rows_moved,
+        }
+
+    def close(self):
+        self._drain_scan()
+        for shard in self.shards + self.spare:
+            try:
+                shard.call('close')
+            except (EOFError, OSError):
+                pass
+            shard.process.join(timeout=5)
+            shard.conn.close()
+        self.shards = []
+        self.spare = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_sharding_experiment(num_records=1_000_000, num_lookups=200_000, batch_size=2_000, shard_counts=None):
+    """Parallel bulk load and batched lookups: one in-process BTreeCorrected vs. ShardedTable"""
+    cores = os.cpu_count() or 1
+    if shard_counts is None:
+        shard_counts = sorted({1, 2, cores // 2 or 1, cores})
+    rng = random.Random(42)
+    items = [(key, f"Employee_{key}") for key in range(num_records)]
+    lookup_keys = [rng.randrange(num_records) for _ in range(num_lookups)]
+    batches = [lookup_keys[i:i + batch_size] for i in range(0, num_lookups, batch_size)]
+
+    print("=" * 80)
+    print(f"SHARDED TABLE: {num_records:,} ROWS, {num_lookups:,} LOOKUPS IN BATCHES OF {batch_size:,} "
+          f"({cores} cores)")
+    print("=" * 80)
+
+    tree = BTreeCorrected(50)
+    start_time = time.perf_counter()
+    tree.bulk_load(items)
+    build = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    for batch in batches:
+        tree.search_many(batch)
+    lookup = time.perf_counter() - start_time
+    print(f"  BTreeCorrected, in process   build {build:6.2f} s  {num_lookups / lookup:12,.0f} lookups/s")
+
+    for shards in shard_counts:
+        with ShardedTable(shards, check_every=float('inf')) as table:
+            start_time = time.perf_counter()
+            table.bulk_load(items)
+            build = time.perf_counter() - start_time
+            start_time = time.perf_counter()
+            for batch in batches:
+                table.get_many(batch)
+            lookup = time.perf_counter() - start_time
+            assert table.get_many(lookup_keys[:100]) == [f"Employee_{key}" for key in lookup_keys[:100]]
+            print(f"  ShardedTable, {shards:2d} shards      build {build:6.2f} s  "
+                  f"{num_lookups / lookup:12,.0f} lookups/s")
+
+
+if __name__ == "__main__":
+    run_sharding_experiment()
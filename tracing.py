@@ -0,0 +1,122 @@
+def _show(tree, value):
+    """Display a value, decoding the raw bytes that page-backed nodes hold"""
+    if isinstance(value, bytes) and hasattr(tree, "_decode_value"):
+        return tree._decode_value(value)
+    return value
+
+class Tracer:
+    """Observer for B-tree events; every hook is a no-op, so this is the silent default"""
+    
+    def on_create_table(self, db, table_name):
+        pass
+    
+    def on_statement(self, db, sql):
+        pass
+    
+    def on_insert(self, tree, key, value):
+        pass
+    
+    def on_insert_done(self, tree, key, value):
+        pass
+    
+    def on_node_full(self, tree, node):
+        pass
+    
+    def on_split(self, tree, node, mid_index):
+        pass
+    
+    def on_split_done(self, tree, parent, index):
+        pass
+    
+    def on_visit(self, tree, node):
+        pass
+    
+    def on_delete(self, tree, key, removed):
+        pass
+    
+    def on_search(self, tree, key, result):
+        pass
+    
+    def on_filter_reject(self, db, table_name, key):
+        pass
+    
+    def on_range_search(self, tree, start_key, end_key, results):
+        pass
+
+class ConsoleTracer(Tracer):
+    """Prints every step of the tree operations, for teaching and debugging"""
+    
+    def on_create_table(self, db, table_name):
+        print(f"\n### Creating table '{table_name}' with B-Tree index ###")
+    
+    def on_statement(self, db, sql):
+        print(f"\nSQL: {sql}")
+    
+    def on_insert(self, tree, key, value):
+        print(f"\n=== INSERTING ({key}, {value}) ===")
+    
+    def on_insert_done(self, tree, key, value):
+        print(f"After inserting ({key}, {value}):")
+        tree.display()
+    
+    def on_node_full(self, tree, node):
+        # Check if this insertion will cause a split on next insertion
+        print(f"⚠️  Node is now full with {len(node.keys)} keys (max capacity reached)")
+    
+    def on_split(self, tree, node, mid_index):
+        # Show the node before splitting with highlighted middle element
+        print("Node is full, splitting required...")
+        print(f"Before splitting: {self._format_node_for_split(tree, node, mid_index)}")
+    
+    def on_split_done(self, tree, parent, index):
+        key = parent.keys[index]
+        if parent.values:
+            print(f"Middle element promoted: \033[91m({key}, '{_show(tree, parent.values[index])}')\033[0m")
+        else:
+            action = "copied up" if parent.children[index].leaf else "promoted"
+            print(f"Separator {action}: \033[91m{key}\033[0m")
+    
+    def on_delete(self, tree, key, removed):
+        print(f"\n=== DELETING key {key} ===")
+        if removed:
+            print(f"After deleting {key}:")
+            tree.display()
+        else:
+            print(f"Key {key} not found")
+    
+    def on_search(self, tree, key, result):
+        print(f"\n=== SEARCHING for key {key} ===")
+        if result:
+            print(f"Found: Key={result[0]}, Value={result[1]}")
+        else:
+            print(f"Key {key} not found")
+    
+    def on_filter_reject(self, db, table_name, key):
+        print(f"Bloom filter of '{table_name}' rules out key {key}, the tree is not searched")
+    
+    def on_range_search(self, tree, start_key, end_key, results):
+        print(f"\n=== RANGE SEARCH: {start_key} to {end_key} ===")
+        if results:
+            print("Found records:")
+            for key, value in results:
+                print(f"  Key={key}, Value={value}")
+        else:
+            print("No records found in range")
+    
+    def _format_node_for_split(self, tree, node, mid_index):
+        """Format a node for display before splitting, highlighting the middle element"""
+        node_type = "LEAF" if node.leaf else "NODE"
+        formatted_pairs = []
+        
+        for i, key in enumerate(node.keys):
+            # Internal B+ nodes only carry keys
+            item = f"({key}, '{_show(tree, node.values[i])}')" if node.values else f"{key}"
+            if i == mid_index:
+                # Highlight the middle element in red
+                formatted_pairs.append(f"\033[91m{item}\033[0m")
+            else:
+                formatted_pairs.append(item)
+        
+        return f"{node_type}: [{', '.join(formatted_pairs)}]"
+
+NULL_TRACER = Tracer()
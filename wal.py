@@ -0,0 +1,222 @@
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+# Append-only write-ahead log.
+#
+# Every record is: payload length (uint32), CRC32 of the payload (uint32),
+# then the payload: one opcode byte followed by the encoded fields.
+# Replay stops at the first short or corrupt record (a torn write from a
+# crash) and cuts the file back to the last good record.
+
+_RECORD_HEADER = struct.Struct("<II")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_LENGTH = struct.Struct("<I")
+
+SYNC_POLICIES = ("always", "group", "none")
+
+
+def encode_value(value):
+    """Encode a value as a type tag plus a compact binary body"""
+    if value is None:
+        return b"N"
+    if value is True or value is False:
+        return b"T" if value else b"F"
+    if isinstance(value, int) and -2**63 <= value < 2**63:
+        return b"i" + _INT.pack(value)
+    if isinstance(value, float):
+        return b"f" + _FLOAT.pack(value)
+    if isinstance(value, str):
+        data = value.encode("utf-8")
+        return b"s" + _LENGTH.pack(len(data)) + data
+    if isinstance(value, bytes):
+        return b"b" + _LENGTH.pack(len(value)) + value
+    if isinstance(value, (tuple, list)):
+        tag = b"t" if isinstance(value, tuple) else b"l"
+        return tag + _LENGTH.pack(len(value)) + b"".join(encode_value(item) for item in value)
+    if isinstance(value, dict):
+        parts = [b"d", _LENGTH.pack(len(value))]
+        for key, item in value.items():
+            parts.append(encode_value(key))
+            parts.append(encode_value(item))
+        return b"".join(parts)
+    # Anything else (big ints, custom objects) falls back to pickle
+    data = pickle.dumps(value)
+    return b"p" + _LENGTH.pack(len(data)) + data
+
+
+def decode_value(buffer, offset=0, allow_pickle=True):
+    """Decode one value written by encode_value, returning (value, next offset)
+
+    Pickled values run arbitrary code when they are decoded: pass
+    allow_pickle=False for data that may not come from this program.
+    """
+    tag = buffer[offset:offset + 1]
+    offset += 1
+
+    if tag == b"N":
+        return None, offset
+    if tag == b"T":
+        return True, offset
+    if tag == b"F":
+        return False, offset
+    if tag == b"i":
+        return _INT.unpack_from(buffer, offset)[0], offset + _INT.size
+    if tag == b"f":
+        return _FLOAT.unpack_from(buffer, offset)[0], offset + _FLOAT.size
+
+    (length,) = _LENGTH.unpack_from(buffer, offset)
+    offset += _LENGTH.size
+
+    if tag == b"s":
+        return bytes(buffer[offset:offset + length]).decode("utf-8"), offset + length
+    if tag == b"b":
+        return bytes(buffer[offset:offset + length]), offset + length
+    if tag == b"p":
+        if not allow_pickle:
+            raise ValueError(f"Pickled value at offset {offset - 1 - _LENGTH.size} and pickle is not allowed")
+        return pickle.loads(buffer[offset:offset + length]), offset + length
+    if tag in (b"t", b"l"):
+        items = []
+        for _ in range(length):
+            item, offset = decode_value(buffer, offset, allow_pickle)
+            items.append(item)
+        return (tuple(items) if tag == b"t" else items), offset
+    if tag == b"d":
+        result = {}
+        for _ in range(length):
+            key, offset = decode_value(buffer, offset, allow_pickle)
+            result[key], offset = decode_value(buffer, offset, allow_pickle)
+        return result, offset
+    raise ValueError(f"Unknown value tag {tag!r} at offset {offset - 1}")
+
+
+def encode_record(op, fields):
+    payload = bytes([op]) + b"".join(encode_value(field) for field in fields)
+    return _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class WriteAheadLog:
+    """Append-only log of (opcode, fields) records with a configurable fsync policy
+
+    sync="always" fsyncs every record, sync="none" leaves it to the OS, and
+    sync="group" fsyncs once group_records records are pending or the oldest
+    pending record is group_ms old, whichever comes first. A background thread
+    makes sure an idle log still reaches the disk within group_ms.
+
+    Only "always" makes append() durable before it returns. With "group" a
+    crash can lose the records of the last unsynced group (up to
+    group_records records or group_ms of writes) even though append()
+    already returned; with "none" it can lose whatever the OS had not
+    written. Call commit() where a write must be durable before going on.
+    """
+
+    def __init__(self, path, sync="group", group_records=128, group_ms=5):
+        if sync not in SYNC_POLICIES:
+            raise ValueError(f"Unknown sync policy {sync!r}, expected one of {SYNC_POLICIES}")
+        self.path = path
+        self.sync = sync
+        self.group_records = group_records
+        self.group_interval = group_ms / 1000
+
+        self.file = open(path, "ab")
+        self.lock = threading.Lock()
+        self.pending = 0  # Records written but not yet fsynced
+        self.pending_since = None
+        self.syncs = 0
+
+        self.closed = threading.Event()
+        self.flusher = None
+        if sync == "group":
+            self.flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+            self.flusher.start()
+
+    def append(self, op, *fields):
+        """Write one record; it is only on disk on return with sync="always" (see the class docstring)"""
+        record = encode_record(op, fields)
+        with self.lock:
+            self.file.write(record)
+            if self.sync == "always":
+                self._sync()
+            elif self.sync == "group":
+                if self.pending == 0:
+                    self.pending_since = time.monotonic()
+                self.pending += 1
+                if (self.pending >= self.group_records
+                        or time.monotonic() - self.pending_since >= self.group_interval):
+                    self._sync()
+
+    def commit(self):
+        """Force every written record to disk"""
+        with self.lock:
+            self._sync()
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.pending_since = None
+        self.syncs += 1
+
+    def _flush_periodically(self):
+        while not self.closed.wait(self.group_interval):
+            with self.lock:
+                if self.pending and not self.file.closed:
+                    self._sync()
+
+    def replay(self):
+        """Yield (op, fields) for every intact record, truncating a torn tail"""
+        with self.lock:
+            self.file.flush()
+            with open(self.path, "rb") as log:
+                data = log.read()
+
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(data):
+            length, crc = _RECORD_HEADER.unpack_from(data, offset)
+            start = offset + _RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+
+            fields = []
+            position = 1
+            while position < len(payload):
+                field, position = decode_value(payload, position)
+                fields.append(field)
+            yield payload[0], fields
+            offset = start + length
+
+        if offset < len(data):
+            # Drop the partial record so new appends start on a clean boundary
+            with self.lock:
+                self.file.truncate(offset)
+
+    def checkpoint(self, records=()):
+        """Atomically replace the log with the given (op, fields) records"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as log:
+            for op, fields in records:
+                log.write(encode_record(op, fields))
+            log.flush()
+            os.fsync(log.fileno())
+
+        with self.lock:
+            self.file.close()
+            os.replace(temp_path, self.path)
+            self.file = open(self.path, "ab")
+            self.pending = 0
+            self.pending_since = None
+
+    def close(self):
+        self.closed.set()
+        if self.flusher is not None:
+            self.flusher.join()
+        with self.lock:
+            if not self.file.closed:
+                self._sync()
+                self.file.close()